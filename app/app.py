@@ -1,11 +1,25 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Blueprint, current_app, g, make_response, render_template, request, jsonify, Response, stream_with_context
+from flask.cli import with_appcontext
+from flask.json.provider import DefaultJSONProvider
 from rdflib import Graph, Namespace, Literal
 from rdflib.namespace import RDF, RDFS
-from sparql_manager import SPARQLManager
+from sparql_manager import get_sparql_manager
 from movie_agent import MovieAgent
+from async_sparql_manager import AsyncSPARQLManager
+from materialized import RecommendationStore
+from search import SearchIndex
+from facets import FACETS
+from models import Movie
+from compression import compress_response
+from ids import is_valid_id
+from datetime import datetime, timezone
+from metrics import RequestStats, current_request
 import os
-import logging
+import threading
+import functools
 import time
+import click
+import logging
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
@@ -15,32 +29,190 @@ logger = logging.getLogger(__name__)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 TEMPLATE_DIR = os.path.join(BASE_DIR, 'templates')
 
-app = Flask(__name__, template_folder=TEMPLATE_DIR)
-
 # Configuración de namespaces
 EX = Namespace("http://example.org/movies#")
-movie_agent = MovieAgent()
-sparql_manager = SPARQLManager()
 
-@app.route('/')
+class Services:
+    """
+    Dependencias compartidas de la aplicación, creadas en su primer uso.
+
+    Crear la aplicación no hace peticiones al almacén ni arranca hilos, así que
+    los workers (también los creados con fork) arrancan al instante; cada
+    proceso crea sus objetos con la primera petición que los necesita.
+    """
+
+    def __init__(self, sparql_manager=None):
+        self._lock = threading.RLock()
+        self._instances = {}
+        if sparql_manager is not None:
+            self._instances['sparql_manager'] = sparql_manager
+
+    def _get(self, name, factory):
+        instance = self._instances.get(name)
+        if instance is None:
+            with self._lock:
+                instance = self._instances.get(name)
+                if instance is None:
+                    instance = self._instances[name] = factory()
+        return instance
+
+    @property
+    def sparql_manager(self):
+        return self._get('sparql_manager', get_sparql_manager)
+
+    @property
+    def movie_agent(self):
+        return self._get('movie_agent', lambda: MovieAgent(self.sparql_manager))
+
+    @property
+    def async_sparql_manager(self):
+        # Bucle asyncio compartido para lanzar en paralelo las consultas independientes de una petición
+        return self._get('async_sparql_manager', lambda: AsyncSPARQLManager(self.sparql_manager))
+
+    @property
+    def recommendation_store(self):
+        # Listas de recomendaciones precalculadas que se refrescan en segundo plano
+        return self._get('recommendation_store', lambda: RecommendationStore(
+            self.movie_agent,
+            workers=int(os.getenv('RECOMMENDATION_WORKERS', '2')),
+            max_staleness=float(os.getenv('RECOMMENDATION_MAX_STALENESS', '0')),
+            max_age=float(os.getenv('RECOMMENDATION_MAX_AGE', '0')) or None,
+            max_entries=int(os.getenv('RECOMMENDATION_CACHE_SIZE', '10000')),
+        ))
+
+    @property
+    def search_index(self):
+        # Índice de títulos y directores en memoria, al día con las altas de películas
+        return self._get('search_index', lambda: SearchIndex(self.sparql_manager))
+
+class MovieJSONProvider(DefaultJSONProvider):
+    """Serializa los registros Movie con su forma plana de la API"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Movie):
+            return o.to_dict()
+        return DefaultJSONProvider.default(o)
+
+def services():
+    """Servicios de la aplicación que atiende la petición actual"""
+    return current_app.extensions['movies']
+
+bp = Blueprint('movies', __name__)
+
+def create_app(sparql_manager=None):
+    """Crea la aplicación Flask; sparql_manager permite inyectar uno propio (por ejemplo, en pruebas)"""
+    app = Flask(__name__, template_folder=TEMPLATE_DIR)
+    app.json = MovieJSONProvider(app)
+    # Con SERVER_TIMING=1 cada respuesta indica cuántas consultas hizo y cuánto tardaron
+    app.config['SERVER_TIMING'] = os.getenv('SERVER_TIMING', '0').lower() in ('1', 'true')
+    # Tamaño mínimo (bytes) de las respuestas JSON/HTML que se comprimen
+    app.config['COMPRESS_MIN_SIZE'] = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+    app.extensions['movies'] = Services(sparql_manager)
+    app.register_blueprint(bp)
+    app.cli.add_command(init_store_command)
+    return app
+
+@click.command('init-store')
+@with_appcontext
+def init_store_command():
+    """Crea el dataset y la ontología básica en el almacén (una vez por despliegue)"""
+    services().sparql_manager.setup()
+    click.echo("Almacén inicializado")
+
+# Tamaño de página por defecto y máximo para /get_all_movies
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+@bp.before_app_request
+def start_request_stats():
+    g.sparql_stats = RequestStats()
+    current_request.set(g.sparql_stats)
+
+@bp.after_app_request
+def finish_request_stats(response):
+    stats = g.pop('sparql_stats', None)
+    if stats is None:
+        return response
+    current_request.set(None)
+    services().sparql_manager.metrics.observe_request(request.endpoint or 'desconocido', stats)
+    if current_app.config['SERVER_TIMING']:
+        response.headers['Server-Timing'] = (
+            f'sparql;dur={stats.seconds * 1000:.1f};desc="{stats.queries} consultas"'
+        )
+    return response
+
+@bp.after_app_request
+def compress(response):
+    return compress_response(response, request.accept_encodings, current_app.config['COMPRESS_MIN_SIZE'])
+
+def catalog_conditional(view):
+    """
+    Hace condicional una vista que solo depende del catálogo (y de las
+    favoritas de ?user_id=, si se indica).
+
+    El validador sale de la generación del catálogo, así que si el cliente ya
+    tiene la versión actual se responde 304 Not Modified sin ejecutar la vista
+    ni consultar el almacén. Las respuestas 200 llevan ETag, Last-Modified y
+    Cache-Control: no-cache, para que navegadores y CDN revaliden cada vez.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        etag, modified = services().sparql_manager.catalog_validator(request.args.get('user_id'))
+        # Last-Modified tiene resolución de segundos: solo se envía cuando ese segundo
+        # ya terminó, para que un cambio posterior no pueda compartir la misma fecha
+        last_modified = None
+        if modified is not None and int(modified) < int(time.time()):
+            last_modified = datetime.fromtimestamp(int(modified), timezone.utc)
+
+        if _not_modified(etag, last_modified):
+            response = Response(status=304)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+        response.set_etag(etag, weak=True)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+def _not_modified(etag, last_modified):
+    """Indica si las cabeceras condicionales de la petición coinciden con la versión actual"""
+    if request.if_none_match:
+        # If-None-Match tiene prioridad sobre If-Modified-Since
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+@bp.route('/metrics')
+def metrics():
+    """Métricas de las consultas SPARQL en formato de texto de Prometheus"""
+    return Response(services().sparql_manager.metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@bp.route('/')
 def index():
     try:
-        # Obtener todas las películas para mostrar en la interfaz
-        movies = sparql_manager.get_all_movies()
-        return render_template('index.html', movies=movies)
+        # La interfaz carga las películas por AJAX, no hace falta consultar el catálogo aquí;
+        # la página es estática, así que su ETag es el hash del contenido
+        response = make_response(render_template('index.html'))
+        response.add_etag(weak=True)
+        return response.make_conditional(request)
     except Exception as e:
         logger.error(f"Error en la página principal: {str(e)}")
         return render_template('index.html', movies=[], error="Error al cargar las películas")
 
-@app.route('/add_movie', methods=['POST'])
+@bp.route('/add_movie', methods=['POST'])
 def add_movie():
     try:
         data = request.json
         if not all(key in data for key in ['title', 'director', 'genre', 'rating']):
             return jsonify({"status": "error", "message": "Faltan datos requeridos"}), 400
         
-        # Asignar un ID único basado en timestamp
-        data['id'] = str(int(time.time() * 1000))
+        # SPARQLManager asigna el ID (único y ordenado por tiempo) al agregarla
+        data.pop('id', None)
         
         # Validar datos
         if not isinstance(data['rating'], (int, float)) or not (1 <= data['rating'] <= 5):
@@ -53,41 +225,74 @@ def add_movie():
             return jsonify({"status": "error", "message": "El director no puede estar vacío"}), 400
         
         # Agregar la película
-        sparql_manager.add_movie(data)
+        services().sparql_manager.add_movie(data)
         
         return jsonify({
             "status": "success",
             "message": "Película agregada correctamente",
-            "movie": {
-                "id": data['id'],
-                "title": data['title'],
-                "director": data['director'],
-                "genre": data['genre'],
-                "rating": data['rating']
-            }
+            "movie": Movie.from_dict(data)
         })
     except Exception as e:
         logger.error(f"Error al agregar película: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/get_recommendations')
+@bp.route('/get_recommendations')
 def get_recommendations():
     try:
         user_id = request.args.get('user_id', '1')  # Usuario por defecto
-        recommendations = movie_agent.get_recommendations(user_id)
+        app_services = services()
+        async_sparql_manager = app_services.async_sparql_manager
+        # Lista precalculada si está al día; si no, cálculo en el momento con consultas en paralelo
+        recommendations = app_services.recommendation_store.get(
+            user_id,
+            live=lambda: async_sparql_manager.run(
+                app_services.movie_agent.get_recommendations_async(user_id, async_sparql_manager)
+            ),
+        )
         return jsonify(recommendations)
     except Exception as e:
         logger.error(f"Error al obtener recomendaciones: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/movie_details/<movie_id>')
+@bp.route('/get_recommendations_batch', methods=['POST'])
+def get_recommendations_batch():
+    """
+    Recomendaciones para muchos usuarios en una sola llamada.
+
+    Recibe {"user_ids": [...]} (como mucho MAX_PAGE_SIZE) y emite NDJSON en streaming, una línea
+    {"user_id": ..., "recommendations": [...]} por usuario.
+    """
+    data = request.json or {}
+    user_ids = data.get('user_ids')
+    if not isinstance(user_ids, list) or not user_ids:
+        return jsonify({"status": "error", "message": "Se requiere una lista user_ids"}), 400
+    if len(user_ids) > MAX_PAGE_SIZE:
+        return jsonify({"status": "error", "message": f"Como mucho {MAX_PAGE_SIZE} usuarios por llamada"}), 400
+    invalid = [user_id for user_id in user_ids if not isinstance(user_id, (str, int)) or not is_valid_id(str(user_id))]
+    if invalid:
+        return jsonify({"status": "error", "message": "IDs de usuario no válidos", "user_ids": invalid}), 400
+    
+    rows = (
+        {"user_id": user_id, "recommendations": recommendations}
+        for user_id, recommendations in services().movie_agent.get_recommendations_batch(user_ids)
+    )
+    return Response(stream_with_context(_ndjson_lines(rows)), mimetype='application/x-ndjson')
+
+@bp.route('/recommendations/stats')
+def recommendation_stats():
+    """Métricas de las listas precalculadas: aciertos, listas sucias y retraso de refresco"""
+    return jsonify(services().recommendation_store.stats())
+
+@bp.route('/movie_details/<movie_id>')
+@catalog_conditional
 def movie_details(movie_id):
     try:
-        details = sparql_manager.get_movie_details(movie_id)
-        if not details:
+        # Mismo camino que el lote: una consulta y la opinión con los detalles ya obtenidos
+        found = services().movie_agent.get_movies_with_opinions([movie_id]).get(movie_id)
+        if not found:
             return jsonify({"status": "error", "message": "Película no encontrada"}), 404
         
-        opinion = movie_agent.generate_opinion(movie_id)
+        details, opinion = found
         return jsonify({
             "status": "success",
             "details": details,
@@ -97,11 +302,40 @@ def movie_details(movie_id):
         logger.error(f"Error al obtener detalles de película: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/is_favorite/<movie_id>')
+@bp.route('/movie_details_batch', methods=['POST'])
+def movie_details_batch():
+    """
+    Detalles y opinión de muchas películas en una sola llamada.
+
+    Recibe {"movie_ids": [...]} (como mucho MAX_PAGE_SIZE) y devuelve las
+    encontradas en el mismo orden, más los IDs que no existen.
+    """
+    try:
+        data = request.json or {}
+        movie_ids = data.get('movie_ids')
+        if not isinstance(movie_ids, list) or not movie_ids:
+            return jsonify({"status": "error", "message": "Se requiere una lista movie_ids"}), 400
+        if len(movie_ids) > MAX_PAGE_SIZE:
+            return jsonify({"status": "error", "message": f"Como mucho {MAX_PAGE_SIZE} películas por llamada"}), 400
+        
+        movie_ids = [str(movie_id) for movie_id in movie_ids]
+        found = services().movie_agent.get_movies_with_opinions(movie_ids)
+        return jsonify({
+            "status": "success",
+            "movies": [
+                {"details": details, "opinion": opinion} for details, opinion in found.values()
+            ],
+            "missing": [movie_id for movie_id in dict.fromkeys(movie_ids) if movie_id not in found]
+        })
+    except Exception as e:
+        logger.error(f"Error al obtener detalles de películas: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/is_favorite/<movie_id>')
 def is_favorite(movie_id):
     try:
         user_id = request.args.get('user_id', '1')
-        is_favorite = sparql_manager.is_favorite_movie(user_id, movie_id)
+        is_favorite = services().sparql_manager.is_favorite_movie(user_id, movie_id)
         return jsonify({
             "status": "success",
             "is_favorite": is_favorite
@@ -113,45 +347,200 @@ def is_favorite(movie_id):
             "message": str(e)
         }), 500
 
-@app.route('/favorite_movie', methods=['POST'])
+@bp.route('/favorites')
+def favorites():
+    """IDs de todas las favoritas del usuario en una sola consulta"""
+    try:
+        user_id = request.args.get('user_id', '1')
+        return jsonify({
+            "status": "success",
+            "movie_ids": services().sparql_manager.get_favorite_ids(user_id)
+        })
+    except Exception as e:
+        logger.error(f"Error al obtener favoritos: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/favorite_movie', methods=['POST'])
 def add_favorite_movie():
     try:
         data = request.json
-        if not all(key in data for key in ['user_id', 'movie_id']):
+        if not isinstance(data, dict) or not all(key in data for key in ['user_id', 'movie_id']):
             return jsonify({"status": "error", "message": "Faltan datos requeridos"}), 400
+        invalid = [
+            key for key in ['user_id', 'movie_id']
+            if not isinstance(data[key], (str, int)) or not is_valid_id(str(data[key]))
+        ]
+        if invalid:
+            return jsonify({"status": "error", "message": "IDs no válidos", "fields": invalid}), 400
+        # "false" como cadena no puede tomarse por True: el estado deseado debe ser un booleano JSON
+        if 'favorite' in data and not isinstance(data['favorite'], bool):
+            return jsonify({"status": "error", "message": "favorite debe ser true o false"}), 400
         
-        # Verificar si ya es favorita
-        is_favorite = sparql_manager.is_favorite_movie(data['user_id'], data['movie_id'])
+        if 'favorite' in data:
+            # Estado deseado explícito: una sola actualización idempotente
+            is_favorite = services().sparql_manager.set_favorite_movie(
+                data['user_id'], data['movie_id'], data['favorite']
+            )
+        else:
+            # Sin estado deseado se alterna de forma atómica en el almacén
+            is_favorite = services().sparql_manager.toggle_favorite_movie(data['user_id'], data['movie_id'])
         
         if is_favorite:
-            # Si ya es favorita, la quitamos de favoritos
-            sparql_manager.remove_favorite_movie(data['user_id'], data['movie_id'])
-            message = "Película eliminada de favoritos"
-        else:
-            # Si no es favorita, la agregamos a favoritos
-            sparql_manager.add_favorite_movie(data['user_id'], data['movie_id'])
             message = "Película agregada a favoritos"
+        elif is_favorite is None:
+            message = "Favorito actualizado"
+        else:
+            message = "Película eliminada de favoritos"
         
         return jsonify({
             "status": "success",
-            "message": message
+            "message": message,
+            "is_favorite": is_favorite
         })
     except Exception as e:
         logger.error(f"Error al modificar favorito: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/get_all_movies')
+@bp.route('/search')
+@catalog_conditional
+def search():
+    """Películas cuyo título o director contienen las palabras de ?q= (sin distinguir tildes)"""
+    try:
+        return jsonify({
+            "status": "success",
+            "movies": services().search_index.search(request.args.get('q', ''), limit=_page_size(default=20))
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error al buscar películas: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/autocomplete')
+@catalog_conditional
+def autocomplete():
+    """Sugerencias de títulos y directores para el prefijo ?prefix="""
+    try:
+        return jsonify({
+            "status": "success",
+            "suggestions": services().search_index.autocomplete(
+                request.args.get('prefix', ''), limit=_page_size(default=10)
+            )
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error al autocompletar: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@bp.route('/get_all_movies')
+@catalog_conditional
 def get_all_movies():
+    """
+    Devuelve el catálogo.
+
+    Sin parámetros devuelve todas las películas en un único documento JSON.
+    Con ?limit= y/o ?cursor= devuelve una página y el cursor de la siguiente.
+    Con ?format=ndjson emite el catálogo completo como NDJSON en streaming,
+    una película por línea, a medida que se analizan las filas del almacén.
+    Con ?user_id= cada película incluye is_favorite para ese usuario.
+    Con ?genre=, ?director= y/o ?rating= (tramo, p. ej. "4-5") filtra el
+    catálogo con el índice de facetas, sin consultar el almacén.
+    """
     try:
-        movies = sparql_manager.get_all_movies()
+        user_id = request.args.get('user_id')
+        filters = {facet: request.args[facet] for facet in FACETS if facet in request.args}
+        if filters:
+            return _filtered_movies(filters, user_id)
+
+        if request.args.get('format') == 'ndjson':
+            movies = _with_favorite_flags(services().sparql_manager.get_all_movies(stream=True), user_id)
+            return Response(stream_with_context(_ndjson_lines(movies)), mimetype='application/x-ndjson')
+
+        if 'limit' in request.args or 'cursor' in request.args:
+            movies, next_cursor = services().sparql_manager.get_movies_page(
+                cursor=request.args.get('cursor') or None,
+                limit=_page_size(),
+            )
+            return jsonify({
+                "status": "success",
+                "movies": list(_with_favorite_flags(movies, user_id)),
+                "next_cursor": next_cursor
+            })
+
+        movies = services().sparql_manager.get_all_movies()
         return jsonify({
             "status": "success",
-            "movies": movies
+            "movies": list(_with_favorite_flags(movies, user_id))
         })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
     except Exception as e:
         logger.error(f"Error al obtener todas las películas: {str(e)}")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+def _filtered_movies(filters, user_id):
+    """Responde /get_all_movies con filtros de facetas, con los mismos formatos y paginación"""
+    paged = 'limit' in request.args or 'cursor' in request.args
+    movies, next_cursor = services().sparql_manager.facets.filter(
+        filters,
+        cursor=request.args.get('cursor') or None,
+        limit=_page_size() if paged else None,
+    )
+    movies = _with_favorite_flags(movies, user_id)
+    if request.args.get('format') == 'ndjson':
+        return Response(stream_with_context(_ndjson_lines(movies)), mimetype='application/x-ndjson')
+    body = {"status": "success", "movies": list(movies)}
+    if paged:
+        body["next_cursor"] = next_cursor
+    return jsonify(body)
+
+@bp.route('/facets')
+def facets():
+    """Recuentos por género, director y tramo de calificación, y sus favoritas"""
+    try:
+        return jsonify({
+            "status": "success",
+            "facets": services().sparql_manager.facets.counts(limit=_page_size(default=100))
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error al obtener las facetas: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+def _ndjson_lines(rows):
+    """Serializa filas como NDJSON; un error a mitad de respuesta solo puede registrarse"""
+    try:
+        for row in rows:
+            yield current_app.json.dumps(row) + '\n'
+    except Exception as e:
+        logger.error(f"Error al emitir películas en streaming: {str(e)}")
+
+def _with_favorite_flags(movies, user_id):
+    """Añade is_favorite a cada película con el conjunto de favoritas del usuario (una consulta como mucho)"""
+    if user_id is None:
+        return movies
+    favorites = services().sparql_manager.get_favorite_iris(user_id)
+    return (dict(movie.to_dict(), is_favorite=movie.iri in favorites) for movie in movies)
+
+def _page_size(default=DEFAULT_PAGE_SIZE):
+    """Lee y valida el parámetro limit de la petición"""
+    try:
+        limit = int(request.args.get('limit', default))
+    except ValueError:
+        raise ValueError("El límite debe ser un número entero")
+    if not (1 <= limit <= MAX_PAGE_SIZE):
+        raise ValueError(f"El límite debe estar entre 1 y {MAX_PAGE_SIZE}")
+    return limit
+
+app = create_app()
+
 if __name__ == '__main__':
     logger.info(f"Templates directory: {TEMPLATE_DIR}")
+    # En desarrollo el almacén se prepara al arrancar; en producción, con flask --app app init-store
+    with app.app_context():
+        services().sparql_manager.setup()
+        # El índice de búsqueda se construye antes de atender la primera petición
+        services().search_index.load()
     app.run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,133 @@
+"""
+Variante asíncrona de SPARQLManager para lanzar consultas independientes en paralelo.
+"""
+from backends import FusekiBackend
+from sparql_manager import EMPTY_PROFILE
+from ids import is_valid_id
+from models import decode_movies
+import asyncio
+import contextvars
+import threading
+import time
+import httpx
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class AsyncSPARQLManager:
+    """
+    Ejecuta las lecturas de un SPARQLManager con asyncio.
+
+    Reutiliza las consultas y las cachés del SPARQLManager envuelto y solo cambia
+    el transporte: con Fuseki usa un httpx.AsyncClient compartido, y con otros
+    backends ejecuta la consulta en un hilo. El bucle de eventos vive en un hilo
+    propio, de modo que las vistas síncronas de Flask pueden lanzar corrutinas con
+    run() y las consultas de distintas peticiones comparten el mismo cliente.
+    """
+
+    def __init__(self, sparql_manager, pool_size=10):
+        self.sparql_manager = sparql_manager
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='async-sparql', daemon=True)
+        self._thread.start()
+
+        self._client = None
+        backend = sparql_manager.backend
+        if isinstance(backend, FusekiBackend):
+            self._endpoint = backend.endpoint
+            self._client = self.run(self._create_client(backend, pool_size))
+
+    async def _create_client(self, backend, pool_size):
+        # El cliente se crea dentro del bucle que lo va a usar
+        connect_timeout, read_timeout = backend.timeout
+        return httpx.AsyncClient(
+            auth=backend.session.auth,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+        )
+
+    def run(self, coro, timeout=None):
+        """
+        Ejecuta una corrutina en el bucle de eventos compartido y espera su resultado.
+
+        La corrutina ve las variables de contexto del hilo que la lanza (por
+        ejemplo, las métricas de la petición HTTP en curso).
+        """
+        return asyncio.run_coroutine_threadsafe(
+            _in_context(contextvars.copy_context(), coro), self._loop
+        ).result(timeout)
+
+    def close(self):
+        if self._client is not None:
+            self.run(self._client.aclose())
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    async def query(self, query, method='AsyncSPARQLManager.query'):
+        """Ejecuta una consulta SELECT o ASK y devuelve el resultado en formato SPARQL JSON"""
+        started = time.perf_counter()
+        size = 0
+        try:
+            if self._client is None:
+                result = await asyncio.to_thread(self.sparql_manager.backend.query, query)
+            else:
+                response = await self._client.post(
+                    f"{self._endpoint}/query",
+                    data={'query': query},
+                    headers={'Accept': 'application/sparql-results+json'},
+                )
+                response.raise_for_status()
+                size = len(response.content)
+                result = response.json()
+        except Exception:
+            self.sparql_manager._observe(method, 'query', started, size=size, error=True)
+            raise
+        rows = len(result.get('results', {}).get('bindings', ()))
+        self.sparql_manager._observe(method, 'query', started, rows=rows, size=size)
+        return result
+
+    async def get_user_profile(self, user_id):
+        """Obtiene el perfil ponderado del usuario (ver SPARQLManager.get_user_profile)"""
+        user_id = str(user_id)
+        if not is_valid_id(user_id):
+            return EMPTY_PROFILE
+        manager = self.sparql_manager
+        profile, version = manager._cached_profile(user_id)
+        if profile is not None:
+            return profile
+        try:
+            results = await self.query(manager._user_profile_query(user_id), 'AsyncSPARQLManager.get_user_profile')
+        except Exception as e:
+            logger.error(f"Error al obtener perfil del usuario: {str(e)}")
+            return EMPTY_PROFILE
+        return manager._store_profile(user_id, version, results["results"]["bindings"])
+
+    async def get_similar_movies(self, user_id, genres, directors, min_rating=3.0):
+        """Encuentra películas similares basadas en géneros y directores preferidos, excluyendo favoritas"""
+        try:
+            results = await self.query(
+                self.sparql_manager._similar_movies_query(user_id, genres, directors, min_rating),
+                'AsyncSPARQLManager.get_similar_movies',
+            )
+            return decode_movies(results["results"]["bindings"])
+        except Exception as e:
+            logger.error(f"Error al obtener películas similares: {str(e)}")
+            return []
+
+    async def get_top_rated_movies(self, user_id, limit=5, exclude=()):
+        """Obtiene las películas mejor calificadas que no son favoritas del usuario"""
+        try:
+            results = await self.query(self.sparql_manager._top_rated_query(user_id, limit, exclude), 'AsyncSPARQLManager.get_top_rated_movies')
+            return decode_movies(results["results"]["bindings"])
+        except Exception as e:
+            logger.error(f"Error al obtener películas mejor calificadas: {str(e)}")
+            return []
+
+
+async def _in_context(context, coro):
+    # La tarea ya corre en su propia copia del contexto; se le copian las variables del llamante
+    for var, value in context.items():
+        var.set(value)
+    return await coro
@@ -0,0 +1,442 @@
+"""
+Backends de almacenamiento para SPARQLManager.
+
+Todos los backends exponen la misma interfaz:
+    setup()                 prepara el almacén (crea el dataset); se ejecuta una vez al desplegar
+    query(query)            ejecuta SELECT/ASK y devuelve resultados en formato SPARQL JSON
+    query_stream(query)     ejecuta un SELECT y genera las filas una a una
+    query_tsv(query)        (solo RDFLibBackend) ejecuta un SELECT y lo devuelve como SPARQL TSV
+    update(update)          ejecuta una operación SPARQL Update
+    upload_turtle(data)     añade tripletas Turtle al grafo por defecto
+
+El backend se elige con la variable de entorno SPARQL_BACKEND:
+    fuseki  (por defecto) servidor Apache Jena Fuseki remoto; FUSEKI_POOL_SIZE,
+            FUSEKI_CONNECT_TIMEOUT y FUSEKI_READ_TIMEOUT ajustan las conexiones
+    rdflib  grafo rdflib en proceso; en memoria, o persistente en disco si se
+            indica RDFLIB_STORE_PATH (RDFLIB_COMPACT_EVERY ajusta cada cuántos
+            cambios se reescribe la instantánea)
+"""
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.plugins.serializers.nt import _nt_row
+from rdflib.plugins.stores.memory import Memory
+from rdflib.util import guess_format
+from requests.adapters import HTTPAdapter
+from contextvars import ContextVar
+import os
+import tempfile
+import threading
+import requests
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bytes transferidos por la última operación del backend en el contexto actual;
+# SPARQLManager los lee para sus métricas (los backends en proceso no los fijan)
+last_response_size = ContextVar('sparql_response_size', default=0)
+
+
+class FusekiBackend:
+    """
+    Backend remoto que envía las consultas a Fuseki por HTTP.
+
+    Usa una única requests.Session con un pool de conexiones keep-alive. Cada
+    llamada construye su propia petición, sin estado compartido entre consultas,
+    así que el backend puede usarse desde varios hilos a la vez.
+    """
+
+    def __init__(self, endpoint, admin_endpoint='http://localhost:3030', dataset_name='movies',
+                 user=None, password=None, pool_size=10, connect_timeout=3.05, read_timeout=30):
+        self.endpoint = endpoint
+        self.admin_endpoint = admin_endpoint
+        self.dataset_name = dataset_name
+        self.timeout = (connect_timeout, read_timeout)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # Configurar autenticación si es necesario
+        if user and password:
+            self.session.auth = (user, password)
+
+    def setup(self):
+        """Crea el dataset en Fuseki si no existe"""
+        try:
+            # Verificar si el dataset existe
+            response = self.session.get(f"{self.admin_endpoint}/$/datasets", timeout=self.timeout)
+            datasets = response.json()
+
+            # Fuseki devuelve los nombres con la barra inicial ('/movies')
+            if not any(ds.get('ds.name', '').lstrip('/') == self.dataset_name for ds in datasets.get('datasets', [])):
+                logger.info(f"Creando dataset '{self.dataset_name}'...")
+                # Crear el dataset
+                create_url = f"{self.admin_endpoint}/$/datasets"
+                response = self.session.post(
+                    create_url,
+                    data={'dbName': self.dataset_name, 'dbType': 'tdb2'},
+                    timeout=self.timeout,
+                )
+                if response.status_code == 200:
+                    logger.info(f"Dataset '{self.dataset_name}' creado exitosamente")
+                else:
+                    logger.error(f"Error al crear dataset: {response.text}")
+        except Exception as e:
+            logger.error(f"Error al inicializar dataset: {str(e)}")
+
+    def query(self, query):
+        response = self.session.post(
+            f"{self.endpoint}/query",
+            data={'query': query},
+            headers={'Accept': 'application/sparql-results+json'},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        last_response_size.set(len(response.content))
+        return response.json()
+
+    def query_stream(self, query):
+        """
+        Ejecuta un SELECT pidiendo resultados TSV y los analiza línea a línea.
+
+        La respuesta se lee en streaming, así que la memoria usada no depende del
+        número de filas. Si el consumidor deja de iterar, la conexión se cierra.
+        """
+        response = self.session.post(
+            f"{self.endpoint}/query",
+            data={'query': query},
+            headers={'Accept': 'text/tab-separated-values'},
+            timeout=self.timeout,
+            stream=True,
+        )
+        size = 0
+        try:
+            response.raise_for_status()
+            lines = response.iter_lines(decode_unicode=False)
+            header = next(lines, b'')
+            size += len(header) + 1
+            header = header.decode('utf-8')
+            variables = [var.lstrip('?$') for var in header.split('\t')] if header else []
+            for line in lines:
+                size += len(line) + 1
+                yield _parse_tsv_row(variables, line.decode('utf-8'))
+        finally:
+            last_response_size.set(size)
+            response.close()
+
+    def update(self, update):
+        response = self.session.post(
+            f"{self.endpoint}/update",
+            data={'update': update},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        last_response_size.set(len(response.request.body or b''))
+
+    def upload_turtle(self, data):
+        """Sube tripletas al grafo por defecto mediante el Graph Store Protocol"""
+        body = data.encode('utf-8')
+        response = self.session.post(
+            f"{self.endpoint}/data",
+            params={'default': ''},
+            data=body,
+            headers={'Content-Type': 'text/turtle; charset=utf-8'},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        last_response_size.set(len(body))
+
+
+class _JournaledMemory(Memory):
+    """Store en memoria de rdflib que anota las tripletas que se añaden y se borran"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Lista de ('A' | 'D', tripleta); None mientras no se anota (carga inicial)
+        self.changes = None
+
+    def add(self, triple, context, quoted=False):
+        if self.changes is not None:
+            self.changes.append(('A', triple))
+        super().add(triple, context, quoted)
+
+    def remove(self, triple_pattern, context=None):
+        if self.changes is not None:
+            # El patrón puede tener comodines: se anotan las tripletas concretas que borra
+            self.changes.extend(('D', triple) for triple, _ in self.triples(triple_pattern, context))
+        super().remove(triple_pattern, context)
+
+
+class RDFLibBackend:
+    """
+    Backend en proceso sobre un rdflib.Graph.
+
+    Sin path el grafo vive solo en memoria. Con path se guarda en disco como una
+    instantánea (path) y un registro de cambios solo de añadido (path + '.log')
+    con una línea N-Triples por tripleta añadida o borrada, así que cada escritura
+    cuesta lo que ocupan sus cambios y no lo que ocupa el grafo. Al abrirlo se
+    carga la instantánea y se reproduce el registro; cuando el registro alcanza
+    compact_every líneas (o el tamaño del grafo, si es mayor) se compacta en una
+    instantánea nueva. Es suficiente para despliegues pequeños, pruebas y benchmarks.
+    """
+
+    def __init__(self, path=None, format=None, compact_every=10000):
+        self.path = path
+        self.format = format or (guess_format(path) if path else None) or 'nt'
+        self.log_path = f"{path}.log" if path else None
+        self.compact_every = compact_every
+        self._store = _JournaledMemory()
+        self.graph = Graph(store=self._store)
+        # El store en memoria de rdflib no admite lecturas y escrituras concurrentes
+        self._lock = threading.RLock()
+        self._log_entries = 0
+
+        if path:
+            if os.path.exists(path):
+                self.graph.parse(path, format=self.format)
+            self._log_entries = self._replay_log()
+            if len(self.graph):
+                logger.info(f"Grafo cargado desde {path} ({len(self.graph)} tripletas)")
+            self._store.changes = []
+
+    def setup(self):
+        """El grafo en proceso no necesita preparación"""
+
+    def query(self, query):
+        with self._lock:
+            return _result_to_json(self.graph.query(query))
+
+    def query_stream(self, query):
+        """
+        Genera las filas de un SELECT convirtiéndolas de una en una.
+
+        Las filas se extraen del grafo bajo el bloqueo y se convierten fuera de él,
+        para no bloquear las escrituras mientras el consumidor itera.
+        """
+        with self._lock:
+            result = self.graph.query(query)
+            variables = [str(var) for var in result.vars]
+            rows = list(result)
+        for row in rows:
+            yield _row_to_json(variables, row)
+
+    def query_tsv(self, query):
+        """Ejecuta un SELECT y devuelve el resultado serializado como SPARQL TSV"""
+        with self._lock:
+            return _result_to_tsv(self.graph.query(query))
+
+    def update(self, update):
+        with self._lock:
+            try:
+                self.graph.update(update)
+            finally:
+                # Una operación que falla a medias ya ha cambiado el grafo en memoria
+                self._save()
+
+    def upload_turtle(self, data):
+        with self._lock:
+            try:
+                self.graph.parse(data=data, format='turtle')
+            finally:
+                self._save()
+
+    def compact(self):
+        """Reescribe la instantánea con el grafo actual y vacía el registro de cambios"""
+        if not self.path:
+            return
+        with self._lock:
+            self._write_snapshot()
+            open(self.log_path, 'w').close()
+            self._log_entries = 0
+            logger.info(f"Grafo compactado en {self.path} ({len(self.graph)} tripletas)")
+
+    def _save(self):
+        """Añade al registro los cambios de la última operación y compacta si ha crecido demasiado"""
+        changes = self._store.changes
+        if not changes:
+            return
+        self._store.changes = []
+        with open(self.log_path, 'a', encoding='utf-8') as log:
+            log.writelines(f"{op} {_nt_row(triple)}" for op, triple in changes)
+        self._log_entries += len(changes)
+        if self._log_entries >= max(self.compact_every, len(self.graph)):
+            self.compact()
+
+    def _replay_log(self):
+        """Aplica al grafo el registro de cambios; devuelve cuántas líneas tenía"""
+        if not os.path.exists(self.log_path):
+            return 0
+        with open(self.log_path, encoding='utf-8') as log:
+            lines = log.readlines()
+        # Una última línea sin salto es una escritura interrumpida: se descarta
+        if lines and not lines[-1].endswith('\n'):
+            lines.pop()
+        # Las líneas seguidas con la misma operación se aplican de una vez
+        i = 0
+        while i < len(lines):
+            op = lines[i][0]
+            j = i
+            while j < len(lines) and lines[j][0] == op:
+                j += 1
+            batch = Graph().parse(data=''.join(line[2:] for line in lines[i:j]), format='nt')
+            if op == 'A':
+                self.graph += batch
+            else:
+                self.graph -= batch
+            i = j
+        return len(lines)
+
+    def _write_snapshot(self):
+        """Escribe el grafo en disco de forma atómica"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(fd)
+        try:
+            self.graph.serialize(destination=tmp_path, format=self.format, encoding='utf-8')
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+
+def _term_to_json(term):
+    """Convierte un término rdflib a su representación SPARQL JSON"""
+    if isinstance(term, URIRef):
+        return {'type': 'uri', 'value': str(term)}
+    if isinstance(term, BNode):
+        return {'type': 'bnode', 'value': str(term)}
+    binding = {'type': 'literal', 'value': str(term)}
+    if term.datatype:
+        binding['datatype'] = str(term.datatype)
+    if term.language:
+        binding['xml:lang'] = term.language
+    return binding
+
+
+def _result_to_json(result):
+    """Convierte un resultado de rdflib al mismo formato que devuelve Fuseki"""
+    if result.type == 'ASK':
+        return {'head': {}, 'boolean': bool(result.askAnswer)}
+
+    variables = [str(var) for var in result.vars]
+    bindings = [_row_to_json(variables, row) for row in result]
+    return {'head': {'vars': variables}, 'results': {'bindings': bindings}}
+
+
+def _row_to_json(variables, row):
+    """Convierte una fila de rdflib a un binding SPARQL JSON, omitiendo las variables sin valor"""
+    return {
+        var: _term_to_json(term)
+        for var, term in zip(variables, row)
+        if term is not None
+    }
+
+
+def _result_to_tsv(result):
+    """Serializa un resultado SELECT de rdflib como SPARQL TSV (términos en sintaxis Turtle)"""
+    variables = [str(var) for var in result.vars]
+    lines = ['\t'.join(f"?{var}" for var in variables)]
+    for row in result:
+        lines.append('\t'.join(_tsv_term(term) for term in row))
+    return '\n'.join(lines) + '\n'
+
+
+_TSV_QUOTES = str.maketrans({'\\': '\\\\', '"': '\\"', '\t': '\\t', '\n': '\\n', '\r': '\\r'})
+
+
+def _tsv_term(term):
+    """Escribe un término en sintaxis Turtle; los literales escapan tabuladores y saltos de línea"""
+    if term is None:
+        return ''
+    if not isinstance(term, Literal):
+        return term.n3()
+    value = f'"{str(term).translate(_TSV_QUOTES)}"'
+    if term.language:
+        return f"{value}@{term.language}"
+    if term.datatype:
+        return f"{value}^^<{term.datatype}>"
+    return value
+
+
+XSD = 'http://www.w3.org/2001/XMLSchema#'
+_TSV_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+
+def _parse_tsv_row(variables, line):
+    """Convierte una línea de resultados SPARQL TSV a un binding SPARQL JSON"""
+    return {
+        var: _parse_tsv_term(field)
+        for var, field in zip(variables, line.split('\t'))
+        if field
+    }
+
+
+def _parse_tsv_term(field):
+    """Convierte un término en sintaxis Turtle (formato TSV) a SPARQL JSON"""
+    if field.startswith('<') and field.endswith('>'):
+        return {'type': 'uri', 'value': field[1:-1]}
+    if field.startswith('_:'):
+        return {'type': 'bnode', 'value': field[2:]}
+    if field.startswith('"'):
+        end = field.rindex('"')
+        binding = {'type': 'literal', 'value': _unescape(field[1:end])}
+        suffix = field[end + 1:]
+        if suffix.startswith('^^<'):
+            binding['datatype'] = suffix[3:-1]
+        elif suffix.startswith('@'):
+            binding['xml:lang'] = suffix[1:]
+        return binding
+    # Literales abreviados de Turtle: booleanos y números sin comillas
+    if field in ('true', 'false'):
+        return {'type': 'literal', 'value': field, 'datatype': XSD + 'boolean'}
+    if 'e' in field.lower():
+        datatype = 'double'
+    elif '.' in field:
+        datatype = 'decimal'
+    else:
+        datatype = 'integer'
+    return {'type': 'literal', 'value': field, 'datatype': XSD + datatype}
+
+
+def _unescape(value):
+    """Deshace los escapes de cadena de Turtle"""
+    if '\\' not in value:
+        return value
+    chars = []
+    i = 0
+    while i < len(value):
+        char = value[i]
+        if char == '\\' and i + 1 < len(value):
+            escape = value[i + 1]
+            if escape in ('u', 'U'):
+                width = 4 if escape == 'u' else 8
+                chars.append(chr(int(value[i + 2:i + 2 + width], 16)))
+                i += 2 + width
+                continue
+            chars.append(_TSV_ESCAPES.get(escape, escape))
+            i += 2
+            continue
+        chars.append(char)
+        i += 1
+    return ''.join(chars)
+
+
+def create_backend():
+    """Crea el backend indicado en la configuración"""
+    kind = os.getenv('SPARQL_BACKEND', 'fuseki').lower()
+    if kind == 'rdflib':
+        return RDFLibBackend(
+            os.getenv('RDFLIB_STORE_PATH') or None,
+            compact_every=int(os.getenv('RDFLIB_COMPACT_EVERY', '10000')),
+        )
+    if kind != 'fuseki':
+        raise ValueError(f"Backend SPARQL desconocido: {kind}")
+    return FusekiBackend(
+        os.getenv('FUSEKI_ENDPOINT', 'http://localhost:3030/movies'),
+        user=os.getenv('FUSEKI_USER'),
+        password=os.getenv('FUSEKI_PASSWORD'),
+        pool_size=int(os.getenv('FUSEKI_POOL_SIZE', '10')),
+        connect_timeout=float(os.getenv('FUSEKI_CONNECT_TIMEOUT', '3.05')),
+        read_timeout=float(os.getenv('FUSEKI_READ_TIMEOUT', '30')),
+    )
@@ -0,0 +1,288 @@
+"""
+Benchmarks de SPARQLManager y MovieAgent sobre catálogos sintéticos.
+
+Genera un catálogo y un grafo de favoritas reproducibles a partir de una
+semilla, los carga en un almacén rdflib en memoria (o en el backend que indique
+SPARQL_BACKEND con --backend env) y mide las operaciones principales. El
+resultado se escribe como JSON para poder compararlo entre cambios.
+
+La carga masiva usa por defecto el Graph Store Protocol: el analizador de
+SPARQL Update de rdflib crece de forma cuadrática con el tamaño de cada
+INSERT DATA, y con --insert-data se mide precisamente ese camino.
+
+Uso:
+    python app/benchmark.py --size small --output bench.json
+    python app/benchmark.py --movies 50000 --users 5000 --compare bench.json
+"""
+from sparql_manager import SPARQLManager
+from movie_agent import MovieAgent
+from backends import RDFLibBackend, create_backend
+from itertools import accumulate
+import argparse
+import json
+import logging
+import platform
+import random
+import statistics
+import sys
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Tamaños predefinidos: (películas, usuarios)
+SIZES = {
+    'small': (1_000, 10),
+    'medium': (10_000, 1_000),
+    'large': (100_000, 10_000),
+    'xlarge': (1_000_000, 100_000),
+}
+
+GENRES = (
+    'Action', 'Adventure', 'Animation', 'Comedy', 'Crime', 'Drama', 'Fantasy',
+    'Horror', 'Musical', 'Romance', 'Sci-Fi', 'Thriller', 'Western',
+)
+
+
+def generate_catalog(movie_count, seed=0):
+    """
+    Genera un catálogo sintético reproducible.
+
+    Hay un director por cada diez películas y las calificaciones siguen una
+    distribución aproximadamente normal en torno a 3.5.
+    """
+    rng = random.Random(seed)
+    director_count = max(1, movie_count // 10)
+    for i in range(movie_count):
+        yield {
+            'id': f"bench_{i}",
+            'title': f"Película {i}",
+            'director': f"Director {rng.randrange(director_count)}",
+            'genre': rng.choice(GENRES),
+            'rating': round(min(5.0, max(1.0, rng.gauss(3.5, 0.8))), 1),
+        }
+
+
+def generate_favorites(user_count, movie_count, per_user=10, seed=0):
+    """
+    Genera pares (usuario, película) de favoritas reproducibles.
+
+    La popularidad de las películas sigue una ley de Zipf, así que unas pocas
+    acumulan muchas favoritas, como en un catálogo real.
+    """
+    rng = random.Random(seed + 1)
+    cum_weights = list(accumulate(1.0 / (rank + 1) for rank in range(movie_count)))
+    for user in range(user_count):
+        count = max(1, min(movie_count, int(rng.expovariate(1.0 / per_user))))
+        movies = set(rng.choices(range(movie_count), cum_weights=cum_weights, k=count))
+        for movie in movies:
+            yield f"bench_{user}", f"bench_{movie}"
+
+
+def load_favorites(manager, favorites, batch_size=5000, use_graph_store=True):
+    """Inserta las favoritas por lotes y devuelve cuántas se insertaron"""
+    total = 0
+    batch = []
+
+    def flush():
+        triples = "\n".join(f"ex:user_{u} ex:hasFavorite ex:movie_{m} ." for u, m in batch)
+        if use_graph_store:
+            manager._upload_turtle(triples, 'benchmark.load_favorites')
+        else:
+            manager.update(f"PREFIX ex: <http://example.org/movies#>\nINSERT DATA {{\n{triples}\n}}", 'benchmark.load_favorites')
+
+    for pair in favorites:
+        batch.append(pair)
+        if len(batch) >= batch_size:
+            flush()
+            total += len(batch)
+            batch = []
+    if batch:
+        flush()
+        total += len(batch)
+    return total
+
+
+def measure(fn, repeat):
+    """Ejecuta fn repeat veces y devuelve las duraciones en segundos"""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations, items=None):
+    """Resume una serie de duraciones en milisegundos"""
+    ordered = sorted(durations)
+    summary = {
+        'runs': len(ordered),
+        'min_ms': ordered[0] * 1000,
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': ordered[len(ordered) // 2] * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+    if items is not None:
+        summary['items'] = items
+        summary['items_per_s'] = items / sum(ordered) if sum(ordered) else 0.0
+    return summary
+
+
+def run_benchmarks(manager, movie_count, user_count, per_user=10, repeat=5, seed=0, batch_size=1000,
+                   use_graph_store=True):
+    """Carga los datos sintéticos en manager, ejecuta los benchmarks y devuelve los resultados"""
+    results = {}
+    rng = random.Random(seed + 2)
+    queries = [0]
+    manager.add_query_hook(lambda *args, **kwargs: queries.__setitem__(0, queries[0] + 1))
+
+    def bench(name, fn, runs=repeat, items=None):
+        # items puede ser una función que devuelve cuántos elementos procesó la última ejecución
+        before = queries[0]
+        durations = measure(fn, runs)
+        summary = summarize(durations, items=items() if callable(items) else items)
+        summary['queries_per_run'] = (queries[0] - before) / runs
+        results[name] = summary
+        logger.info(f"{name}: p50 {summary['p50_ms']:.2f} ms")
+
+    loaded = {}
+    bench('bulk_load_movies', lambda: loaded.__setitem__('movies', manager.add_movies(
+        generate_catalog(movie_count, seed), batch_size=batch_size, use_graph_store=use_graph_store
+    )), runs=1, items=lambda: loaded['movies'])
+    bench('bulk_load_favorites', lambda: loaded.__setitem__('favorites', load_favorites(
+        manager, generate_favorites(user_count, movie_count, per_user, seed), use_graph_store=use_graph_store
+    )), runs=1, items=lambda: loaded['favorites'])
+
+    def cold_all_movies():
+        manager._read_cache.clear()
+        manager.get_all_movies()
+
+    bench('get_all_movies_cold', cold_all_movies)
+    bench('get_all_movies_cached', manager.get_all_movies)
+
+    agent = MovieAgent(manager)
+
+    def random_user():
+        return f"bench_{rng.randrange(user_count)}"
+
+    def similar_movies():
+        user_id = random_user()
+        manager._invalidate_profile(user_id)
+        genres, directors = agent._top_preferences(manager.get_user_profile(user_id))
+        manager.get_similar_movies(user_id, genres, directors)
+
+    bench('get_similar_movies', similar_movies)
+
+    if agent.recommender is not None:
+        def load_engines():
+            agent.recommender.load()
+            if agent.collaborative is not None:
+                agent.collaborative.load()
+
+        bench('recommender_load', load_engines, runs=1)
+
+    def cold_recommendations():
+        user_id = random_user()
+        manager._invalidate_profile(user_id)
+        agent.get_recommendations(user_id)
+
+    bench('get_recommendations', cold_recommendations)
+
+    batch_users = [f"bench_{user}" for user in range(min(user_count, 100))]
+
+    def batch_recommendations():
+        for user_id in batch_users:
+            manager._invalidate_profile(user_id)
+        list(agent.get_recommendations_batch(batch_users))
+
+    bench('get_recommendations_batch', batch_recommendations, items=len(batch_users) * repeat)
+
+    def toggle_favorite():
+        user_id = random_user()
+        movie_id = f"bench_{rng.randrange(movie_count)}"
+        manager.toggle_favorite_movie(user_id, movie_id)
+
+    bench('toggle_favorite', toggle_favorite)
+    return results
+
+
+def build_report(results, args):
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'parameters': {
+            'backend': args.backend,
+            'movies': args.movies,
+            'users': args.users,
+            'favorites_per_user': args.favorites_per_user,
+            'repeat': args.repeat,
+            'seed': args.seed,
+            'batch_size': args.batch_size,
+            'insert_data': args.insert_data,
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    """Muestra la variación de la mediana de cada benchmark respecto a un informe anterior"""
+    for name, summary in report['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if not previous or not previous['p50_ms']:
+            print(f"{name:28} {summary['p50_ms']:10.2f} ms")
+            continue
+        ratio = summary['p50_ms'] / previous['p50_ms']
+        print(f"{name:28} {summary['p50_ms']:10.2f} ms  (antes {previous['p50_ms']:.2f} ms, x{ratio:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks sobre un catálogo sintético")
+    parser.add_argument('--size', choices=sorted(SIZES), default='small', help="Tamaño predefinido del catálogo")
+    parser.add_argument('--movies', type=int, help="Número de películas (sustituye a --size)")
+    parser.add_argument('--users', type=int, help="Número de usuarios (sustituye a --size)")
+    parser.add_argument('--favorites-per-user', type=int, default=10, help="Media de favoritas por usuario")
+    parser.add_argument('--repeat', type=int, default=20, help="Repeticiones de cada operación")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla del generador")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Películas por lote en la carga")
+    parser.add_argument('--insert-data', action='store_true',
+                        help="Cargar con SPARQL INSERT DATA en lugar del Graph Store Protocol")
+    parser.add_argument('--backend', choices=['memory', 'env'], default='memory',
+                        help="memory: grafo rdflib en memoria; env: el backend configurado en SPARQL_BACKEND")
+    parser.add_argument('--output', help="Archivo JSON donde guardar el informe")
+    parser.add_argument('--compare', help="Informe JSON anterior con el que comparar")
+    args = parser.parse_args()
+
+    default_movies, default_users = SIZES[args.size]
+    args.movies = args.movies or default_movies
+    args.users = args.users or default_users
+
+    manager = SPARQLManager(RDFLibBackend() if args.backend == 'memory' else create_backend())
+    manager.setup()
+    logging.getLogger('sparql_manager').setLevel(logging.WARNING)
+    results = run_benchmarks(
+        manager,
+        args.movies,
+        args.users,
+        per_user=args.favorites_per_user,
+        repeat=args.repeat,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        use_graph_store=not args.insert_data,
+    )
+    report = build_report(results, args)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            compare(report, json.load(f))
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Caché en proceso para resultados de consultas de lectura.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+MISSING = object()
+
+
+class LRUCache:
+    """
+    Caché LRU acotada, con caducidad opcional y segura entre hilos.
+
+    Las entradas más antiguas se descartan al superar maxsize, y las que tienen
+    más de ttl segundos se consideran caducadas (ttl=None las mantiene hasta
+    que se expulsan). Lleva la cuenta de aciertos, fallos y expulsiones.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=MISSING):
+        """Devuelve el valor cacheado o default si no está o ha caducado"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at is None or expires_at > self._clock():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        """Descarta una entrada y devuelve su valor, o default si no estaba"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+            }
@@ -0,0 +1,131 @@
+"""
+Filtrado colaborativo ítem-ítem a partir de las relaciones ex:hasFavorite.
+"""
+from collections import Counter, defaultdict
+import math
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ItemCooccurrence:
+    """
+    Índice de coocurrencia entre películas favoritas de todos los usuarios.
+
+    La matriz ítem-ítem se guarda dispersa como diccionario de diccionarios
+    (película -> {película: nº de usuarios que marcaron ambas}), al estilo de
+    una matriz DOK, junto con la popularidad de cada película. Se construye una
+    vez desde el almacén y después se actualiza con los eventos de favoritos,
+    con un coste proporcional a los favoritos del usuario afectado. Cuando
+    caduca la generación del catálogo (evento catalog_expired) se reconstruye,
+    para recoger las favoritas que hayan cambiado otros procesos.
+    """
+
+    def __init__(self, sparql_manager):
+        self.sparql_manager = sparql_manager
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._user_items = defaultdict(set)         # IRI de usuario -> IRIs de favoritas
+        self._cooc = defaultdict(Counter)           # matriz dispersa ítem-ítem
+        self._popularity = Counter()                # IRI de película -> nº de usuarios
+
+        sparql_manager.subscribe(self._on_event)
+
+    def load(self):
+        """Construye el índice con todas las favoritas del almacén"""
+        query = """
+            PREFIX ex: <http://example.org/movies#>
+            SELECT ?user ?movie
+            WHERE { ?user ex:hasFavorite ?movie . }
+            """
+        with self._lock:
+            self._user_items = defaultdict(set)
+            self._cooc = defaultdict(Counter)
+            self._popularity = Counter()
+            edges = 0
+            for row in self.sparql_manager.iter_query(query, 'ItemCooccurrence.load'):
+                self._add(row['user']['value'], row['movie']['value'])
+                edges += 1
+            self._loaded = True
+            logger.info(f"Índice colaborativo cargado con {edges} favoritas")
+
+    def _ensure_loaded(self):
+        # Si la generación del catálogo caducó, catalog_expired descarta el índice
+        self.sparql_manager.check_catalog_expiry()
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def invalidate(self):
+        """Descarta el índice; se vuelve a construir en el siguiente uso"""
+        with self._lock:
+            self._loaded = False
+
+    def _on_event(self, event, payload):
+        if event not in ('favorite_added', 'favorite_removed', 'favorite_unknown', 'catalog_expired'):
+            return
+        # El bloqueo se toma antes de mirar _loaded para que un cambio durante load()
+        # espere a que termine; _add y _remove ignoran lo que load() ya leyó
+        with self._lock:
+            if not self._loaded:
+                return
+            if event == 'favorite_added':
+                self._add(payload['user'], payload['movie'])
+            elif event == 'favorite_removed':
+                self._remove(payload['user'], payload['movie'])
+            else:
+                self.invalidate()
+
+    def _add(self, user, movie):
+        items = self._user_items[user]
+        if movie in items:
+            return
+        for other in items:
+            self._cooc[movie][other] += 1
+            self._cooc[other][movie] += 1
+        items.add(movie)
+        self._popularity[movie] += 1
+
+    def _remove(self, user, movie):
+        items = self._user_items.get(user)
+        if not items or movie not in items:
+            return
+        items.discard(movie)
+        for other in items:
+            for a, b in ((movie, other), (other, movie)):
+                self._cooc[a][b] -= 1
+                if self._cooc[a][b] <= 0:
+                    del self._cooc[a][b]
+        self._popularity[movie] -= 1
+        if self._popularity[movie] <= 0:
+            del self._popularity[movie]
+        if not items:
+            del self._user_items[user]
+
+    def scores(self, favorites, exclude=()):
+        """
+        Puntúa las películas relacionadas con las favoritas dadas.
+
+        Usa la similitud coseno entre ítems (coocurrencia normalizada por la
+        popularidad de ambas películas) sumada sobre las favoritas, y reescala
+        el resultado a [0, 1]. Devuelve {IRI de película: puntuación}.
+        """
+        self._ensure_loaded()
+        scores = Counter()
+        with self._lock:
+            for favorite in favorites:
+                popularity = self._popularity.get(favorite)
+                if not popularity:
+                    continue
+                for other, count in self._cooc.get(favorite, {}).items():
+                    scores[other] += count / math.sqrt(popularity * self._popularity[other])
+
+        for movie in (*favorites, *exclude):
+            scores.pop(movie, None)
+        if not scores:
+            return {}
+        top = max(scores.values())
+        return {movie: score / top for movie, score in scores.items()}
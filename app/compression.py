@@ -0,0 +1,53 @@
+"""
+Compresión de las respuestas grandes con gzip, o con brotli si está instalado.
+"""
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    # brotli es opcional: sin él se usa solo gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html')
+
+
+def choose_encoding(accept_encodings):
+    """
+    Elige 'br' o 'gzip' según la cabecera Accept-Encoding (un objeto Accept de
+    Werkzeug), o None si el cliente no acepta ninguna. A igual calidad se
+    prefiere brotli, que comprime más el JSON.
+    """
+    candidates = [('br', accept_encodings.quality('br'))] if brotli is not None else []
+    candidates.append(('gzip', accept_encodings.quality('gzip')))
+    encoding, quality = max(candidates, key=lambda candidate: candidate[1])
+    return encoding if quality > 0 else None
+
+
+def compress_response(response, accept_encodings, min_size=1024):
+    """
+    Comprime en el sitio una respuesta 200 completa (no en streaming) de tipo
+    JSON o HTML a partir de min_size bytes.
+
+    Añade Vary: Accept-Encoding y convierte el ETag en débil, ya que la
+    representación comprimida no es idéntica byte a byte a la original.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype not in COMPRESSIBLE_TYPES or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+
+    data = response.get_data()
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None or len(data) < min_size:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=5))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
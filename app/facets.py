@@ -0,0 +1,185 @@
+"""
+Contadores de facetas del catálogo (género, director, calificación) en memoria.
+"""
+from collections import Counter, defaultdict
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FACETS = ('genre', 'director', 'rating')
+
+
+def rating_bucket(rating):
+    """Tramo de calificación de una película: "0-1", "1-2", ... "4-5" (el 5 entra en "4-5")"""
+    lower = min(4, max(0, int(rating)))
+    return f"{lower}-{lower + 1}"
+
+
+def _facet_values(movie):
+    return {'genre': movie.genre, 'director': movie.director, 'rating': rating_bucket(movie.rating)}
+
+
+class FacetIndex:
+    """
+    Recuentos por género, director y tramo de calificación, y cuántas favoritas
+    acumula cada valor, junto con el conjunto de películas de cada valor.
+
+    Se siembra una vez desde el almacén (el catálogo y las favoritas, leídos
+    en streaming) y después se mantiene con los eventos de SPARQLManager, de
+    modo que ni /facets ni los filtros de /get_all_movies consultan el almacén.
+    Cuando caduca la generación del catálogo (evento catalog_expired) se vuelve
+    a sembrar, para recoger lo que hayan escrito otros procesos.
+    Como en ItemCooccurrence, se guardan las favoritas de cada usuario para que
+    marcar dos veces la misma favorita no la cuente dos veces.
+    """
+
+    def __init__(self, sparql_manager):
+        self.sparql_manager = sparql_manager
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._movies = {}                                  # IRI de película -> Movie
+        self._keys = {}                                    # IRI de película -> clave de orden del catálogo
+        self._values = {}                                  # IRI de película -> {faceta: valor}
+        self._members = {f: defaultdict(set) for f in FACETS}   # faceta -> valor -> IRIs
+        self._favorites = {f: Counter() for f in FACETS}   # faceta -> valor -> nº de favoritas
+        self._user_favorites = defaultdict(set)            # IRI de usuario -> IRIs de favoritas
+
+        sparql_manager.subscribe(self._on_event)
+
+    def load(self):
+        """Siembra (o vuelve a sembrar) los contadores desde el almacén"""
+        query = """
+            PREFIX ex: <http://example.org/movies#>
+            SELECT ?user ?movie
+            WHERE { ?user ex:hasFavorite ?movie . }
+            """
+        with self._lock:
+            self._movies = {}
+            self._keys = {}
+            self._values = {}
+            self._members = {f: defaultdict(set) for f in FACETS}
+            self._favorites = {f: Counter() for f in FACETS}
+            self._user_favorites = defaultdict(set)
+            for movie in self.sparql_manager.get_all_movies(stream=True):
+                self._add_movie(movie)
+            for row in self.sparql_manager.iter_query(query, 'FacetIndex.load'):
+                self._add_favorite(row['user']['value'], row['movie']['value'])
+            self._loaded = True
+            logger.info(f"Facetas cargadas con {len(self._movies)} películas")
+
+    def _ensure_loaded(self):
+        # Si la generación del catálogo caducó, catalog_expired descarta los contadores
+        self.sparql_manager.check_catalog_expiry()
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def invalidate(self):
+        """Descarta los contadores; se vuelven a sembrar en el siguiente uso"""
+        with self._lock:
+            self._loaded = False
+
+    def _on_event(self, event, payload):
+        # El bloqueo se toma antes de mirar _loaded para que un cambio durante load()
+        # espere a que termine; las altas ya leídas por load() se descartan
+        with self._lock:
+            # Antes de la primera carga no hay nada que actualizar: load() leerá estos cambios
+            if not self._loaded:
+                return
+            if event == 'movies_added':
+                for movie in payload:
+                    self._add_movie(movie)
+            elif event == 'favorite_added':
+                self._add_favorite(payload['user'], payload['movie'])
+            elif event == 'favorite_removed':
+                self._remove_favorite(payload['user'], payload['movie'])
+            elif event in ('favorite_unknown', 'catalog_expired'):
+                self.invalidate()
+
+    def _add_movie(self, movie):
+        iri = movie.iri
+        if iri in self._movies:
+            return
+        values = _facet_values(movie)
+        self._movies[iri] = movie
+        self._keys[iri] = movie.sort_key
+        self._values[iri] = values
+        for facet, value in values.items():
+            self._members[facet][value].add(iri)
+
+    def _add_favorite(self, user, movie):
+        favorites = self._user_favorites[user]
+        if movie in favorites:
+            return
+        favorites.add(movie)
+        for facet, value in self._values.get(movie, {}).items():
+            self._favorites[facet][value] += 1
+
+    def _remove_favorite(self, user, movie):
+        favorites = self._user_favorites.get(user)
+        if not favorites or movie not in favorites:
+            return
+        favorites.discard(movie)
+        for facet, value in self._values.get(movie, {}).items():
+            self._favorites[facet][value] -= 1
+            if self._favorites[facet][value] <= 0:
+                del self._favorites[facet][value]
+        if not favorites:
+            del self._user_favorites[user]
+
+    def counts(self, limit=None):
+        """
+        Recuentos de cada faceta, de mayor a menor.
+
+        Devuelve {'total', 'genre', 'director', 'rating', 'favorites'}; cada
+        faceta es una lista de {'value', 'count', 'favorites'} con como mucho
+        limit valores (los tramos de calificación van siempre completos y en orden).
+        """
+        self._ensure_loaded()
+        with self._lock:
+            result = {
+                'total': len(self._movies),
+                'favorites': sum(len(favorites) for favorites in self._user_favorites.values()),
+            }
+            for facet in FACETS:
+                members = self._members[facet]
+                if facet == 'rating':
+                    values = sorted(members)
+                else:
+                    values = sorted(members, key=lambda value: (-len(members[value]), value))[:limit]
+                result[facet] = [
+                    {'value': value, 'count': len(members[value]), 'favorites': self._favorites[facet][value]}
+                    for value in values
+                ]
+        return result
+
+    def filter(self, filters, cursor=None, limit=None):
+        """
+        Películas que cumplen todos los filtros ({faceta: valor}), en el orden
+        del catálogo, intersecando los conjuntos de cada valor.
+
+        Admite la misma paginación por cursor que get_movies_page; devuelve
+        (películas, siguiente_cursor).
+        """
+        unknown = set(filters) - set(FACETS)
+        if unknown:
+            raise ValueError(f"Faceta desconocida: {', '.join(sorted(unknown))}")
+        after = None
+        if cursor:
+            rating, title, movie = self.sparql_manager._decode_cursor(cursor)
+            after = (-rating, title, movie)
+        self._ensure_loaded()
+        with self._lock:
+            sets = sorted((self._members[f].get(v, set()) for f, v in filters.items()), key=len)
+            matches = set(sets[0]).intersection(*sets[1:]) if sets else set(self._movies)
+            keys = sorted(self._keys[iri] for iri in matches)
+            if after is not None:
+                keys = [key for key in keys if key > after]
+            next_cursor = None
+            if limit is not None and len(keys) > limit:
+                keys = keys[:limit]
+                next_cursor = self.sparql_manager._encode_cursor(self._movies[keys[-1][2]])
+            return [self._movies[key[2]] for key in keys], next_cursor
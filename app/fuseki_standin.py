@@ -0,0 +1,144 @@
+"""
+Servidor local que imita el protocolo HTTP de Fuseki sobre un grafo rdflib.
+
+Implementa lo que usan FusekiBackend y AsyncSPARQLManager:
+    GET|POST /<dataset>/query     SELECT/ASK, resultados SPARQL JSON o TSV
+    POST     /<dataset>/update    SPARQL Update
+    POST     /<dataset>/data      Graph Store Protocol (Turtle, grafo por defecto)
+    GET|POST /$/datasets          listado y creación de datasets
+
+Cada petición puede retrasarse con --latency (y --jitter) para simular un
+almacén remoto. Sirve para pruebas de carga de la aplicación sin Fuseki.
+
+Uso:
+    python app/fuseki_standin.py --port 3030 --latency 0.005 --movies 10000 --users 1000
+    FUSEKI_ENDPOINT=http://localhost:3030/movies python app/app.py
+"""
+from flask import Flask, Response, request, jsonify
+from backends import RDFLibBackend
+from sparql_manager import SPARQLManager
+from benchmark import generate_catalog, generate_favorites, load_favorites
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class FusekiStandIn:
+    """Datasets rdflib en memoria expuestos con el protocolo de Fuseki"""
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.datasets = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def dataset(self, name, create=False):
+        with self._lock:
+            backend = self.datasets.get(name)
+            if backend is None and create:
+                backend = self.datasets[name] = RDFLibBackend()
+            return backend
+
+    def delay(self):
+        """Simula la latencia de red y del almacén"""
+        if self.latency or self.jitter:
+            with self._lock:
+                extra = self._rng.uniform(0, self.jitter) if self.jitter else 0.0
+            time.sleep(self.latency + extra)
+
+
+def create_standin_app(standin):
+    app = Flask(__name__)
+
+    @app.before_request
+    def inject_latency():
+        standin.delay()
+
+    @app.route('/$/datasets', methods=['GET', 'POST'])
+    def datasets():
+        if request.method == 'POST':
+            name = request.form.get('dbName', '').lstrip('/')
+            if not name:
+                return "Falta dbName", 400
+            standin.dataset(name, create=True)
+            return "", 200
+        return jsonify({'datasets': [
+            {'ds.name': f"/{name}", 'ds.state': True} for name in sorted(standin.datasets)
+        ]})
+
+    @app.route('/<dataset>/query', methods=['GET', 'POST'])
+    def query(dataset):
+        backend = standin.dataset(dataset)
+        if backend is None:
+            return f"Dataset no encontrado: {dataset}", 404
+        sparql = request.values.get('query')
+        if not sparql:
+            return "Falta el parámetro query", 400
+        try:
+            if 'text/tab-separated-values' in request.headers.get('Accept', ''):
+                return Response(backend.query_tsv(sparql), mimetype='text/tab-separated-values')
+            return Response(json.dumps(backend.query(sparql)), mimetype='application/sparql-results+json')
+        except Exception as e:
+            return f"Error en la consulta: {str(e)}", 400
+
+    @app.route('/<dataset>/update', methods=['POST'])
+    def update(dataset):
+        backend = standin.dataset(dataset)
+        if backend is None:
+            return f"Dataset no encontrado: {dataset}", 404
+        sparql = request.form.get('update')
+        if not sparql:
+            return "Falta el parámetro update", 400
+        try:
+            backend.update(sparql)
+        except Exception as e:
+            return f"Error en la actualización: {str(e)}", 400
+        return "", 204
+
+    @app.route('/<dataset>/data', methods=['POST'])
+    def data(dataset):
+        backend = standin.dataset(dataset)
+        if backend is None:
+            return f"Dataset no encontrado: {dataset}", 404
+        try:
+            backend.upload_turtle(request.get_data(as_text=True))
+        except Exception as e:
+            return f"Error al cargar los datos: {str(e)}", 400
+        return "", 204
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local compatible con el protocolo de Fuseki")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3030)
+    parser.add_argument('--dataset', default='movies', help="Dataset que se crea al arrancar")
+    parser.add_argument('--latency', type=float, default=0.0, help="Retraso fijo por petición, en segundos")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Retraso aleatorio adicional máximo, en segundos")
+    parser.add_argument('--movies', type=int, default=0, help="Películas sintéticas que se cargan al arrancar")
+    parser.add_argument('--users', type=int, default=0, help="Usuarios sintéticos con favoritas")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla de los datos sintéticos y del jitter")
+    args = parser.parse_args()
+
+    standin = FusekiStandIn(latency=args.latency, jitter=args.jitter, seed=args.seed)
+    backend = standin.dataset(args.dataset, create=True)
+    if args.movies:
+        manager = SPARQLManager(backend)
+        manager.setup()
+        manager.add_movies(generate_catalog(args.movies, args.seed), batch_size=5000, use_graph_store=True)
+        favorites = load_favorites(manager, generate_favorites(args.users, args.movies, seed=args.seed))
+        logger.info(f"Cargadas {args.movies} películas y {favorites} favoritas en '{args.dataset}'")
+
+    create_standin_app(standin).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Asignación de IDs únicos y ordenados por tiempo para las películas, y
+validación de los IDs que forman las IRIs de películas y usuarios.
+"""
+import os
+import re
+import secrets
+import threading
+import time
+
+
+# Caracteres que no pueden aparecer en una IRI (IRIREF de SPARQL y Turtle)
+_IRI_FORBIDDEN = re.compile(r'[\x00-\x20<>"{}|^`\\]')
+
+
+def is_valid_id(value):
+    """
+    Indica si value puede usarse como nombre local de la IRI de una película o
+    un usuario (ex:movie_<id>, ex:user_<id>).
+
+    Solo rechaza lo que no cabe en una IRI (espacios, controles y <>"{}|^`\\),
+    así que los IDs antiguos con tildes o dos puntos siguen siendo válidos.
+    """
+    return isinstance(value, str) and bool(value) and not _IRI_FORBIDDEN.search(value)
+
+
+class IdAllocator:
+    """
+    Genera IDs únicos, ordenados por tiempo y seguros entre hilos y procesos.
+
+    Cada ID son 24 dígitos hexadecimales: 48 bits de milisegundos desde 1970,
+    32 bits aleatorios por proceso y 16 bits de secuencia dentro del mismo
+    milisegundo. El orden lexicográfico coincide con el de creación dentro de
+    un proceso, y el componente aleatorio evita colisiones entre procesos o
+    máquinas sin coordinación. El componente se renueva tras un fork, y si el
+    reloj retrocede o la secuencia se agota se sigue en el milisegundo
+    siguiente en lugar de esperar. Los IDs sirven como nombre local de una IRI.
+    """
+
+    SEQUENCE_BITS = 16
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._sequence = 0
+        self._pid = None
+        self._node = 0
+
+    def new_id(self):
+        with self._lock:
+            pid = os.getpid()
+            if pid != self._pid:
+                self._pid = pid
+                self._node = secrets.randbits(32)
+                self._sequence = 0
+
+            now_ms = int(self._clock() * 1000)
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                self._sequence += 1
+                if self._sequence >> self.SEQUENCE_BITS:
+                    self._last_ms += 1
+                    self._sequence = 0
+            return f"{self._last_ms:012x}{self._node:08x}{self._sequence:04x}"
+
+
+_default_allocator = IdAllocator()
+
+
+def new_movie_id():
+    """Devuelve un ID de película nuevo con el asignador compartido del proceso"""
+    return _default_allocator.new_id()
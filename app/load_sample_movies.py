@@ -1,5 +1,4 @@
 from sparql_manager import SPARQLManager
-import time
 
 sample_movies = [
     {"title": "Inception", "director": "Christopher Nolan", "genre": "Sci-Fi", "rating": 4.8},
@@ -21,17 +20,14 @@ sample_movies = [
 
 def main():
     manager = SPARQLManager()
-    for movie in sample_movies:
-        # Generar un ID único basado en timestamp y título
-        movie_id = str(int(time.time() * 1000)) + movie["title"].replace(" ", "").lower()
-        movie_data = movie.copy()
-        movie_data["id"] = movie_id
-        try:
-            manager.add_movie(movie_data)
-            print(f'Película agregada: {movie["title"]}')
-        except Exception as e:
-            print(f'Error al agregar {movie["title"]}: {e}')
-        time.sleep(0.1)  # Pequeña pausa para evitar IDs duplicados
+    manager.setup()
+    # add_movies asigna a cada película un ID único, sin esperas entre inserciones
+    movies = [movie.copy() for movie in sample_movies]
+    try:
+        total = manager.add_movies(movies)
+        print(f'{total} películas agregadas')
+    except Exception as e:
+        print(f'Error al agregar películas: {e}')
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
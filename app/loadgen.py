@@ -0,0 +1,189 @@
+"""
+Generador de carga para las rutas de la aplicación Flask.
+
+Lanza peticiones a un ritmo fijo (carga abierta): la petición i se programa en
+inicio + i / rate, sin esperar a que terminen las anteriores. La latencia se
+mide desde el instante programado, de modo que si la aplicación no da abasto
+las esperas en cola cuentan (se evita la omisión coordinada). Al terminar
+informa de p50/p95/p99 y del rendimiento de cada ruta.
+
+Uso:
+    python app/fuseki_standin.py --movies 10000 --users 1000 --latency 0.005 &
+    FUSEKI_ENDPOINT=http://localhost:3030/movies python app/app.py &
+    python app/loadgen.py --url http://localhost:5000 --rate 50 --duration 30 --output carga.json
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+import argparse
+import json
+import logging
+import math
+import random
+import threading
+import time
+import requests
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Peso de cada ruta en la mezcla de peticiones
+DEFAULT_MIX = {
+    'get_all_movies': 3,
+    'get_movies_page': 3,
+    'movie_details': 4,
+    'get_recommendations': 4,
+    'is_favorite': 2,
+    'favorite_movie': 1,
+}
+
+
+class Workload:
+    """Construye peticiones aleatorias (pero reproducibles) para cada ruta"""
+
+    def __init__(self, movie_ids, user_count=100, mix=DEFAULT_MIX, seed=0):
+        self.movie_ids = movie_ids
+        self.user_count = user_count
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self._rng = random.Random(seed)
+
+    def next_request(self):
+        """Devuelve (ruta, método, path, cuerpo JSON)"""
+        rng = self._rng
+        route = rng.choices(self.routes, weights=self.weights)[0]
+        user_id = str(rng.randrange(self.user_count))
+        movie_id = rng.choice(self.movie_ids)
+        if route == 'get_all_movies':
+            return route, 'GET', '/get_all_movies', None
+        if route == 'get_movies_page':
+            return route, 'GET', '/get_all_movies?limit=50', None
+        if route == 'movie_details':
+            return route, 'GET', f'/movie_details/{movie_id}', None
+        if route == 'get_recommendations':
+            return route, 'GET', f'/get_recommendations?user_id={user_id}', None
+        if route == 'is_favorite':
+            return route, 'GET', f'/is_favorite/{movie_id}?user_id={user_id}', None
+        return route, 'POST', '/favorite_movie', {'user_id': user_id, 'movie_id': movie_id}
+
+
+def percentile(ordered, fraction):
+    """Percentil por el método del rango más cercano sobre una lista ordenada"""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples, elapsed):
+    """Resume las muestras (ruta, latencia en segundos, correcta) por ruta y en total"""
+    by_route = defaultdict(list)
+    errors = defaultdict(int)
+    for route, latency, ok in samples:
+        by_route[route].append(latency)
+        by_route['total'].append(latency)
+        if not ok:
+            errors[route] += 1
+            errors['total'] += 1
+
+    report = {}
+    for route, latencies in sorted(by_route.items()):
+        latencies.sort()
+        report[route] = {
+            'requests': len(latencies),
+            'errors': errors[route],
+            'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+        }
+    return report
+
+
+def fetch_movie_ids(base_url, limit=1000):
+    """Obtiene IDs de películas existentes para construir las peticiones"""
+    response = requests.get(f"{base_url}/get_all_movies", params={'limit': limit}, timeout=30)
+    response.raise_for_status()
+    return [movie['id'] for movie in response.json()['movies']]
+
+
+def run_load(base_url, workload, rate, duration, concurrency=32, timeout=30):
+    """Lanza la carga y devuelve (muestras, segundos transcurridos)"""
+    local = threading.local()
+    samples = []
+    samples_lock = threading.Lock()
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def send(route, method, path, body, scheduled):
+        ok = False
+        try:
+            response = session().request(method, base_url + path, json=body, timeout=timeout)
+            # Un 4xx (ruta o parámetros erróneos) tampoco es una respuesta correcta;
+            # los 3xx sí, porque incluyen las revalidaciones 304
+            ok = 200 <= response.status_code < 400
+        except requests.RequestException:
+            pass
+        latency = time.perf_counter() - scheduled
+        with samples_lock:
+            samples.append((route, latency, ok))
+
+    total = int(rate * duration)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for i in range(total):
+            scheduled = start + i / rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(send, *workload.next_request(), scheduled)
+    return samples, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de las rutas de la aplicación")
+    parser.add_argument('--url', default='http://localhost:5000', help="URL base de la aplicación")
+    parser.add_argument('--rate', type=float, default=20, help="Peticiones por segundo")
+    parser.add_argument('--duration', type=float, default=30, help="Duración en segundos")
+    parser.add_argument('--concurrency', type=int, default=32, help="Peticiones simultáneas máximas")
+    parser.add_argument('--users', type=int, default=100, help="Usuarios distintos en las peticiones")
+    parser.add_argument('--seed', type=int, default=0, help="Semilla de la mezcla de peticiones")
+    parser.add_argument('--output', help="Archivo JSON donde guardar el informe")
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    movie_ids = fetch_movie_ids(base_url)
+    if not movie_ids:
+        parser.error("La aplicación no tiene películas; cárguelas antes de la prueba")
+    workload = Workload(movie_ids, user_count=args.users, seed=args.seed)
+
+    logger.info(f"Lanzando {args.rate} peticiones/s durante {args.duration} s contra {base_url}")
+    samples, elapsed = run_load(base_url, workload, args.rate, args.duration, concurrency=args.concurrency)
+    report = {
+        'parameters': {
+            'url': base_url,
+            'rate': args.rate,
+            'duration': args.duration,
+            'concurrency': args.concurrency,
+            'users': args.users,
+            'seed': args.seed,
+        },
+        'routes': summarize(samples, elapsed),
+    }
+
+    for route, stats in report['routes'].items():
+        print(
+            f"{route:22} {stats['requests']:7d} pet.  {stats['errors']:5d} errores  "
+            f"{stats['throughput_rps']:8.1f} pet/s  p50 {stats['p50_ms']:8.1f} ms  "
+            f"p95 {stats['p95_ms']:8.1f} ms  p99 {stats['p99_ms']:8.1f} ms"
+        )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
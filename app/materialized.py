@@ -0,0 +1,179 @@
+"""
+Listas de recomendaciones precalculadas por usuario, refrescadas en segundo plano.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import threading
+import time
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class RecommendationStore:
+    """
+    Mantiene la lista de recomendaciones de cada usuario ya calculada.
+
+    Las lecturas son una búsqueda en un diccionario. Cuando un usuario cambia sus
+    favoritas su lista se marca como sucia, y cuando se añaden películas se
+    marcan todas; un pool de hilos acotado las recalcula fuera de la petición
+    con MovieAgent.get_recommendations_batch. Si se pide una lista sucia o que
+    aún no existe se calcula en el momento (salvo que sea más reciente que
+    max_staleness segundos, en cuyo caso se sirve la anterior).
+
+    Los eventos solo llegan desde este proceso: para recoger las favoritas que
+    cambian otros workers, una lista con más de max_age segundos también se
+    calcula de nuevo. max_age nunca supera la caducidad de los perfiles
+    (PROFILE_CACHE_TTL), que es de donde sale la lista recalculada. Como mucho
+    se guardan max_entries usuarios; al superarlo se descartan los menos leídos.
+
+    Cada usuario tiene un número de versión que se incrementa al marcarlo sucio;
+    un refresco solo guarda su resultado si la versión no ha cambiado mientras
+    se calculaba, así que un refresco lento nunca pisa uno más reciente.
+    """
+
+    # Usuarios por llamada a get_recommendations_batch al refrescar tras altas de películas
+    REFRESH_BATCH_SIZE = 256
+
+    def __init__(self, movie_agent, workers=2, max_staleness=0, max_age=None, max_entries=10000,
+                 clock=time.monotonic):
+        self.movie_agent = movie_agent
+        self.max_staleness = max_staleness
+        profile_ttl = movie_agent.sparql_manager.profile_cache_ttl
+        if max_age is None or (profile_ttl is not None and max_age > profile_ttl):
+            max_age = profile_ttl
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recommendations')
+        self._lock = threading.Lock()
+        # Ambos en orden LRU y acotados a max_entries
+        self._entries = OrderedDict()   # user_id -> (recomendaciones, instante de cálculo)
+        self._versions = OrderedDict()  # user_id -> versión
+        self._dirty = {}                # user_id con lista -> instante en que se marcó sucio
+        self._scheduled = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.refresh_errors = 0
+        self._lag_total = 0.0
+        self._lag_max = 0.0
+
+        movie_agent.sparql_manager.subscribe(self._on_event)
+
+    def get(self, user_id, live=None):
+        """
+        Devuelve las recomendaciones del usuario.
+
+        Si la lista no está al día se calcula con live (por defecto
+        MovieAgent.get_recommendations) y se guarda.
+        """
+        user_id = str(user_id)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            dirty_since = self._dirty.get(user_id)
+            version = self._versions.get(user_id, 0)
+            if entry is not None and self.max_age is not None and now - entry[1] >= self.max_age:
+                # Caducada: puede no reflejar cambios hechos desde otros procesos
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+                if dirty_since is None:
+                    self.hits += 1
+                    return entry[0]
+                if now - dirty_since < self.max_staleness:
+                    self.stale_hits += 1
+                    return entry[0]
+            self.misses += 1
+
+        recommendations = live() if live else self.movie_agent.get_recommendations(user_id)
+        self._store(user_id, version, recommendations)
+        return recommendations
+
+    def _store(self, user_id, version, recommendations):
+        """Guarda una lista si el usuario no se ha vuelto a marcar sucio mientras se calculaba"""
+        now = self._clock()
+        with self._lock:
+            if self._versions.get(user_id, 0) != version:
+                return None
+            self._entries[user_id] = (recommendations, now)
+            self._entries.move_to_end(user_id)
+            dirty_since = self._dirty.pop(user_id, None)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._dirty.pop(evicted, None)
+            return now - dirty_since if dirty_since is not None else 0.0
+
+    def _bump_version(self, user_id):
+        # Perder la versión de un usuario expulsado solo impide guardar un cálculo en curso
+        self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self._versions.move_to_end(user_id)
+        while len(self._versions) > self.max_entries:
+            self._versions.popitem(last=False)
+
+    def _on_event(self, event, payload):
+        if event in ('favorite_added', 'favorite_removed', 'favorite_unknown'):
+            self.invalidate([payload['user_id']])
+        elif event == 'movies_added':
+            self.invalidate()
+
+    def invalidate(self, user_ids=None):
+        """Marca como sucias las listas indicadas (todas si no se indica ninguna) y las refresca"""
+        now = self._clock()
+        with self._lock:
+            if user_ids is None:
+                user_ids = list(self._entries)
+            pending = []
+            for user_id in map(str, user_ids):
+                self._bump_version(user_id)
+                # Los usuarios sin lista se calcularán en su primera lectura
+                if user_id not in self._entries:
+                    continue
+                self._dirty.setdefault(user_id, now)
+                if user_id not in self._scheduled:
+                    self._scheduled.add(user_id)
+                    pending.append(user_id)
+
+        for start in range(0, len(pending), self.REFRESH_BATCH_SIZE):
+            self._executor.submit(self._refresh, pending[start:start + self.REFRESH_BATCH_SIZE])
+
+    def _refresh(self, user_ids):
+        with self._lock:
+            # Desde aquí un nuevo cambio vuelve a programar al usuario
+            self._scheduled.difference_update(user_ids)
+            versions = {user_id: self._versions.get(user_id, 0) for user_id in user_ids}
+        try:
+            for user_id, recommendations in self.movie_agent.get_recommendations_batch(user_ids):
+                lag = self._store(user_id, versions[user_id], recommendations)
+                if lag is not None:
+                    with self._lock:
+                        self.refreshes += 1
+                        self._lag_total += lag
+                        self._lag_max = max(self._lag_max, lag)
+        except Exception as e:
+            with self._lock:
+                self.refresh_errors += 1
+            logger.error(f"Error al refrescar recomendaciones: {str(e)}")
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        """Métricas de aciertos, obsolescencia y retraso de los refrescos (en segundos)"""
+        now = self._clock()
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'dirty': len(self._dirty),
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'refreshes': self.refreshes,
+                'refresh_errors': self.refresh_errors,
+                'max_staleness': max((now - since for since in self._dirty.values()), default=0.0),
+                'refresh_lag_avg': self._lag_total / self.refreshes if self.refreshes else 0.0,
+                'refresh_lag_max': self._lag_max,
+            }
@@ -0,0 +1,131 @@
+"""
+Métricas de las consultas SPARQL en formato de texto de Prometheus.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+import threading
+
+# Límites superiores (en segundos) de los buckets de latencia
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Límites de los buckets de consultas por petición HTTP
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+
+class RequestStats:
+    """Consultas hechas al almacén durante una petición HTTP"""
+
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# Estadísticas de la petición en curso; las vistas síncronas y las corrutinas lanzadas
+# desde ellas (ver AsyncSPARQLManager.run) ven el mismo objeto
+current_request = ContextVar('sparql_request_stats', default=None)
+
+
+class _Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class QueryMetrics:
+    """
+    Acumula latencia, filas y bytes de cada consulta, etiquetados por el método
+    que la lanzó y el tipo de operación (query, stream, update, upload).
+
+    Si hay una petición HTTP en curso (current_request), la consulta se suma
+    también a su contador de viajes al almacén.
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS, round_trip_buckets=ROUND_TRIP_BUCKETS):
+        self._lock = threading.Lock()
+        self._latency_buckets = latency_buckets
+        self._round_trip_buckets = round_trip_buckets
+        self._latency = {}                  # (método, operación) -> histograma
+        self._rows = defaultdict(int)       # (método, operación) -> filas
+        self._bytes = defaultdict(int)      # (método, operación) -> bytes
+        self._errors = defaultdict(int)     # (método, operación) -> errores
+        self._round_trips = {}              # endpoint -> histograma
+
+    def observe(self, method, operation, seconds, rows=0, size=0, error=False):
+        """Registra una consulta terminada"""
+        key = (method, operation)
+        with self._lock:
+            histogram = self._latency.get(key)
+            if histogram is None:
+                histogram = self._latency[key] = _Histogram(self._latency_buckets)
+            histogram.observe(seconds)
+            self._rows[key] += rows
+            self._bytes[key] += size
+            if error:
+                self._errors[key] += 1
+
+        stats = current_request.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.seconds += seconds
+
+    def observe_request(self, endpoint, stats):
+        """Registra cuántas consultas hizo una petición HTTP"""
+        with self._lock:
+            histogram = self._round_trips.get(endpoint)
+            if histogram is None:
+                histogram = self._round_trips[endpoint] = _Histogram(self._round_trip_buckets)
+            histogram.observe(stats.queries)
+
+    def render(self):
+        """Devuelve las métricas en el formato de texto de Prometheus"""
+        lines = []
+        with self._lock:
+            lines += _render_histogram(
+                'sparql_query_duration_seconds', "Latencia de las consultas SPARQL por método",
+                {_labels(method=m, operation=o): h for (m, o), h in self._latency.items()},
+            )
+            for name, help_text, values in (
+                ('sparql_query_rows_total', "Filas devueltas por las consultas SPARQL", self._rows),
+                ('sparql_query_bytes_total', "Bytes recibidos o enviados al almacén", self._bytes),
+                ('sparql_query_errors_total', "Consultas SPARQL que fallaron", self._errors),
+            ):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (method, operation), value in sorted(values.items()):
+                    lines.append(f"{name}{{{_labels(method=method, operation=operation)}}} {value}")
+            lines += _render_histogram(
+                'sparql_request_round_trips', "Consultas al almacén por petición HTTP",
+                {_labels(endpoint=e): h for e, h in self._round_trips.items()},
+            )
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _render_histogram(name, help_text, histograms):
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for labels, histogram in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip((*histogram.buckets, '+Inf'), histogram.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {histogram.sum}")
+        lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+    return lines
@@ -0,0 +1,82 @@
+"""
+Registros compactos del dominio, decodificados una sola vez desde las filas SPARQL.
+"""
+
+MOVIE_PREFIX = "http://example.org/movies#movie_"
+
+
+class Movie:
+    """
+    Película del catálogo con la calificación ya convertida a número.
+
+    Usa __slots__ para que un catálogo entero en memoria (cachés, índices y
+    listas de recomendaciones) no pague un diccionario por fila. Se trata como
+    inmutable: varias cachés e índices comparten las mismas instancias.
+    """
+
+    __slots__ = ('iri', 'title', 'director', 'genre', 'rating')
+
+    def __init__(self, iri, title, director, genre, rating):
+        self.iri = iri
+        self.title = title
+        self.director = director
+        self.genre = genre
+        self.rating = float(rating)
+
+    @classmethod
+    def from_binding(cls, row, iri=None):
+        """Decodifica una fila SPARQL JSON con ?movie ?title ?director ?genre ?rating (iri sustituye a ?movie)"""
+        return cls(
+            iri or row['movie']['value'],
+            row['title']['value'],
+            row['director']['value'],
+            row['genre']['value'],
+            row['rating']['value'],
+        )
+
+    @classmethod
+    def from_dict(cls, movie_data):
+        """Crea el registro a partir de los datos de alta ('id', 'title', 'director', 'genre', 'rating')"""
+        return cls(
+            f"{MOVIE_PREFIX}{movie_data['id']}",
+            movie_data['title'],
+            movie_data['director'],
+            movie_data['genre'],
+            movie_data['rating'],
+        )
+
+    @property
+    def id(self):
+        """ID local de la película (la parte de la IRI tras 'movie_')"""
+        return self.iri[len(MOVIE_PREFIX):] if self.iri.startswith(MOVIE_PREFIX) else self.iri
+
+    @property
+    def sort_key(self):
+        """Clave del orden del catálogo: calificación descendente, título e IRI"""
+        return (-self.rating, self.title, self.iri)
+
+    def to_dict(self):
+        """Representación JSON plana de la API"""
+        return {
+            'id': self.id,
+            'title': self.title,
+            'director': self.director,
+            'genre': self.genre,
+            'rating': self.rating,
+        }
+
+    def __eq__(self, other):
+        if not isinstance(other, Movie):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self):
+        return hash(self.iri)
+
+    def __repr__(self):
+        return f"Movie(id={self.id!r}, title={self.title!r}, rating={self.rating})"
+
+
+def decode_movies(rows):
+    """Convierte filas SPARQL de películas en registros Movie"""
+    return [Movie.from_binding(row) for row in rows]
@@ -1,4 +1,8 @@
-from sparql_manager import SPARQLManager
+from sparql_manager import get_sparql_manager
+from recommender import ContentRecommender
+from collaborative import ItemCooccurrence
+import os
+import asyncio
 import logging
 from collections import Counter
 
@@ -6,41 +10,37 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class MovieAgent:
-    def __init__(self):
-        self.sparql_manager = SPARQLManager()
+    def __init__(self, sparql_manager=None):
+        self.sparql_manager = sparql_manager or get_sparql_manager()
+        # Motor vectorial en memoria; RECOMMENDER_ENGINE=sparql usa solo consultas a Fuseki
+        self.recommender = None
+        if os.getenv('RECOMMENDER_ENGINE', 'vector').lower() == 'vector':
+            self.recommender = ContentRecommender(self.sparql_manager)
+        # Filtrado colaborativo ítem-ítem que se mezcla con el motor vectorial; CF_WEIGHT=0 lo desactiva
+        self.cf_weight = float(os.getenv('CF_WEIGHT', '1.0'))
+        self.collaborative = None
+        if self.recommender is not None and self.cf_weight > 0:
+            self.collaborative = ItemCooccurrence(self.sparql_manager)
 
     def get_recommendations(self, user_id):
         """
         Genera recomendaciones de películas basadas en las preferencias del usuario.
         """
         try:
-            # Obtener preferencias del usuario
-            preferences = self.sparql_manager.get_user_preferences(user_id)
-            favorite_directors = self._get_favorite_directors(user_id)
+            # Obtener el perfil del usuario (géneros y directores ponderados) en una consulta
+            profile = self.sparql_manager.get_user_profile(user_id)
             
-            if not preferences and not favorite_directors:
+            if self.recommender is not None:
+                return self._format_recommendations(
+                    self.recommender.recommend(profile, boost=self._collaborative_scores(profile))
+                )
+            
+            if not profile['genres'] and not profile['directors']:
                 logger.info(f"No se encontraron preferencias para el usuario {user_id}")
                 # Si no hay preferencias, devolver las películas mejor calificadas que no son favoritas
                 return self._get_top_rated_non_favorite_movies(user_id)
             
-            # Extraer y ponderar géneros preferidos
-            genres = []
-            if preferences:
-                for pref in preferences:
-                    genre = pref['genre']['value']
-                    count = int(pref['count']['value'])
-                    genres.extend([genre] * count)
-                
-                genre_counts = Counter(genres)
-                top_genres = [genre for genre, _ in genre_counts.most_common(3)]
-            else:
-                top_genres = []
-            
-            # Extraer directores favoritos
-            top_directors = []
-            if favorite_directors:
-                director_counts = Counter(favorite_directors)
-                top_directors = [director for director, _ in director_counts.most_common(2)]
+            top_genres, top_directors = self._top_preferences(profile)
             
             # Obtener películas similares basadas en géneros y directores preferidos
             recommendations = self.sparql_manager.get_similar_movies(
@@ -52,132 +52,180 @@ class MovieAgent:
             
             # Si no hay suficientes recomendaciones, complementar con películas mejor calificadas
             if len(recommendations) < 5:
-                top_rated = self._get_top_rated_non_favorite_movies(user_id, limit=5-len(recommendations))
-                # Evitar duplicados
-                existing_ids = {r['movie']['value'] for r in recommendations}
-                for movie in top_rated:
-                    if movie['movie']['value'] not in existing_ids:
-                        recommendations.append(movie)
+                # Excluir las ya recomendadas para obtener exactamente las que faltan
+                existing_ids = [r.iri for r in recommendations]
+                recommendations.extend(self._get_top_rated_non_favorite_movies(
+                    user_id,
+                    limit=5-len(recommendations),
+                    exclude=existing_ids
+                ))
             
             return self._format_recommendations(recommendations)
         except Exception as e:
             logger.error(f"Error al generar recomendaciones: {str(e)}")
             return []
 
-    def _get_top_rated_non_favorite_movies(self, user_id, limit=5):
+    async def get_recommendations_async(self, user_id, async_manager):
         """
-        Obtiene las películas mejor calificadas que no son favoritas del usuario.
+        Variante asíncrona de get_recommendations.
+
+        Las consultas independientes se lanzan a la vez con async_manager (un
+        AsyncSPARQLManager): el perfil y las mejor calificadas en paralelo, y
+        después las similares, que dependen del perfil.
         """
         try:
-            all_movies = self.sparql_manager.get_all_movies()
-            # Filtrar películas que ya son favoritas
-            non_favorite_movies = []
-            for movie in all_movies:
-                movie_id = movie['movie']['value'].split('#')[1].replace('movie_', '')
-                if not self.sparql_manager.is_favorite_movie(user_id, movie_id):
-                    non_favorite_movies.append(movie)
+            if self.recommender is not None:
+                profile = await async_manager.get_user_profile(user_id)
+                return self._format_recommendations(
+                    self.recommender.recommend(profile, boost=self._collaborative_scores(profile))
+                )
+            
+            # Las 5 mejor calificadas bastan para completar: como mucho se solapan
+            # con tantas similares como huecos dejan estas
+            profile, top_rated = await asyncio.gather(
+                async_manager.get_user_profile(user_id),
+                async_manager.get_top_rated_movies(user_id, limit=5)
+            )
+            
+            if not profile['genres'] and not profile['directors']:
+                logger.info(f"No se encontraron preferencias para el usuario {user_id}")
+                return top_rated
             
-            # Ordenar por calificación
-            sorted_movies = sorted(
-                non_favorite_movies,
-                key=lambda x: float(x['rating']['value']),
-                reverse=True
+            top_genres, top_directors = self._top_preferences(profile)
+            recommendations = await async_manager.get_similar_movies(
+                user_id=user_id,
+                genres=top_genres,
+                directors=top_directors,
+                min_rating=3.5
             )
-            return sorted_movies[:limit]
+            
+            if len(recommendations) < 5:
+                existing_ids = {r.iri for r in recommendations}
+                missing = [m for m in top_rated if m.iri not in existing_ids]
+                recommendations.extend(missing[:5-len(recommendations)])
+            
+            return self._format_recommendations(recommendations)
+        except Exception as e:
+            logger.error(f"Error al generar recomendaciones: {str(e)}")
+            return []
+
+    def get_recommendations_batch(self, user_ids):
+        """
+        Genera recomendaciones para muchos usuarios a la vez.
+
+        Los perfiles se obtienen con unas pocas consultas por lotes y, con el motor
+        vectorial, todos los usuarios se puntúan por bloques de matrices. Devuelve
+        un generador de (user_id, recomendaciones) en el orden recibido.
+        """
+        user_ids = [str(user_id) for user_id in user_ids]
+        profiles = self.sparql_manager.get_user_profiles(user_ids)
+        
+        if self.recommender is None:
+            # Sin motor vectorial cada usuario necesita sus consultas, pero los perfiles ya están en caché
+            for user_id in user_ids:
+                yield user_id, self.get_recommendations(user_id)
+            return
+        
+        ordered = [profiles[user_id] for user_id in user_ids]
+        boosts = [self._collaborative_scores(profile) for profile in ordered]
+        for user_id, recommendations in zip(user_ids, self.recommender.recommend_many(ordered, boosts=boosts)):
+            yield user_id, self._format_recommendations(recommendations)
+
+    def _top_preferences(self, profile):
+        """
+        Géneros y directores preferidos según el número de favoritas.
+        """
+        top_genres = [genre for genre, _ in Counter(profile['genres']).most_common(3)]
+        top_directors = [director for director, _ in Counter(profile['directors']).most_common(2)]
+        return top_genres, top_directors
+
+    def _collaborative_scores(self, profile):
+        """
+        Puntuaciones colaborativas ponderadas para las favoritas del perfil.
+        """
+        if self.collaborative is None or not profile['favorites']:
+            return None
+        try:
+            scores = self.collaborative.scores(profile['favorites'])
+            return {movie: self.cf_weight * score for movie, score in scores.items()}
+        except Exception as e:
+            logger.error(f"Error al obtener puntuaciones colaborativas: {str(e)}")
+            return None
+
+    def _get_top_rated_non_favorite_movies(self, user_id, limit=5, exclude=()):
+        """
+        Obtiene las películas mejor calificadas que no son favoritas del usuario.
+        """
+        try:
+            return self.sparql_manager.get_top_rated_movies(user_id, limit=limit, exclude=exclude)
         except Exception as e:
             logger.error(f"Error al obtener películas mejor calificadas no favoritas: {str(e)}")
             return []
 
-    def generate_opinion(self, movie_id):
+    def get_movies_with_opinions(self, movie_ids):
+        """
+        Detalles y opinión de varias películas con una sola consulta por lote.
+
+        Las opiniones se generan con las filas ya obtenidas. Devuelve
+        {movie_id: (Movie, opinión)} con las películas que existen.
+        """
+        details = self.sparql_manager.get_movies_details(movie_ids)
+        return {
+            movie_id: (movie, self.generate_opinion(movie_id, details=movie))
+            for movie_id, movie in details.items()
+        }
+
+    def generate_opinion(self, movie_id, details=None):
         """
         Genera una opinión sobre una película basada en sus características.
+        Si ya se tienen los detalles de la película, se pueden pasar para no volver a consultarlos.
         """
         try:
-            details = self.sparql_manager.get_movie_details(movie_id)
+            if details is None:
+                details = self.sparql_manager.get_movie_details(movie_id)
             if not details:
                 return "No tengo suficiente información sobre esta película."
 
-            rating = float(details['rating']['value'])
-            genre = details['genre']['value']
-            
-            opinion = f"Esta es una película de {genre}. "
-            
-            if rating >= 4.5:
-                opinion += "Es una película excepcional que no te puedes perder. "
-            elif rating >= 4.0:
-                opinion += "Es una muy buena película que vale la pena ver. "
-            elif rating >= 3.5:
-                opinion += "Es una película entretenida que puede gustarte. "
-            elif rating >= 3.0:
-                opinion += "Es una película decente, aunque tiene sus altibajos. "
-            else:
-                opinion += "Puede que esta película no sea para todos los gustos. "
-
-            if genre == "Action":
-                opinion += "Espera encontrar secuencias emocionantes y mucha adrenalina."
-            elif genre == "Drama":
-                opinion += "Prepárate para una historia emotiva y personajes profundos."
-            elif genre == "Comedy":
-                opinion += "Te hará reír y pasar un buen rato."
-            elif genre == "Horror":
-                opinion += "Te mantendrá al borde de tu asiento con sus momentos de tensión."
-            elif genre == "Sci-Fi":
-                opinion += "Te llevará a un mundo de imaginación y posibilidades."
-            elif genre == "Romance":
-                opinion += "Te envolverá en una historia de amor y emociones."
+            opinion = f"{details.title}, dirigida por {details.director}, es una película de {details.genre}. "
+            opinion += self._get_rating_description(details.rating)
+            opinion += self._get_genre_description(details.genre)
 
             return opinion
         except Exception as e:
             logger.error(f"Error al generar opinión: {str(e)}")
             return "Lo siento, no puedo generar una opinión en este momento."
 
-    def _get_favorite_directors(self, user_id):
+    def _get_rating_description(self, rating):
         """
-        Obtiene los directores de las películas favoritas del usuario
+        Frase de la opinión según la calificación de la película.
         """
-        try:
-            query = f"""
-            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-            PREFIX ex: <http://example.org/movies#>
-            
-            SELECT ?director (COUNT(?movie) as ?count)
-            WHERE {{
-                ex:user_{user_id} ex:hasFavorite ?movie .
-                ?movie ex:director ?director .
-            }}
-            GROUP BY ?director
-            ORDER BY DESC(?count)
-            """
-            self.sparql_manager.sparql.setQuery(query)
-            results = self.sparql_manager.sparql.query().convert()
-            
-            directors = []
-            for result in results["results"]["bindings"]:
-                director = result.get('director', {}).get('value')
-                count = int(result.get('count', {}).get('value', 0))
-                directors.extend([director] * count)
-            
-            return directors
-        except Exception as e:
-            logger.error(f"Error al obtener directores favoritos: {str(e)}")
-            return []
+        if rating >= 4.5:
+            return "Es una obra maestra que no te puedes perder. "
+        if rating >= 4.0:
+            return "Es una muy buena película que vale la pena ver. "
+        if rating >= 3.5:
+            return "Es una película entretenida que puede gustarte. "
+        if rating >= 3.0:
+            return "Es una película decente, aunque tiene sus altibajos. "
+        return "Puede que no convenza a algunos espectadores. "
+
+    def _get_genre_description(self, genre):
+        """
+        Frase de la opinión según el género de la película.
+        """
+        descriptions = {
+            "Action": "Espera encontrar secuencias de acción emocionantes y mucha adrenalina.",
+            "Drama": "Prepárate para una historia emotiva y personajes profundos.",
+            "Comedy": "Te hará reír y pasar un buen rato.",
+            "Horror": "Te mantendrá al borde de tu asiento con sus momentos de tensión.",
+            "Sci-Fi": "Te llevará a un mundo de imaginación y posibilidades.",
+            "Romance": "Te envolverá en una historia de amor y emociones.",
+        }
+        return descriptions.get(genre, f"Es una buena muestra del género {genre}.")
 
     def _format_recommendations(self, recommendations):
         """
-        Formatea las recomendaciones para su presentación y agrega explicaciones personalizadas
+        Prepara las recomendaciones para la API. Los registros Movie ya tienen la
+        forma de la respuesta, así que basta con materializar la lista.
         """
-        try:
-            formatted = []
-            for movie in recommendations:
-                movie_id = movie['movie']['value'].split('#')[1]
-                formatted.append({
-                    'movie': {'value': movie['movie']['value']},
-                    'title': {'value': movie['title']['value']},
-                    'genre': {'value': movie['genre']['value']},
-                    'director': {'value': movie['director']['value']},
-                    'rating': {'value': movie['rating']['value']},
-                })
-            return formatted
-        except Exception as e:
-            logger.error(f"Error al formatear recomendaciones: {str(e)}")
-            return [] 
\ No newline at end of file
+        return list(recommendations)
@@ -0,0 +1,204 @@
+"""
+Motor de recomendación por contenido que trabaja sobre el catálogo en memoria.
+"""
+import numpy as np
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ContentRecommender:
+    """
+    Puntúa todo el catálogo contra el perfil de un usuario con operaciones NumPy.
+
+    Cada película se representa por su género y director (codificación one-hot)
+    y su calificación normalizada a [0, 1]. La puntuación de un usuario es
+    X · w, donde w contiene el peso de cada género y director en sus favoritas.
+    Como X es one-hot, el producto se calcula indexando w con las columnas de
+    cada película, sin materializar la matriz. Las mejores k se eligen con
+    selección parcial (argpartition) y las favoritas se excluyen con una máscara.
+
+    El catálogo se carga la primera vez que se usa y después se mantiene al día
+    con los eventos de alta de películas de SPARQLManager. Cuando caduca la
+    generación del catálogo (evento catalog_expired) se vuelve a cargar, para
+    recoger lo que hayan escrito otros procesos.
+    """
+
+    # Celdas máximas de la matriz de puntuaciones por bloque de usuarios (~16 MB en float32)
+    MAX_SCORE_CELLS = 1 << 22
+
+    def __init__(self, sparql_manager, genre_weight=1.0, director_weight=1.0, rating_weight=0.5):
+        self.sparql_manager = sparql_manager
+        self.genre_weight = genre_weight
+        self.director_weight = director_weight
+        self.rating_weight = rating_weight
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._movies = []       # registros Movie del catálogo, en el orden de las matrices
+        self._rows = {}         # IRI de película -> fila
+        self._genres = {}       # género -> columna
+        self._directors = {}    # director -> columna
+        self._size = 0
+        self._genre_idx = np.empty(0, dtype=np.int32)
+        self._director_idx = np.empty(0, dtype=np.int32)
+        self._ratings = np.empty(0, dtype=np.float32)
+
+        sparql_manager.subscribe(self._on_event)
+
+    def load(self):
+        """Carga (o recarga) el catálogo completo desde el almacén"""
+        with self._lock:
+            self._movies = []
+            self._rows = {}
+            self._genres = {}
+            self._directors = {}
+            self._size = 0
+            self._genre_idx = np.empty(0, dtype=np.int32)
+            self._director_idx = np.empty(0, dtype=np.int32)
+            self._ratings = np.empty(0, dtype=np.float32)
+            for movie in self.sparql_manager.get_all_movies(stream=True):
+                self._append(movie)
+            self._loaded = True
+            logger.info(f"Motor de recomendación cargado con {self._size} películas")
+
+    def _ensure_loaded(self):
+        # Si la generación del catálogo caducó, catalog_expired descarta el catálogo
+        self.sparql_manager.check_catalog_expiry()
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def invalidate(self):
+        """Descarta el catálogo cargado; se vuelve a cargar en el siguiente uso"""
+        with self._lock:
+            self._loaded = False
+
+    def _on_event(self, event, payload):
+        if event == 'catalog_expired':
+            self.invalidate()
+            return
+        if event != 'movies_added':
+            return
+        # Con el bloqueo tomado un evento que llega durante load() espera a que termine
+        # en lugar de perderse; _append descarta las películas que load() ya leyó
+        with self._lock:
+            # Antes de la primera carga no hay nada que actualizar: load() leerá estas películas
+            if self._loaded:
+                for movie in payload:
+                    self._append(movie)
+
+    def _append(self, movie):
+        """Añade una película a las matrices, duplicando su capacidad cuando se llenan"""
+        iri = movie.iri
+        if iri in self._rows:
+            return
+        if self._size == len(self._ratings):
+            capacity = max(1024, 2 * self._size)
+            self._genre_idx = np.resize(self._genre_idx, capacity)
+            self._director_idx = np.resize(self._director_idx, capacity)
+            self._ratings = np.resize(self._ratings, capacity)
+
+        row = self._size
+        self._genre_idx[row] = self._genres.setdefault(movie.genre, len(self._genres))
+        self._director_idx[row] = self._directors.setdefault(movie.director, len(self._directors))
+        self._ratings[row] = (movie.rating - 1.0) / 4.0
+        self._rows[iri] = row
+        self._movies.append(movie)
+        self._size += 1
+
+    def _weights(self, counts, columns, scale):
+        """Construye el vector de pesos normalizado de un perfil"""
+        weights = np.zeros(len(columns), dtype=np.float32)
+        total = sum(counts.values())
+        if total:
+            for value, count in counts.items():
+                column = columns.get(value)
+                if column is not None:
+                    weights[column] = scale * count / total
+        return weights
+
+    def recommend(self, profile, limit=10, exclude=(), boost=None):
+        """
+        Devuelve las `limit` películas con mayor puntuación para el perfil dado.
+
+        Se excluyen las favoritas del perfil y las IRIs indicadas en exclude.
+        boost, si se indica, es un diccionario {IRI: puntuación} que se suma a la
+        puntuación por contenido (por ejemplo, la del filtrado colaborativo).
+        """
+        return next(self.recommend_many([profile], limit, boosts=[boost], excludes=[exclude]))
+
+    def recommend_many(self, profiles, limit=10, boosts=None, excludes=None):
+        """
+        Genera las recomendaciones de varios perfiles, en el mismo orden.
+
+        Los perfiles se puntúan por bloques: para cada bloque se construyen las
+        matrices de pesos (usuarios x géneros, usuarios x directores) y la matriz
+        de puntuaciones usuarios x películas de una sola vez, y se eligen las
+        mejores de cada fila con argpartition. boosts y excludes, si se indican,
+        son listas paralelas a profiles con los valores de recommend().
+        """
+        self._ensure_loaded()
+        profiles = list(profiles)
+        boosts = boosts or [None] * len(profiles)
+        excludes = excludes or [()] * len(profiles)
+
+        start = 0
+        while start < len(profiles):
+            # El bloque se calcula bajo el bloqueo y se entrega fuera de él
+            with self._lock:
+                n = self._size
+                if n == 0 or limit <= 0:
+                    block_size = len(profiles) - start
+                    results = [[] for _ in range(block_size)]
+                else:
+                    block_size = max(1, self.MAX_SCORE_CELLS // n)
+                    end = start + block_size
+                    results = self._score_block(
+                        profiles[start:end], boosts[start:end], excludes[start:end], limit
+                    )
+            yield from results
+            start += block_size
+
+    def _score_block(self, profiles, boosts, excludes, limit):
+        n = self._size
+        genre_weights = np.stack([
+            self._weights(profile.get('genres', {}), self._genres, self.genre_weight)
+            for profile in profiles
+        ])
+        director_weights = np.stack([
+            self._weights(profile.get('directors', {}), self._directors, self.director_weight)
+            for profile in profiles
+        ])
+        # Equivale a W · Xᵀ con X one-hot: se indexan las columnas de cada película
+        scores = (
+            genre_weights[:, self._genre_idx[:n]]
+            + director_weights[:, self._director_idx[:n]]
+            + self.rating_weight * self._ratings[:n]
+        )
+
+        for i, (profile, boost, exclude) in enumerate(zip(profiles, boosts, excludes)):
+            if boost:
+                rows = [(self._rows[iri], score) for iri, score in boost.items() if iri in self._rows]
+                if rows:
+                    indices, values = zip(*rows)
+                    scores[i, list(indices)] += np.asarray(values, dtype=np.float32)
+
+            excluded = [self._rows[iri] for iri in (*profile.get('favorites', ()), *exclude) if iri in self._rows]
+            if excluded:
+                scores[i, excluded] = -np.inf
+
+        k = min(limit, n)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+        return [
+            [self._movies[row] for row, score in zip(rows, row_scores) if score != -np.inf]
+            for rows, row_scores in zip(top, top_scores)
+        ]
@@ -0,0 +1,183 @@
+"""
+Índice de búsqueda en memoria sobre los títulos y directores del catálogo.
+"""
+from bisect import bisect_left, insort
+import heapq
+import re
+import threading
+import unicodedata
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_TOKEN = re.compile(r"\w+")
+# Mayor que cualquier carácter de un texto: cierra el rango de un prefijo en bisect
+_MAX_CHAR = '\U0010ffff'
+
+
+def normalize(text):
+    """Pasa el texto a minúsculas y le quita las tildes y diacríticos ("Amélie" -> "amelie")"""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text):
+    """Palabras normalizadas del texto"""
+    return _TOKEN.findall(normalize(text))
+
+
+class SearchIndex:
+    """
+    Búsqueda de películas por palabras y autocompletado por prefijo.
+
+    El índice invertido relaciona cada palabra normalizada de un título o
+    director con las películas que la contienen, y el vocabulario se guarda
+    ordenado para expandir la última palabra de la consulta como prefijo con
+    bisect. El autocompletado usa otra lista ordenada con cada título y
+    director a partir de cada una de sus palabras ("laberinto del fauno",
+    "del fauno", ...), de modo que un prefijo es un rango contiguo de la lista.
+
+    Igual que ContentRecommender, se carga la primera vez que se usa (o con
+    load()) y después se mantiene al día con los eventos de SPARQLManager.
+    Cuando caduca la generación del catálogo (evento catalog_expired) se
+    reconstruye, para recoger lo que hayan escrito otros procesos.
+    """
+
+    # Longitud mínima de la última palabra para expandirla como prefijo; una sola
+    # letra abarcaría buena parte del vocabulario
+    MIN_PREFIX = 2
+
+    def __init__(self, sparql_manager):
+        self.sparql_manager = sparql_manager
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._movies = {}        # IRI de película -> Movie
+        self._rank = {}          # IRI de película -> clave de orden del catálogo
+        self._postings = {}      # palabra -> conjunto de IRIs
+        self._vocabulary = []    # palabras ordenadas
+        self._phrases = []       # (frase normalizada, tipo, texto original, IRI) ordenadas
+
+        sparql_manager.subscribe(self._on_event)
+
+    def load(self):
+        """Construye (o reconstruye) el índice con el catálogo completo del almacén"""
+        with self._lock:
+            self._movies = {}
+            self._rank = {}
+            self._postings = {}
+            self._phrases = []
+            for movie in self.sparql_manager.get_all_movies(stream=True):
+                self._add(movie)
+            self._vocabulary = sorted(self._postings)
+            self._phrases.sort()
+            self._loaded = True
+            logger.info(f"Índice de búsqueda cargado con {len(self._movies)} películas")
+
+    def _ensure_loaded(self):
+        # Si la generación del catálogo caducó, catalog_expired descarta el índice
+        self.sparql_manager.check_catalog_expiry()
+        if not self._loaded:
+            with self._lock:
+                if not self._loaded:
+                    self.load()
+
+    def invalidate(self):
+        """Descarta el índice; se vuelve a construir en el siguiente uso"""
+        with self._lock:
+            self._loaded = False
+
+    def _on_event(self, event, payload):
+        if event == 'catalog_expired':
+            self.invalidate()
+            return
+        if event != 'movies_added':
+            return
+        # Con el bloqueo tomado un alta durante load() espera a que termine en lugar
+        # de perderse; _add descarta las películas que load() ya leyó
+        with self._lock:
+            # Antes de la primera carga no hay nada que actualizar: load() leerá estas películas
+            if self._loaded:
+                for movie in payload:
+                    self._add(movie, keep_sorted=True)
+
+    def _add(self, movie, keep_sorted=False):
+        """Indexa una película; durante load() las listas se ordenan una sola vez al final"""
+        iri = movie.iri
+        if iri in self._movies:
+            return
+        self._movies[iri] = movie
+        self._rank[iri] = movie.sort_key
+        for kind in ('title', 'director'):
+            text = getattr(movie, kind)
+            words = tokenize(text)
+            for word in words:
+                postings = self._postings.get(word)
+                if postings is None:
+                    postings = self._postings[word] = set()
+                    if keep_sorted:
+                        insort(self._vocabulary, word)
+                postings.add(iri)
+            for start in range(len(words)):
+                entry = (' '.join(words[start:]), kind, text, iri)
+                if keep_sorted:
+                    insort(self._phrases, entry)
+                else:
+                    self._phrases.append(entry)
+
+    @staticmethod
+    def _prefix_range(items, prefix):
+        """Posiciones [inicio, fin) de las palabras de una lista ordenada que empiezan por prefix"""
+        return bisect_left(items, prefix), bisect_left(items, prefix + _MAX_CHAR)
+
+    def search(self, text, limit=20):
+        """
+        Películas cuyo título o director contienen todas las palabras de text.
+
+        La última palabra vale como prefijo si tiene al menos MIN_PREFIX
+        caracteres ("laberinto fa" encuentra "El laberinto del fauno"). Los
+        resultados se ordenan por calificación.
+        """
+        words = tokenize(text)
+        if not words:
+            return []
+        self._ensure_loaded()
+        with self._lock:
+            candidates = None
+            for position, word in enumerate(words):
+                if position == len(words) - 1 and len(word) >= self.MIN_PREFIX:
+                    start, end = self._prefix_range(self._vocabulary, word)
+                    matches = set().union(*(self._postings[w] for w in self._vocabulary[start:end]))
+                else:
+                    matches = self._postings.get(word, set())
+                candidates = matches if candidates is None else candidates & matches
+                if not candidates:
+                    return []
+            best = heapq.nsmallest(limit, candidates, key=self._rank.__getitem__)
+            return [self._movies[iri] for iri in best]
+
+    def autocomplete(self, prefix, limit=10):
+        """Sugerencias de títulos y directores con alguna palabra que empiece por prefix"""
+        key = ' '.join(tokenize(prefix))
+        if not key:
+            return []
+        self._ensure_loaded()
+        suggestions = []
+        seen = set()
+        with self._lock:
+            # Las tuplas se comparan primero por la frase normalizada
+            start = bisect_left(self._phrases, (key,))
+            end = bisect_left(self._phrases, (key + _MAX_CHAR,))
+            for position in range(start, end):
+                _, kind, text, iri = self._phrases[position]
+                if (kind, text) in seen:
+                    continue
+                seen.add((kind, text))
+                suggestion = {'text': text, 'kind': kind}
+                if kind == 'title':
+                    suggestion['id'] = self._movies[iri].id
+                suggestions.append(suggestion)
+                if len(suggestions) >= limit:
+                    break
+        return suggestions
+
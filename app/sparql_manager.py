@@ -1,9 +1,20 @@
-from SPARQLWrapper import SPARQLWrapper, JSON, POST, DIGEST
 from rdflib import Graph, Namespace, Literal, URIRef
 from rdflib.namespace import RDF, RDFS
+from backends import create_backend, last_response_size
+from cache import LRUCache, MISSING
+from metrics import QueryMetrics
+from facets import FacetIndex
+from models import Movie, decode_movies
+from ids import new_movie_id, is_valid_id
 import os
-import requests
 from dotenv import load_dotenv
+from itertools import islice
+import base64
+import hashlib
+import json
+import secrets
+import threading
+import time
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -11,50 +22,249 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+# Perfil de un usuario sin favoritas
+EMPTY_PROFILE = {'genres': {}, 'directors': {}, 'favorites': frozenset()}
+
+_shared_manager = None
+_shared_lock = threading.Lock()
+
+def get_sparql_manager():
+    """Devuelve el SPARQLManager compartido del proceso, creándolo en el primer uso"""
+    global _shared_manager
+    if _shared_manager is None:
+        with _shared_lock:
+            if _shared_manager is None:
+                _shared_manager = SPARQLManager()
+    return _shared_manager
+
 class SPARQLManager:
-    def __init__(self):
-        self.endpoint = os.getenv('FUSEKI_ENDPOINT', 'http://localhost:3030/movies')
-        self.admin_endpoint = 'http://localhost:3030'
-        self.dataset_name = 'movies'
+    def __init__(self, backend=None):
+        # Backend de almacenamiento: Fuseki remoto o grafo rdflib local según la configuración
+        self.backend = backend or create_backend()
+        
+        # Caché de lecturas del catálogo. Las claves incluyen la generación del
+        # catálogo, que se incrementa con cada escritura de películas, de modo que
+        # los resultados anteriores dejan de usarse y acaban expulsados por LRU/TTL
+        self.catalog_generation = 0
+        self._generation_lock = threading.Lock()
+        # La época distingue procesos y reinicios, cuyas generaciones empiezan igual;
+        # junto con la generación y la hora del último cambio forman el validador HTTP
+        self.catalog_epoch = secrets.token_hex(4)
+        self.catalog_modified = time.time()
+        self._generation_started = time.monotonic()
+        self._read_cache = LRUCache(
+            maxsize=int(os.getenv('CATALOG_CACHE_SIZE', '1024')),
+            ttl=float(os.getenv('CATALOG_CACHE_TTL', '300')) or None,
+        )
         
-        # Configurar endpoints
-        self.sparql = SPARQLWrapper(f"{self.endpoint}/query")
-        self.sparql_update = SPARQLWrapper(f"{self.endpoint}/update")
+        # Suscriptores a los cambios del almacén (índices y motores en memoria)
+        self._listeners = []
         
-        # Configurar autenticación si es necesario
-        if os.getenv('FUSEKI_USER') and os.getenv('FUSEKI_PASSWORD'):
-            self.sparql.setCredentials(os.getenv('FUSEKI_USER'), os.getenv('FUSEKI_PASSWORD'))
-            self.sparql_update.setCredentials(os.getenv('FUSEKI_USER'), os.getenv('FUSEKI_PASSWORD'))
+        # Métricas por consulta (latencia, filas, bytes) y funciones que las reciben
+        self.metrics = QueryMetrics()
+        self._query_hooks = [self.metrics.observe]
         
-        self.sparql.setReturnFormat(JSON)
-        self.sparql_update.setMethod(POST)
+        # Perfiles de usuario cacheados; se invalidan al modificar sus favoritos desde
+        # este proceso y caducan a los PROFILE_CACHE_TTL segundos para recoger los
+        # cambios de otros. Las versiones solo evitan guardar un perfil ya obsoleto
+        profile_cache_size = int(os.getenv('PROFILE_CACHE_SIZE', '10000'))
+        self._profile_cache = LRUCache(
+            maxsize=profile_cache_size,
+            ttl=float(os.getenv('PROFILE_CACHE_TTL', os.getenv('CATALOG_CACHE_TTL', '300'))) or None,
+        )
+        self._profile_versions = LRUCache(maxsize=profile_cache_size)
+        self._profile_lock = threading.Lock()
+        
+        # Recuentos por faceta e índice para filtrar el catálogo, al día con los eventos
+        self.facets = FacetIndex(self)
         
         # Namespaces
         self.EX = Namespace("http://example.org/movies#")
         self.RDF = Namespace("http://www.w3.org/1999/02/22-rdf-syntax-ns#")
-        
-        # Inicializar el dataset y la ontología
+
+    def setup(self):
+        """
+        Prepara el almacén: crea el dataset y la ontología básica si no existen.
+
+        Es idempotente y no se ejecuta al crear el manager, para que arrancar la
+        aplicación no haga peticiones al almacén; se lanza una vez al desplegar
+        (flask --app app init-store) o desde los scripts de carga.
+        """
         self._init_dataset()
         self._init_ontology()
 
-    def _init_dataset(self):
-        """Inicializa el dataset en Fuseki si no existe"""
+    def query(self, query, method='SPARQLManager.query'):
+        """
+        Ejecuta una consulta SELECT o ASK y devuelve el resultado en formato SPARQL JSON.
+
+        method es la etiqueta de las métricas ('Clase.método' de quien consulta).
+        """
+        last_response_size.set(0)
+        started = time.perf_counter()
         try:
-            # Verificar si el dataset existe
-            response = requests.get(f"{self.admin_endpoint}/$/datasets")
-            datasets = response.json()
-            
-            if not any(ds.get('ds.name') == self.dataset_name for ds in datasets.get('datasets', [])):
-                logger.info(f"Creando dataset '{self.dataset_name}'...")
-                # Crear el dataset
-                create_url = f"{self.admin_endpoint}/$/datasets"
-                response = requests.post(create_url, data={'dbName': self.dataset_name, 'dbType': 'tdb2'})
-                if response.status_code == 200:
-                    logger.info(f"Dataset '{self.dataset_name}' creado exitosamente")
-                else:
-                    logger.error(f"Error al crear dataset: {response.text}")
-        except Exception as e:
-            logger.error(f"Error al inicializar dataset: {str(e)}")
+            result = self.backend.query(query)
+        except Exception:
+            self._observe(method, 'query', started, error=True)
+            raise
+        self._observe(method, 'query', started, rows=len(result.get('results', {}).get('bindings', ())))
+        return result
+
+    def iter_query(self, query, method='SPARQLManager.iter_query'):
+        """Ejecuta un SELECT y genera las filas (bindings) a medida que llegan del backend"""
+        return self._iter_query(method, query)
+
+    def _iter_query(self, method, query):
+        # Se mide desde la primera fila pedida hasta que el consumidor termina o deja de iterar
+        last_response_size.set(0)
+        started = time.perf_counter()
+        stream = self.backend.query_stream(query)
+        rows = 0
+        error = False
+        try:
+            for row in stream:
+                rows += 1
+                yield row
+        except Exception:
+            error = True
+            raise
+        finally:
+            # Cerrar antes de medir libera la conexión y fija los bytes leídos
+            stream.close()
+            self._observe(method, 'stream', started, rows=rows, error=error)
+
+    def update(self, update, method='SPARQLManager.update'):
+        """Ejecuta una operación SPARQL Update"""
+        self._write(method, 'update', self.backend.update, update)
+
+    def _write(self, method, operation, write, data):
+        last_response_size.set(0)
+        started = time.perf_counter()
+        try:
+            write(data)
+        except Exception:
+            self._observe(method, operation, started, error=True)
+            raise
+        self._observe(method, operation, started)
+
+    def add_query_hook(self, hook):
+        """
+        Registra una función que se llama tras cada operación con el almacén.
+
+        Recibe (método, operación, segundos, rows=, size=, error=): el nombre del
+        método que lanzó la consulta, query/stream/update/upload, la latencia, las
+        filas devueltas, los bytes transferidos (0 si el backend no los conoce) y
+        si falló.
+        """
+        self._query_hooks.append(hook)
+
+    def _observe(self, method, operation, started, rows=0, size=None, error=False):
+        seconds = time.perf_counter() - started
+        if size is None:
+            size = last_response_size.get()
+        for hook in self._query_hooks:
+            try:
+                hook(method, operation, seconds, rows=rows, size=size, error=error)
+            except Exception as e:
+                logger.error(f"Error en la instrumentación de consultas: {str(e)}")
+
+    def _bump_catalog_generation(self):
+        """Invalida las lecturas cacheadas del catálogo tras una escritura"""
+        with self._generation_lock:
+            self._next_generation()
+
+    def _next_generation(self):
+        self.catalog_generation += 1
+        self.catalog_modified = time.time()
+        self._generation_started = time.monotonic()
+
+    def check_catalog_expiry(self):
+        """
+        Abre una generación nueva cuando la actual dura más que el TTL de la caché.
+
+        Las escrituras de otros procesos (los scripts de carga u otros workers) no
+        mueven la generación de este, así que sin caducidad su validador HTTP
+        seguiría respondiendo 304 indefinidamente. Con ella, ni las lecturas
+        cacheadas ni los ETag pueden quedarse atrás más de CATALOG_CACHE_TTL.
+        Al renovarla avisa con el evento catalog_expired para que los índices en
+        memoria se vuelvan a cargar. Devuelve True si la ha renovado.
+        """
+        ttl = self._read_cache.ttl
+        if ttl is None:
+            return False
+        with self._generation_lock:
+            if time.monotonic() - self._generation_started < ttl:
+                return False
+            self._next_generation()
+        self._notify('catalog_expired', None)
+        return True
+
+    def catalog_validator(self, user_id=None):
+        """
+        Devuelve (etag, last_modified) de la versión actual del catálogo.
+
+        Cambian con cada escritura de películas, sin consultar el almacén, y como
+        mucho cada CATALOG_CACHE_TTL segundos para recoger los cambios hechos
+        desde otros procesos. Con user_id el ETag incluye además un resumen de las
+        favoritas del usuario (para las respuestas que las marcan), tomadas del
+        perfil cacheado, y last_modified es None, porque un cambio de favoritas
+        no mueve la fecha del catálogo.
+        """
+        self.check_catalog_expiry()
+        with self._generation_lock:
+            etag = f"{self.catalog_epoch}-{self.catalog_generation}"
+            modified = self.catalog_modified
+        if user_id is None:
+            return etag, modified
+        user_id = str(user_id)
+        favorites = self.get_user_profile(user_id)['favorites'] if is_valid_id(user_id) else ()
+        digest = hashlib.sha1('\n'.join(sorted(favorites)).encode('utf-8')).hexdigest()[:12]
+        return f"{etag}-{digest}", None
+
+    def subscribe(self, listener):
+        """
+        Registra una función que se llama tras cada escritura con (evento, datos).
+
+        Eventos:
+            movies_added        datos: lista de registros Movie
+            favorite_added      datos: {'user_id', 'user', 'movie'} con las IRIs de usuario y película
+            favorite_removed    datos: igual que favorite_added
+            favorite_unknown    datos: igual que favorite_added; la favorita se alternó
+                                pero no pudo leerse su estado final
+            catalog_expired     datos: None; la generación caducó y el almacén puede
+                                tener cambios de otros procesos (ver check_catalog_expiry)
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, event, payload):
+        for listener in self._listeners:
+            try:
+                listener(event, payload)
+            except Exception as e:
+                logger.error(f"Error al notificar el evento {event}: {str(e)}")
+
+    def _favorite_payload(self, user_id, movie_id):
+        return {
+            'user_id': str(user_id),
+            'user': f"{self.EX}user_{user_id}",
+            'movie': f"{self.EX}movie_{movie_id}",
+        }
+
+    @property
+    def profile_cache_ttl(self):
+        """Segundos que dura un perfil en caché (None si no caduca)"""
+        return self._profile_cache.ttl
+
+    def cache_stats(self):
+        """Devuelve los contadores de la caché de lecturas del catálogo y de la de perfiles"""
+        return dict(
+            self._read_cache.stats(),
+            generation=self.catalog_generation,
+            profiles=self._profile_cache.stats(),
+        )
+
+    def _init_dataset(self):
+        """Inicializa el dataset en el backend si no existe"""
+        self.backend.setup()
 
     def _init_ontology(self):
         """Inicializa la ontología básica si no existe"""
@@ -66,8 +276,7 @@ class SPARQLManager:
             PREFIX ex: <http://example.org/movies#>
             ASK WHERE { ex:Movie rdf:type rdfs:Class }
             """
-            self.sparql.setQuery(check_query)
-            result = self.sparql.query().convert()
+            result = self.query(check_query, 'SPARQLManager._init_ontology')
             
             if not result.get('boolean', False):
                 # Crear la ontología básica
@@ -106,149 +315,470 @@ class SPARQLManager:
                         rdfs:range ex:Movie .
                 }
                 """
-                self.sparql_update.setQuery(update_query)
-                self.sparql_update.query()
+                self.update(update_query, 'SPARQLManager._init_ontology')
                 logger.info("Ontología básica inicializada")
         except Exception as e:
             logger.error(f"Error al inicializar ontología: {str(e)}")
             raise
 
+    def _movie_triples(self, movie_data):
+        """Genera el bloque de tripletas de una película para INSERT DATA o Turtle"""
+        # Literal.n3() escapa comillas, barras y saltos de línea
+        title = Literal(movie_data['title']).n3()
+        director = Literal(movie_data['director']).n3()
+        genre = Literal(movie_data['genre']).n3()
+        rating = float(movie_data['rating'])
+
+        return f"""
+                {self._movie_iri(movie_data['id'])} rdf:type ex:Movie ;
+                          ex:title {title} ;
+                          ex:director {director} ;
+                          ex:genre {genre} ;
+                          ex:rating {rating} ."""
+
+    def _prepare_movie_id(self, movie_data):
+        """Asigna un ID nuevo si falta y rechaza los que no pueden formar parte de una IRI"""
+        if not movie_data.get('id'):
+            movie_data['id'] = new_movie_id()
+        if not is_valid_id(str(movie_data['id'])):
+            raise ValueError(f"ID de película no válido: {movie_data['id']!r}")
+
     def add_movie(self, movie_data):
-        """Añade una película al triplestore usando SPARQL Update"""
+        """
+        Añade una película al triplestore usando SPARQL Update.
+
+        Si movie_data no trae 'id' se le asigna uno nuevo con new_movie_id(); un
+        ID que no puede formar parte de una IRI lanza ValueError sin escribir nada.
+        """
         try:
+            self._prepare_movie_id(movie_data)
             movie_id = movie_data['id']
             
-            # Escapar caracteres especiales en strings
-            title = movie_data['title'].replace('"', '\\"')
-            director = movie_data['director'].replace('"', '\\"')
-            genre = movie_data['genre']
-            rating = float(movie_data['rating'])
-            
             update_query = f"""
             PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX ex: <http://example.org/movies#>
             
-            INSERT DATA {{
-                ex:movie_{movie_id} rdf:type ex:Movie ;
-                          ex:title "{title}" ;
-                          ex:director "{director}" ;
-                          ex:genre "{genre}" ;
-                          ex:rating {rating} .
+            INSERT DATA {{{self._movie_triples(movie_data)}
             }}
             """
-            self.sparql_update.setQuery(update_query)
-            self.sparql_update.query()
-            logger.info(f"Película agregada: {title} (ID: {movie_id})")
+            self.update(update_query, 'SPARQLManager.add_movie')
+            self._bump_catalog_generation()
+            self._notify('movies_added', [Movie.from_dict(movie_data)])
+            logger.info(f"Película agregada: {movie_data['title']} (ID: {movie_id})")
             return True
         except Exception as e:
             logger.error(f"Error al agregar película: {str(e)}")
             raise
 
-    def get_movie_details(self, movie_id):
-        """Obtiene los detalles de una película específica"""
+    def add_movies(self, movies, batch_size=500, use_graph_store=False, on_batch=None):
+        """
+        Añade películas en lote agrupando muchas películas por petición.
+
+        Consume el iterable de forma perezosa, de modo que solo mantiene en memoria
+        un lote a la vez. Con use_graph_store=True los lotes se suben como Turtle
+        mediante el Graph Store Protocol en lugar de SPARQL Update.
+        on_batch, si se indica, recibe el total acumulado tras cada lote.
+        Las películas sin 'id' reciben uno nuevo, como en add_movie; un ID no
+        válido lanza ValueError antes de escribir su lote.
+        Devuelve el número de películas insertadas.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size debe ser mayor que cero")
+
+        total = 0
+        movies = iter(movies)
         try:
-            query = f"""
+            while True:
+                batch = list(islice(movies, batch_size))
+                if not batch:
+                    break
+                for movie in batch:
+                    self._prepare_movie_id(movie)
+                triples = "".join(self._movie_triples(movie) for movie in batch)
+                if use_graph_store:
+                    self._upload_turtle(triples, 'SPARQLManager.add_movies')
+                else:
+                    update_query = f"""
+            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+            PREFIX ex: <http://example.org/movies#>
+
+            INSERT DATA {{{triples}
+            }}
+            """
+                    self.update(update_query, 'SPARQLManager.add_movies')
+                self._bump_catalog_generation()
+                self._notify('movies_added', [Movie.from_dict(movie) for movie in batch])
+                total += len(batch)
+                logger.debug(f"Lote de {len(batch)} películas insertado ({total} en total)")
+                if on_batch:
+                    on_batch(total)
+            logger.info(f"{total} películas agregadas en lote")
+            return total
+        except Exception as e:
+            logger.error(f"Error al agregar películas en lote tras {total} insertadas: {str(e)}")
+            raise
+
+    def _upload_turtle(self, triples, method):
+        """Sube tripletas al grafo por defecto mediante el Graph Store Protocol"""
+        self._write(
+            method,
+            'upload',
+            self.backend.upload_turtle,
+            "@prefix rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#> .\n"
+            "@prefix ex: <http://example.org/movies#> .\n"
+            f"{triples}\n",
+        )
+
+    # Películas por consulta VALUES en get_movies_details
+    DETAILS_BATCH_SIZE = 500
+
+    def _movie_iri(self, movie_id):
+        """
+        IRI completa de una película como término SPARQL. A diferencia de un nombre
+        con prefijo (ex:movie_...), admite cualquier ID que quepa en una IRI; los
+        demás lanzan ValueError, de modo que nunca llegan al texto de la consulta.
+        """
+        if not is_valid_id(str(movie_id)):
+            raise ValueError(f"ID de película no válido: {movie_id!r}")
+        return f"<{self.EX}movie_{movie_id}>"
+
+    def _user_iri(self, user_id):
+        """IRI completa de un usuario como término SPARQL (ver _movie_iri)"""
+        if not is_valid_id(str(user_id)):
+            raise ValueError(f"ID de usuario no válido: {user_id!r}")
+        return f"<{self.EX}user_{user_id}>"
+
+    def _movies_details_query(self, movie_ids):
+        movies = " ".join(self._movie_iri(movie_id) for movie_id in movie_ids)
+        return f"""
             PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX ex: <http://example.org/movies#>
-            PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
             
-            SELECT ?title ?director ?genre ?rating
+            SELECT ?movie ?title ?director ?genre ?rating
             WHERE {{
-                ex:movie_{movie_id} rdf:type ex:Movie ;
-                                   ex:title ?title ;
-                                   ex:director ?director ;
-                                   ex:genre ?genre ;
-                                   ex:rating ?rating .
+                VALUES ?movie {{ {movies} }}
+                ?movie rdf:type ex:Movie ;
+                       ex:title ?title ;
+                       ex:director ?director ;
+                       ex:genre ?genre ;
+                       ex:rating ?rating .
             }}
             """
-            self.sparql.setQuery(query)
-            results = self.sparql.query().convert()
-            
-            if not results["results"]["bindings"]:
+
+    def _movie_details_cache_key(self, movie_id):
+        return ('details', self.catalog_generation, str(movie_id))
+
+    def _store_movies_details(self, cache_keys, results):
+        """
+        Reparte las filas del resultado por película y guarda cada una en caché,
+        también las que no existen (como None). cache_keys es {movie_id: clave}.
+        """
+        found = {}
+        for row in results["results"]["bindings"]:
+            movie = Movie.from_binding(row)
+            found.setdefault(movie.id, movie)
+        for movie_id, cache_key in cache_keys.items():
+            if movie_id not in found:
                 logger.warning(f"No se encontró la película con ID: {movie_id}")
-                return None
-                
-            logger.info(f"Detalles obtenidos para película ID: {movie_id}")
-            return results["results"]["bindings"][0]
-        except Exception as e:
-            logger.error(f"Error al obtener detalles de película: {str(e)}")
-            return None
+            self._read_cache.set(cache_key, found.get(movie_id))
+        return found
+
+    def get_movies_details(self, movie_ids):
+        """
+        Obtiene los detalles de muchas películas con consultas por lotes (VALUES).
+
+        Devuelve {movie_id: Movie} con las que existen, en el orden recibido. Las
+        ya cacheadas no se consultan y las nuevas quedan en caché. Los IDs que no
+        pueden formar parte de una IRI (ver is_valid_id) se tratan como inexistentes.
+        """
+        cached = {}
+        pending = {}
+        for movie_id in dict.fromkeys(map(str, movie_ids)):
+            if not is_valid_id(movie_id):
+                continue
+            cache_key = self._movie_details_cache_key(movie_id)
+            details = self._read_cache.get(cache_key)
+            if details is MISSING:
+                pending[movie_id] = cache_key
+            elif details is not None:
+                cached[movie_id] = details
+
+        pending_ids = list(pending)
+        for start in range(0, len(pending_ids), self.DETAILS_BATCH_SIZE):
+            batch = {movie_id: pending[movie_id] for movie_id in pending_ids[start:start + self.DETAILS_BATCH_SIZE]}
+            try:
+                results = self.query(self._movies_details_query(batch), 'SPARQLManager.get_movies_details')
+            except Exception as e:
+                logger.error(f"Error al obtener detalles de películas: {str(e)}")
+                continue
+            cached.update(self._store_movies_details(batch, results))
+
+        return {
+            movie_id: cached[movie_id]
+            for movie_id in dict.fromkeys(map(str, movie_ids)) if movie_id in cached
+        }
+
+    def get_movie_details(self, movie_id):
+        """Obtiene los detalles de una película específica (una consulta como mucho)"""
+        return self.get_movies_details([movie_id]).get(str(movie_id))
 
     def add_favorite_movie(self, user_id, movie_id):
         """Registra una película como favorita para un usuario"""
+        self.set_favorite_movie(user_id, movie_id, True)
+
+    def set_favorite_movie(self, user_id, movie_id, favorite):
+        """
+        Marca o desmarca una película como favorita en una sola operación.
+
+        Es idempotente: repetirla no cambia el resultado, así que dos clics
+        simultáneos con el mismo estado deseado no pueden pisarse. Al marcarla
+        crea también el usuario si no existía. Devuelve el nuevo estado; un ID
+        que no puede formar parte de una IRI lanza ValueError.
+        """
+        user, movie = self._user_iri(user_id), self._movie_iri(movie_id)
         try:
-            # Primero asegurarse de que el usuario existe
-            self._ensure_user_exists(user_id)
-            
-            update_query = f"""
+            if favorite:
+                update_query = f"""
+            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX ex: <http://example.org/movies#>
             
             INSERT DATA {{
-                ex:user_{user_id} ex:hasFavorite ex:movie_{movie_id} .
+                {user} rdf:type ex:User ;
+                    ex:hasFavorite {movie} .
             }}
             """
-            self.sparql_update.setQuery(update_query)
-            self.sparql_update.query()
-            logger.info(f"Película {movie_id} agregada a favoritos del usuario {user_id}")
+            else:
+                update_query = f"""
+            PREFIX ex: <http://example.org/movies#>
+            
+            DELETE DATA {{
+                {user} ex:hasFavorite {movie} .
+            }}
+            """
+            self.update(update_query, 'SPARQLManager.set_favorite_movie')
+            self._favorite_changed(user_id, movie_id, favorite)
+            return favorite
         except Exception as e:
-            logger.error(f"Error al agregar favorito: {str(e)}")
+            logger.error(f"Error al {'agregar' if favorite else 'eliminar'} favorito: {str(e)}")
             raise
 
-    def _ensure_user_exists(self, user_id):
-        """Asegura que el usuario existe en el sistema"""
+    def toggle_favorite_movie(self, user_id, movie_id):
+        """
+        Alterna una película entre favorita y no favorita de forma atómica.
+
+        El cambio es una única operación SPARQL Update que comprueba el estado y
+        lo invierte en el propio almacén (creando el usuario si hace falta), así
+        que dos alternancias simultáneas no pueden perderse. Después se consulta
+        el estado resultante; devuelve True/False, o None si no pudo leerse.
+        Como set_favorite_movie, lanza ValueError con un ID no válido.
+        """
+        user, movie = self._user_iri(user_id), self._movie_iri(movie_id)
         try:
-            check_query = f"""
+            update_query = f"""
             PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX ex: <http://example.org/movies#>
-            ASK WHERE {{ ex:user_{user_id} rdf:type ex:User }}
-            """
-            self.sparql.setQuery(check_query)
-            result = self.sparql.query().convert()
             
-            if not result.get('boolean', False):
-                update_query = f"""
-                PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-                PREFIX ex: <http://example.org/movies#>
-                INSERT DATA {{
-                    ex:user_{user_id} rdf:type ex:User .
-                }}
-                """
-                self.sparql_update.setQuery(update_query)
-                self.sparql_update.query()
-                logger.info(f"Usuario {user_id} creado")
+            DELETE {{ ?user ex:hasFavorite ?removed }}
+            INSERT {{ ?user rdf:type ex:User . ?user ex:hasFavorite ?added }}
+            WHERE {{
+                BIND({user} AS ?user)
+                BIND({movie} AS ?movie)
+                BIND(EXISTS {{ ?user ex:hasFavorite ?movie }} AS ?was)
+                # Una variable sin valor en IF deja sin valor el resultado y la plantilla se omite
+                BIND(IF(?was, ?movie, ?none) AS ?removed)
+                BIND(IF(?was, ?none, ?movie) AS ?added)
+            }}
+            """
+            self.update(update_query, 'SPARQLManager.toggle_favorite_movie')
         except Exception as e:
-            logger.error(f"Error al verificar/crear usuario: {str(e)}")
+            logger.error(f"Error al alternar favorito: {str(e)}")
             raise
 
-    def get_user_preferences(self, user_id):
-        """Obtiene las preferencias del usuario basadas en sus películas favoritas"""
         try:
-            query = f"""
-            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+            favorite = self.query(f"""
+            PREFIX ex: <http://example.org/movies#>
+            ASK {{ {user} ex:hasFavorite {movie} }}
+            """, 'SPARQLManager.toggle_favorite_movie').get('boolean', False)
+        except Exception as e:
+            logger.error(f"Error al leer el estado del favorito: {str(e)}")
+            # Sin el estado final nadie sabe si sumar o restar la favorita: cada suscriptor
+            # descarta lo que dependa de ella y lo vuelve a leer del almacén
+            self._invalidate_profile(user_id)
+            self._notify('favorite_unknown', self._favorite_payload(user_id, movie_id))
+            return None
+        self._favorite_changed(user_id, movie_id, favorite)
+        return favorite
+
+    def _favorite_changed(self, user_id, movie_id, favorite):
+        self._invalidate_profile(user_id)
+        self._notify('favorite_added' if favorite else 'favorite_removed', self._favorite_payload(user_id, movie_id))
+        logger.info(
+            f"Película {movie_id} {'agregada a' if favorite else 'eliminada de'} favoritos del usuario {user_id}"
+        )
+
+    def _user_profile_query(self, user_id):
+        user = self._user_iri(user_id)
+        return f"""
             PREFIX ex: <http://example.org/movies#>
             
-            SELECT ?genre (COUNT(?movie) as ?count)
+            SELECT ?kind ?value (COUNT(?movie) as ?count)
             WHERE {{
-                ex:user_{user_id} ex:hasFavorite ?movie .
-                ?movie ex:genre ?genre .
+                {{
+                    {user} ex:hasFavorite ?movie .
+                    ?movie ex:genre ?value .
+                    BIND("genre" AS ?kind)
+                }}
+                UNION
+                {{
+                    {user} ex:hasFavorite ?movie .
+                    ?movie ex:director ?value .
+                    BIND("director" AS ?kind)
+                }}
+                UNION
+                {{
+                    {user} ex:hasFavorite ?movie .
+                    BIND(?movie AS ?value)
+                    BIND("favorite" AS ?kind)
+                }}
             }}
-            GROUP BY ?genre
-            ORDER BY DESC(?count)
+            GROUP BY ?kind ?value
             """
-            self.sparql.setQuery(query)
-            results = self.sparql.query().convert()
-            return results["results"]["bindings"]
-        except Exception as e:
-            logger.error(f"Error al obtener preferencias: {str(e)}")
-            return []
 
-    def get_similar_movies(self, user_id, genres, directors, min_rating=3.0):
-        """Encuentra películas similares basadas en géneros y directores preferidos, excluyendo favoritas"""
+    def _cached_profile(self, user_id):
+        """Devuelve (perfil cacheado o None, versión actual del perfil)"""
+        with self._profile_lock:
+            return self._profile_cache.get(user_id, None), self._profile_versions.get(user_id, 0)
+
+    def _store_profile(self, user_id, version, rows):
+        """Construye el perfil a partir de las filas de la consulta y lo guarda en caché"""
+        profile = {'genres': {}, 'directors': {}}
+        favorites = set()
+        for row in rows:
+            kind = row['kind']['value']
+            if kind == 'favorite':
+                favorites.add(row['value']['value'])
+            else:
+                profile[kind + 's'][row['value']['value']] = int(row['count']['value'])
+        profile['favorites'] = frozenset(favorites)
+
+        with self._profile_lock:
+            # No cachear si los favoritos cambiaron mientras se ejecutaba la consulta
+            if self._profile_versions.get(user_id, 0) == version:
+                self._profile_cache.set(user_id, profile)
+        return profile
+
+    def get_user_profile(self, user_id):
+        """
+        Obtiene los pesos de géneros y directores del usuario en una sola consulta.
+
+        Devuelve {'genres': {género: n}, 'directors': {director: n}, 'favorites': {IRIs}},
+        donde n es el número de favoritas con ese valor. El resultado se cachea por
+        usuario hasta que cambian sus favoritos o pasan PROFILE_CACHE_TTL segundos,
+        y no debe modificarse.
+        """
+        user_id = str(user_id)
+        if not is_valid_id(user_id):
+            logger.warning(f"ID de usuario no válido: {user_id!r}")
+            return EMPTY_PROFILE
+        profile, version = self._cached_profile(user_id)
+        if profile is not None:
+            return profile
         try:
-            genres_filter = " || ".join([f"?genre = '{g}'" for g in genres]) if genres else "true"
-            directors_filter = " || ".join([f"?director = '{d}'" for d in directors]) if directors else "true"
+            results = self.query(self._user_profile_query(user_id), 'SPARQLManager.get_user_profile')
+        except Exception as e:
+            logger.error(f"Error al obtener perfil del usuario: {str(e)}")
+            return EMPTY_PROFILE
+        return self._store_profile(user_id, version, results["results"]["bindings"])
+
+    # Usuarios por consulta en get_user_profiles
+    PROFILE_BATCH_SIZE = 200
+
+    def _user_profiles_query(self, user_ids):
+        users = " ".join(self._user_iri(user_id) for user_id in user_ids)
+        return f"""
+            PREFIX ex: <http://example.org/movies#>
             
-            query = f"""
+            SELECT ?user ?kind ?value (COUNT(?movie) as ?count)
+            WHERE {{
+                {{
+                    VALUES ?user {{ {users} }}
+                    ?user ex:hasFavorite ?movie .
+                    ?movie ex:genre ?value .
+                    BIND("genre" AS ?kind)
+                }}
+                UNION
+                {{
+                    VALUES ?user {{ {users} }}
+                    ?user ex:hasFavorite ?movie .
+                    ?movie ex:director ?value .
+                    BIND("director" AS ?kind)
+                }}
+                UNION
+                {{
+                    VALUES ?user {{ {users} }}
+                    ?user ex:hasFavorite ?movie .
+                    BIND(?movie AS ?value)
+                    BIND("favorite" AS ?kind)
+                }}
+            }}
+            GROUP BY ?user ?kind ?value
+            """
+
+    def get_user_profiles(self, user_ids):
+        """
+        Obtiene los perfiles de muchos usuarios con consultas por lotes (VALUES).
+
+        Devuelve {user_id: perfil} con el mismo formato que get_user_profile. Los
+        perfiles ya cacheados no se consultan y los nuevos quedan en caché. Los IDs
+        que no pueden formar parte de una IRI reciben un perfil vacío sin llegar a
+        la consulta, para que no hagan fallar la de los demás usuarios del lote.
+        """
+        profiles = {}
+        pending = {}
+        for user_id in map(str, user_ids):
+            if not is_valid_id(user_id):
+                logger.warning(f"ID de usuario no válido: {user_id!r}")
+                profiles[user_id] = EMPTY_PROFILE
+                continue
+            profile, version = self._cached_profile(user_id)
+            if profile is not None:
+                profiles[user_id] = profile
+            else:
+                pending[user_id] = version
+
+        pending_ids = list(pending)
+        user_prefix = f"{self.EX}user_"
+        for start in range(0, len(pending_ids), self.PROFILE_BATCH_SIZE):
+            batch = pending_ids[start:start + self.PROFILE_BATCH_SIZE]
+            try:
+                results = self.query(self._user_profiles_query(batch), 'SPARQLManager.get_user_profiles')
+            except Exception as e:
+                logger.error(f"Error al obtener perfiles de usuarios: {str(e)}")
+                profiles.update((user_id, EMPTY_PROFILE) for user_id in batch)
+                continue
+
+            rows_by_user = {user_id: [] for user_id in batch}
+            for row in results["results"]["bindings"]:
+                user_id = row['user']['value'][len(user_prefix):]
+                rows_by_user.setdefault(user_id, []).append(row)
+            for user_id in batch:
+                profiles[user_id] = self._store_profile(user_id, pending[user_id], rows_by_user[user_id])
+        return profiles
+
+    def _invalidate_profile(self, user_id):
+        """Descarta el perfil cacheado de un usuario"""
+        user_id = str(user_id)
+        with self._profile_lock:
+            self._profile_cache.pop(user_id)
+            self._profile_versions.set(user_id, self._profile_versions.get(user_id, 0) + 1)
+
+    def _similar_movies_query(self, user_id, genres, directors, min_rating):
+        user = self._user_iri(user_id)
+        # Literal.n3() escapa las comillas de nombres como "O'Brien"
+        genres_filter = " || ".join([f"?genre = {Literal(g).n3()}" for g in genres]) if genres else "true"
+        directors_filter = " || ".join([f"?director = {Literal(d).n3()}" for d in directors]) if directors else "true"
+        
+        return f"""
             PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX ex: <http://example.org/movies#>
             
@@ -262,7 +792,7 @@ class SPARQLManager:
                 
                 # Excluir películas que ya son favoritas del usuario
                 FILTER NOT EXISTS {{
-                    ex:user_{user_id} ex:hasFavorite ?movie
+                    {user} ex:hasFavorite ?movie
                 }}
                 
                 FILTER(({genres_filter}) || ({directors_filter}))
@@ -271,13 +801,58 @@ class SPARQLManager:
             ORDER BY DESC(?rating)
             LIMIT 10
             """
-            self.sparql.setQuery(query)
-            results = self.sparql.query().convert()
-            return results["results"]["bindings"]
+
+    def get_similar_movies(self, user_id, genres, directors, min_rating=3.0):
+        """Encuentra películas similares basadas en géneros y directores preferidos, excluyendo favoritas"""
+        try:
+            results = self.query(self._similar_movies_query(user_id, genres, directors, min_rating), 'SPARQLManager.get_similar_movies')
+            return decode_movies(results["results"]["bindings"])
         except Exception as e:
             logger.error(f"Error al obtener películas similares: {str(e)}")
             return []
 
+    def _top_rated_query(self, user_id, limit, exclude=()):
+        user = self._user_iri(user_id)
+        exclude_filter = ""
+        if exclude:
+            excluded = ", ".join(f"<{iri}>" for iri in exclude)
+            exclude_filter = f"FILTER(?movie NOT IN ({excluded}))"
+
+        return f"""
+            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+            PREFIX ex: <http://example.org/movies#>
+            
+            SELECT DISTINCT ?movie ?title ?genre ?director ?rating
+            WHERE {{
+                ?movie rdf:type ex:Movie ;
+                       ex:title ?title ;
+                       ex:genre ?genre ;
+                       ex:director ?director ;
+                       ex:rating ?rating .
+                
+                FILTER NOT EXISTS {{
+                    {user} ex:hasFavorite ?movie
+                }}
+                {exclude_filter}
+            }}
+            ORDER BY DESC(?rating) ?title
+            LIMIT {int(limit)}
+            """
+
+    def get_top_rated_movies(self, user_id, limit=5, exclude=()):
+        """
+        Obtiene las películas mejor calificadas que no son favoritas del usuario.
+
+        El filtro de favoritas, el orden y el límite se resuelven en el almacén con
+        una única consulta. exclude permite descartar además otras películas (IRIs).
+        """
+        try:
+            results = self.query(self._top_rated_query(user_id, limit, exclude), 'SPARQLManager.get_top_rated_movies')
+            return decode_movies(results["results"]["bindings"])
+        except Exception as e:
+            logger.error(f"Error al obtener películas mejor calificadas: {str(e)}")
+            return []
+
     def get_favorite_movies(self, user_id):
         """Obtiene las películas favoritas de un usuario"""
         try:
@@ -287,7 +862,7 @@ class SPARQLManager:
             
             SELECT DISTINCT ?movie ?title ?genre ?director ?rating
             WHERE {{
-                ex:user_{user_id} ex:hasFavorite ?movie .
+                {self._user_iri(user_id)} ex:hasFavorite ?movie .
                 ?movie rdf:type ex:Movie ;
                        ex:title ?title ;
                        ex:genre ?genre ;
@@ -296,13 +871,26 @@ class SPARQLManager:
             }}
             ORDER BY ?title
             """
-            self.sparql.setQuery(query)
-            results = self.sparql.query().convert()
-            return results["results"]["bindings"]
+            results = self.query(query, 'SPARQLManager.get_favorite_movies')
+            return decode_movies(results["results"]["bindings"])
         except Exception as e:
             logger.error(f"Error al obtener películas favoritas: {str(e)}")
             return []
 
+    def get_favorite_iris(self, user_id):
+        """
+        Devuelve el conjunto de IRIs de las favoritas del usuario.
+
+        Sale del perfil cacheado, así que cuesta como mucho una consulta y sirve
+        para marcar las favoritas de un listado entero sin un ASK por película.
+        """
+        return self.get_user_profile(user_id)['favorites']
+
+    def get_favorite_ids(self, user_id):
+        """Devuelve los IDs de las películas favoritas del usuario, ordenados"""
+        prefix = f"{self.EX}movie_"
+        return sorted(iri[len(prefix):] for iri in self.get_favorite_iris(user_id) if iri.startswith(prefix))
+
     def is_favorite_movie(self, user_id, movie_id):
         """Verifica si una película es favorita para un usuario"""
         try:
@@ -311,20 +899,16 @@ class SPARQLManager:
             PREFIX ex: <http://example.org/movies#>
             
             ASK {{
-                ex:user_{user_id} ex:hasFavorite ex:movie_{movie_id}
+                {self._user_iri(user_id)} ex:hasFavorite {self._movie_iri(movie_id)}
             }}
             """
-            self.sparql.setQuery(query)
-            result = self.sparql.query().convert()
+            result = self.query(query, 'SPARQLManager.is_favorite_movie')
             return result.get('boolean', False)
         except Exception as e:
             logger.error(f"Error al verificar película favorita: {str(e)}")
             return False
 
-    def get_all_movies(self):
-        """Obtiene todas las películas almacenadas"""
-        try:
-            query = """
+    ALL_MOVIES_QUERY = """
             PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX ex: <http://example.org/movies#>
             PREFIX xsd: <http://www.w3.org/2001/XMLSchema#>
@@ -337,35 +921,97 @@ class SPARQLManager:
                        ex:genre ?genre ;
                        ex:rating ?rating .
             }
-            ORDER BY DESC(?rating) ?title
+            ORDER BY DESC(?rating) ?title STR(?movie)
             """
-            self.sparql.setQuery(query)
-            results = self.sparql.query().convert()
+
+    def get_all_movies(self, stream=False):
+        """
+        Obtiene todas las películas almacenadas como registros Movie.
+
+        Con stream=True devuelve un generador que analiza las filas a medida que
+        llegan, sin pasar por la caché ni construir el resultado completo en memoria.
+        """
+        if stream:
+            return (Movie.from_binding(row) for row in self.iter_query(self.ALL_MOVIES_QUERY, 'SPARQLManager.get_all_movies'))
+        
+        cache_key = ('all_movies', self.catalog_generation)
+        cached = self._read_cache.get(cache_key)
+        if cached is not MISSING:
+            return list(cached)
+        try:
+            results = self.query(self.ALL_MOVIES_QUERY, 'SPARQLManager.get_all_movies')
             
-            if not results["results"]["bindings"]:
+            movies = decode_movies(results["results"]["bindings"])
+            if not movies:
                 logger.info("No se encontraron películas en la base de datos")
-                return []
-                
-            logger.info(f"Se encontraron {len(results['results']['bindings'])} películas")
-            return results["results"]["bindings"]
+            else:
+                logger.info(f"Se encontraron {len(movies)} películas")
+            
+            self._read_cache.set(cache_key, movies)
+            return list(movies)
         except Exception as e:
             logger.error(f"Error al obtener todas las películas: {str(e)}")
             return []
 
-    def remove_favorite_movie(self, user_id, movie_id):
-        """Elimina una película de los favoritos de un usuario"""
-        try:
-            update_query = f"""
+    def get_movies_page(self, cursor=None, limit=50):
+        """
+        Obtiene una página del catálogo ordenada por calificación y título.
+
+        Usa paginación por cursor (keyset): el cursor codifica la última fila de la
+        página anterior y la consulta continúa a partir de ella, de modo que el
+        coste no crece con la profundidad de la página como con OFFSET.
+        Devuelve (películas, siguiente_cursor); el cursor es None en la última página.
+        """
+        after = ""
+        if cursor:
+            rating, title, movie = self._decode_cursor(cursor)
+            title = Literal(title).n3()
+            movie = Literal(movie).n3()
+            after = f"""
+                FILTER(?rating < {rating} || (?rating = {rating} && (?title > {title} ||
+                       (?title = {title} && STR(?movie) > {movie}))))"""
+
+        query = f"""
             PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX ex: <http://example.org/movies#>
             
-            DELETE DATA {{
-                ex:user_{user_id} ex:hasFavorite ex:movie_{movie_id} .
+            SELECT DISTINCT ?movie ?title ?director ?genre ?rating
+            WHERE {{
+                ?movie rdf:type ex:Movie ;
+                       ex:title ?title ;
+                       ex:director ?director ;
+                       ex:genre ?genre ;
+                       ex:rating ?rating .{after}
             }}
+            ORDER BY DESC(?rating) ?title STR(?movie)
+            LIMIT {int(limit) + 1}
             """
-            self.sparql_update.setQuery(update_query)
-            self.sparql_update.query()
-            logger.info(f"Película {movie_id} eliminada de favoritos del usuario {user_id}")
+        try:
+            movies = decode_movies(self.query(query, 'SPARQLManager.get_movies_page')["results"]["bindings"])
         except Exception as e:
-            logger.error(f"Error al eliminar favorito: {str(e)}")
-            raise 
\ No newline at end of file
+            logger.error(f"Error al obtener página de películas: {str(e)}")
+            raise
+
+        # Se pide una fila de más para saber si existe una página siguiente
+        next_cursor = None
+        if len(movies) > limit:
+            movies = movies[:limit]
+            next_cursor = self._encode_cursor(movies[-1])
+        return movies, next_cursor
+
+    @staticmethod
+    def _encode_cursor(movie):
+        key = [movie.rating, movie.title, movie.iri]
+        return base64.urlsafe_b64encode(json.dumps(key).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decode_cursor(cursor):
+        try:
+            rating, title, movie = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return float(rating), str(title), str(movie)
+        except Exception:
+            raise ValueError("Cursor de paginación inválido")
+
+    def remove_favorite_movie(self, user_id, movie_id):
+        """Elimina una película de los favoritos de un usuario"""
+        self.set_favorite_movie(user_id, movie_id, False)
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import Mock, patch
+from sparql_manager import SPARQLManager
+from app import create_app
+from benchmark import generate_catalog
+from test_backends import SAMPLE_MOVIES, make_memory_manager
+import gzip
+import json
+import time
+
+class TestAppFactory(unittest.TestCase):
+    def test_startup_does_not_touch_the_store(self):
+        backend = Mock()
+        backend.query.return_value = {'head': {}, 'boolean': True}
+        manager = SPARQLManager(backend=backend)
+        app = create_app(manager)
+        backend.setup.assert_not_called()
+        backend.query.assert_not_called()
+
+        result = app.test_cli_runner().invoke(args=['init-store'])
+        self.assertIsNone(result.exception)
+        backend.setup.assert_called_once()
+
+    def test_services_share_one_manager(self):
+        manager = make_memory_manager()
+        app = create_app(manager)
+        services = app.extensions['movies']
+        self.assertIs(services.movie_agent.sparql_manager, manager)
+        self.assertIs(services.recommendation_store.movie_agent, services.movie_agent)
+
+        response = app.test_client().get('/get_all_movies?limit=2')
+        self.assertEqual(len(response.get_json()['movies']), 2)
+
+class TestConditionalRequests(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager(SAMPLE_MOVIES)
+        self.client = create_app(self.sparql_manager).test_client()
+
+    def test_matching_etag_answers_304_without_queries(self):
+        first = self.client.get('/get_all_movies')
+        etag = first.headers['ETag']
+        self.assertIn('no-cache', first.headers['Cache-Control'])
+
+        with patch.object(self.sparql_manager, 'query') as query:
+            cached = self.client.get('/get_all_movies', headers={'If-None-Match': etag})
+        query.assert_not_called()
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.data, b'')
+
+        self.sparql_manager.add_movie({'title': 'Coco', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': 4.6})
+        changed = self.client.get('/get_all_movies', headers={'If-None-Match': etag})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+
+    def test_validator_expires_with_the_cache_ttl(self):
+        # Otro proceso (un script de carga, otro worker) escribe en el mismo almacén
+        other = SPARQLManager(backend=self.sparql_manager.backend)
+        etag = self.client.get('/get_all_movies').headers['ETag']
+        other.add_movie({'title': 'Coco', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': 4.6})
+        self.assertEqual(self.client.get('/get_all_movies', headers={'If-None-Match': etag}).status_code, 304)
+
+        self.sparql_manager._generation_started -= self.sparql_manager._read_cache.ttl
+        response = self.client.get('/get_all_movies', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['movies']), 7)
+
+    def test_favorite_flags_change_the_etag(self):
+        etag = self.client.get('/get_all_movies?user_id=7').headers['ETag']
+        self.assertEqual(self.client.get('/get_all_movies?user_id=7', headers={'If-None-Match': etag}).status_code, 304)
+        self.sparql_manager.add_favorite_movie('7', '2')
+        self.assertEqual(self.client.get('/get_all_movies?user_id=7', headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_favorites_from_other_workers_change_the_etag(self):
+        etag = self.client.get('/get_all_movies?user_id=7').headers['ETag']
+        SPARQLManager(backend=self.sparql_manager.backend).add_favorite_movie('7', '2')
+        self.assertEqual(self.client.get('/get_all_movies?user_id=7', headers={'If-None-Match': etag}).status_code, 304)
+
+        cache = self.sparql_manager._profile_cache
+        cache._clock = lambda: time.monotonic() + cache.ttl
+        response = self.client.get('/get_all_movies?user_id=7', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['title'] for m in response.get_json()['movies'] if m['is_favorite']], ['Amélie'])
+
+    def test_if_modified_since(self):
+        self.sparql_manager.catalog_modified = time.time() - 10
+        last_modified = self.client.get('/movie_details/1').headers['Last-Modified']
+        self.assertEqual(
+            self.client.get('/movie_details/1', headers={'If-Modified-Since': last_modified}).status_code, 304
+        )
+        # Un cambio dentro del segundo en curso no publica Last-Modified
+        self.sparql_manager.add_movie({'title': 'Coco', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': 4.6})
+        self.sparql_manager.catalog_modified = time.time() + 5
+        response = self.client.get('/movie_details/1', headers={'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response.headers)
+        self.assertNotIn('ETag', self.client.get('/movie_details/99').headers)
+
+    def test_large_json_is_compressed(self):
+        plain = self.client.get('/get_all_movies')
+        self.assertNotIn('Content-Encoding', plain.headers)
+        self.assertIn('Accept-Encoding', plain.headers['Vary'])
+
+        self.sparql_manager.add_movies(generate_catalog(50))
+        response = self.client.get('/get_all_movies', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertTrue(response.headers['ETag'].startswith('W/'))
+        body = json.loads(gzip.decompress(response.data))
+        self.assertEqual(len(body['movies']), 56)
+        self.assertLess(len(response.data), len(json.dumps(body)) / 3)
+
+        small = self.client.get('/movie_details/1', headers={'Accept-Encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', small.headers)
+
+    def test_index_page_revalidates(self):
+        etag = self.client.get('/').headers['ETag']
+        self.assertEqual(self.client.get('/', headers={'If-None-Match': etag}).status_code, 304)
+
+if __name__ == '__main__':
+    unittest.main()
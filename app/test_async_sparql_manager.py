@@ -0,0 +1,40 @@
+import unittest
+from unittest.mock import patch
+from movie_agent import MovieAgent
+from async_sparql_manager import AsyncSPARQLManager
+from test_backends import SAMPLE_MOVIES, make_memory_manager
+import asyncio
+
+class TestAsyncRecommendations(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager(SAMPLE_MOVIES)
+        self.movie_agent = MovieAgent(self.sparql_manager)
+        self.movie_agent.recommender = None
+        self.async_manager = AsyncSPARQLManager(self.sparql_manager)
+        self.addCleanup(self.async_manager.close)
+        self.sparql_manager.add_favorite_movie('7', '3')
+
+    def test_async_matches_sync_recommendations(self):
+        recommendations = self.async_manager.run(
+            self.movie_agent.get_recommendations_async('7', self.async_manager)
+        )
+        self.assertEqual(recommendations, self.movie_agent.get_recommendations('7'))
+
+    def test_independent_queries_run_concurrently(self):
+        in_flight = {'now': 0, 'max': 0}
+        original_query = self.async_manager.query
+
+        async def slow_query(query, method):
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            await asyncio.sleep(0.05)
+            in_flight['now'] -= 1
+            return await original_query(query, method)
+
+        with patch.object(self.async_manager, 'query', side_effect=slow_query):
+            self.async_manager.run(self.movie_agent.get_recommendations_async('7', self.async_manager))
+
+        self.assertEqual(in_flight['max'], 2)
+
+if __name__ == '__main__':
+    unittest.main()
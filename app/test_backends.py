@@ -0,0 +1,198 @@
+import unittest
+from contextlib import contextmanager
+from unittest.mock import patch
+from sparql_manager import SPARQLManager
+from backends import FusekiBackend, RDFLibBackend, _parse_tsv_row
+import os
+import tempfile
+import threading
+
+SAMPLE_MOVIES = [
+    {'id': '1', 'title': 'Inception', 'director': 'Christopher Nolan', 'genre': 'Sci-Fi', 'rating': 4.8},
+    {'id': '2', 'title': 'Amélie', 'director': 'Jean-Pierre Jeunet', 'genre': 'Romance', 'rating': 4.4},
+    {'id': '3', 'title': 'The Dark Knight', 'director': 'Christopher Nolan', 'genre': 'Action', 'rating': 4.9},
+    {'id': '4', 'title': 'Gladiator', 'director': 'Ridley Scott', 'genre': 'Action', 'rating': 4.5},
+    {'id': '5', 'title': 'Toy Story', 'director': 'John Lasseter', 'genre': 'Animation', 'rating': 4.3},
+    {'id': '6', 'title': 'Titanic', 'director': 'James Cameron', 'genre': 'Romance', 'rating': 3.2},
+]
+
+def make_memory_manager(movies=SAMPLE_MOVIES[:3]):
+    sparql_manager = SPARQLManager(backend=RDFLibBackend())
+    sparql_manager.add_movies(movies)
+    return sparql_manager
+
+@contextmanager
+def write_during_stream(sparql_manager, method, write, *args):
+    """
+    Tras la última fila que genere sparql_manager.<method>(), lanza write(*args) en
+    otro hilo, como una escritura que coincide con la carga de un índice en memoria.
+    """
+    original = getattr(sparql_manager, method)
+    writer = threading.Thread(target=write, args=args)
+
+    def stream(*call_args, **call_kwargs):
+        yield from original(*call_args, **call_kwargs)
+        if writer.ident is None:
+            writer.start()
+            # Da tiempo a la escritura a notificar su evento mientras la carga sigue en curso
+            writer.join(0.2)
+
+    with patch.object(sparql_manager, method, side_effect=stream):
+        yield
+    writer.join()
+
+class TestFusekiBackend(unittest.TestCase):
+    def setUp(self):
+        self.backend = FusekiBackend('http://localhost:3030/movies', pool_size=4, read_timeout=5)
+
+    def test_query_uses_pooled_session(self):
+        with patch.object(self.backend.session, 'post') as mock_post:
+            mock_post.return_value.json.return_value = {'head': {}, 'boolean': True}
+            result = self.backend.query('ASK {}')
+
+        self.assertTrue(result['boolean'])
+        args, kwargs = mock_post.call_args
+        self.assertEqual(args[0], 'http://localhost:3030/movies/query')
+        self.assertEqual(kwargs['data'], {'query': 'ASK {}'})
+        self.assertEqual(kwargs['timeout'], (3.05, 5))
+        self.assertEqual(self.backend.session.get_adapter('http://localhost:3030')._pool_maxsize, 4)
+
+    def test_query_stream_parses_tsv_incrementally(self):
+        body = [b'?movie\t?title', b'<http://example.org/movies#movie_1>\t"Coco"', b'<http://example.org/movies#movie_2>\t"Up"']
+        with patch.object(self.backend.session, 'post') as mock_post:
+            mock_post.return_value.iter_lines.return_value = iter(body)
+            rows = self.backend.query_stream('SELECT ...')
+            first = next(rows)
+            rows.close()
+
+        self.assertEqual(first['title']['value'], 'Coco')
+        self.assertTrue(mock_post.call_args[1]['stream'])
+        mock_post.return_value.close.assert_called_once()
+
+class TestRDFLibBackend(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager()
+
+    def test_queries_run_in_process(self):
+        movies = self.sparql_manager.get_all_movies()
+        self.assertEqual([m.title for m in movies], ['The Dark Knight', 'Inception', 'Amélie'])
+        self.assertEqual(self.sparql_manager.get_movie_details('2').rating, 4.4)
+
+        self.sparql_manager.add_favorite_movie('7', '1')
+        self.assertTrue(self.sparql_manager.is_favorite_movie('7', '1'))
+        similar = self.sparql_manager.get_similar_movies('7', ['Sci-Fi'], ['Christopher Nolan'])
+        self.assertEqual([m.title for m in similar], ['The Dark Knight'])
+
+        self.sparql_manager.remove_favorite_movie('7', '1')
+        self.assertFalse(self.sparql_manager.is_favorite_movie('7', '1'))
+
+    def test_catalog_reads_are_cached_per_generation(self):
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as spy:
+            self.sparql_manager.get_all_movies()
+            self.sparql_manager.get_all_movies()
+            self.sparql_manager.get_movie_details('1')
+            self.sparql_manager.get_movie_details('1')
+            self.assertEqual(spy.call_count, 2)
+
+            self.sparql_manager.add_movie(SAMPLE_MOVIES[3])
+            self.assertEqual(len(self.sparql_manager.get_all_movies()), 4)
+            self.assertEqual(spy.call_count, 3)
+        self.assertEqual(self.sparql_manager.cache_stats()['hits'], 2)
+
+    def test_keyset_pagination(self):
+        manager = make_memory_manager(SAMPLE_MOVIES + [
+            {'id': '7', 'title': 'Gladiator', 'director': 'Ridley Scott', 'genre': 'Action', 'rating': 4.5},
+        ])
+        pages = []
+        cursor = None
+        while True:
+            movies, cursor = manager.get_movies_page(cursor, limit=3)
+            pages.append([m.id for m in movies])
+            if not cursor:
+                break
+
+        self.assertEqual(pages, [['3', '1', '4'], ['7', '2', '5'], ['6']])
+        self.assertEqual(list(manager.get_all_movies(stream=True)), manager.get_all_movies())
+        with self.assertRaises(ValueError):
+            manager.get_movies_page('no-es-un-cursor')
+
+    def test_persistent_graph(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'movies.nt')
+            manager = SPARQLManager(backend=RDFLibBackend(path))
+            manager.add_movie({'id': '9', 'title': 'Coco', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': 4.6})
+
+            reloaded = SPARQLManager(backend=RDFLibBackend(path))
+            self.assertEqual(reloaded.get_movie_details('9').title, 'Coco')
+
+    def test_writes_append_to_the_change_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'movies.nt')
+            backend = RDFLibBackend(path)
+            manager = SPARQLManager(backend=backend)
+            with patch.object(backend, '_write_snapshot') as snapshot:
+                manager.add_movie({'id': '9', 'title': 'Coco', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': 4.6})
+                manager.add_favorite_movie('7', '9')
+                manager.remove_favorite_movie('7', '9')
+            snapshot.assert_not_called()
+            self.assertFalse(os.path.exists(path))
+            with open(backend.log_path, encoding='utf-8') as log:
+                lines = log.readlines()
+            self.assertEqual(lines[-1], 'D <http://example.org/movies#user_7> '
+                             '<http://example.org/movies#hasFavorite> <http://example.org/movies#movie_9> .\n')
+
+            # Una escritura interrumpida deja una línea a medias que se descarta al cargar
+            with open(backend.log_path, 'a', encoding='utf-8') as log:
+                log.write('A <http://example.org/movies#movie_10> <http://exam')
+            reloaded = SPARQLManager(backend=RDFLibBackend(path))
+            self.assertEqual(reloaded.get_movie_details('9').title, 'Coco')
+            self.assertFalse(reloaded.is_favorite_movie('7', '9'))
+            self.assertEqual(set(reloaded.backend.graph), set(backend.graph))
+
+    def test_log_is_compacted_into_the_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'movies.nt')
+            backend = RDFLibBackend(path, compact_every=8)
+            manager = SPARQLManager(backend=backend)
+            manager.add_movies(SAMPLE_MOVIES[:2])
+            self.assertEqual(os.path.getsize(backend.log_path), 0)
+            self.assertTrue(os.path.exists(path))
+
+            manager.add_favorite_movie('7', '1')
+            with open(backend.log_path, encoding='utf-8') as log:
+                pending = log.read()
+            backend.compact()
+            # Si el proceso cae entre la instantánea nueva y el vaciado del registro, reproducirlo otra vez no cambia nada
+            with open(backend.log_path, 'w', encoding='utf-8') as log:
+                log.write(pending)
+            reloaded = RDFLibBackend(path)
+            self.assertEqual(set(reloaded.graph), set(backend.graph))
+            self.assertTrue(SPARQLManager(backend=reloaded).is_favorite_movie('7', '1'))
+
+    def test_query_tsv_round_trips_through_the_parser(self):
+        backend = self.sparql_manager.backend
+        backend.update('PREFIX ex: <http://example.org/movies#> INSERT DATA { ex:movie_9 ex:title "Coco\\tDos \\"2\\"" . }')
+        header, line = backend.query_tsv(
+            'PREFIX ex: <http://example.org/movies#> SELECT ?movie ?title WHERE { ?movie ex:title ?title . FILTER(?movie = ex:movie_9) }'
+        ).splitlines()
+        row = _parse_tsv_row([var.lstrip('?') for var in header.split('\t')], line)
+        self.assertEqual(row['movie']['value'], 'http://example.org/movies#movie_9')
+        self.assertEqual(row['title']['value'], 'Coco\tDos "2"')
+
+class TestTSVParsing(unittest.TestCase):
+    def test_parse_tsv_row(self):
+        row = _parse_tsv_row(['movie', 'title', 'rating', 'genre'], '\t'.join([
+            '<http://example.org/movies#movie_1>',
+            '"Say \\"hi\\"\\tnow"@en',
+            '4.5',
+            '',
+        ]))
+
+        self.assertEqual(row['movie'], {'type': 'uri', 'value': 'http://example.org/movies#movie_1'})
+        self.assertEqual(row['title'], {'type': 'literal', 'value': 'Say "hi"\tnow', 'xml:lang': 'en'})
+        self.assertEqual(row['rating']['value'], '4.5')
+        self.assertTrue(row['rating']['datatype'].endswith('#decimal'))
+        self.assertNotIn('genre', row)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,23 @@
+import unittest
+from sparql_manager import SPARQLManager
+from backends import RDFLibBackend
+from benchmark import generate_catalog, generate_favorites, run_benchmarks
+
+class TestBenchmark(unittest.TestCase):
+    def test_generators_are_seeded(self):
+        self.assertEqual(list(generate_catalog(50, seed=3)), list(generate_catalog(50, seed=3)))
+        self.assertNotEqual(list(generate_catalog(50, seed=3)), list(generate_catalog(50, seed=4)))
+        favorites = list(generate_favorites(20, 50, per_user=5, seed=3))
+        self.assertEqual(favorites, list(generate_favorites(20, 50, per_user=5, seed=3)))
+        self.assertEqual(len(favorites), len(set(favorites)))
+
+    def test_run_benchmarks_reports_every_operation(self):
+        results = run_benchmarks(SPARQLManager(backend=RDFLibBackend()), 40, 5, per_user=3, repeat=2)
+
+        self.assertEqual(results['bulk_load_movies']['items'], 40)
+        for name in ('get_all_movies_cold', 'get_similar_movies', 'get_recommendations', 'toggle_favorite'):
+            self.assertEqual(results[name]['runs'], 2)
+        self.assertEqual(results['get_all_movies_cached']['queries_per_run'], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from cache import LRUCache, MISSING
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIs(cache.get('b'), MISSING)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_entries_expire_after_ttl(self):
+        now = [100.0]
+        cache = LRUCache(ttl=10, clock=lambda: now[0])
+        cache.set('a', None)
+
+        self.assertIsNone(cache.get('a'))
+        now[0] += 11
+        self.assertIs(cache.get('a'), MISSING)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_pop_discards_entry(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertIsNone(cache.pop('a'))
+        self.assertIs(cache.get('a'), MISSING)
+
+if __name__ == '__main__':
+    unittest.main()
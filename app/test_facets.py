@@ -0,0 +1,90 @@
+import unittest
+from facets import FacetIndex
+from sparql_manager import SPARQLManager
+from app import create_app
+from test_backends import SAMPLE_MOVIES, make_memory_manager, write_during_stream
+
+class TestFacetIndex(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager(SAMPLE_MOVIES)
+        self.sparql_manager.add_favorite_movie('1', '2')
+        self.sparql_manager.add_favorite_movie('2', '4')
+
+    def counts(self, facet):
+        return {f['value']: (f['count'], f['favorites']) for f in self.sparql_manager.facets.counts()[facet]}
+
+    def test_counts_are_seeded_from_the_store(self):
+        self.assertEqual(
+            self.counts('genre'),
+            {'Action': (2, 1), 'Romance': (2, 1), 'Sci-Fi': (1, 0), 'Animation': (1, 0)}
+        )
+        self.assertEqual(self.counts('rating'), {'3-4': (1, 0), '4-5': (5, 2)})
+        self.assertEqual(self.counts('director')['Christopher Nolan'], (2, 0))
+        self.assertEqual(self.sparql_manager.facets.counts()['favorites'], 2)
+
+    def test_movie_added_while_loading_is_counted(self):
+        movie = {'id': '8', 'title': 'Heat', 'director': 'Michael Mann', 'genre': 'Action', 'rating': 4.1}
+        facets = self.sparql_manager.facets
+        with write_during_stream(self.sparql_manager, 'get_all_movies', self.sparql_manager.add_movie, movie):
+            facets.load()
+        self.assertEqual(self.counts('genre')['Action'], (3, 1))
+        self.assertEqual(facets.counts()['total'], 7)
+
+    def test_reseeds_when_the_catalog_generation_expires(self):
+        facets = self.sparql_manager.facets
+        self.assertEqual(facets.counts()['total'], 6)
+        # Un script de carga u otro worker escribe en el mismo almacén
+        other = SPARQLManager(backend=self.sparql_manager.backend)
+        other.add_movie({'id': '8', 'title': 'Heat', 'director': 'Michael Mann', 'genre': 'Action', 'rating': 4.1})
+        self.assertEqual(facets.counts()['total'], 6)
+
+        self.sparql_manager._generation_started -= self.sparql_manager._read_cache.ttl
+        self.assertEqual(facets.counts()['total'], 7)
+        movies, _ = facets.filter({'rating': '4-5'})
+        self.assertIn('Heat', [m.title for m in movies])
+
+    def test_counts_follow_writes_without_queries(self):
+        self.sparql_manager.facets.counts()
+        queries = []
+        self.sparql_manager.add_query_hook(lambda *args, **kwargs: queries.append(args))
+
+        self.sparql_manager.add_movie({'title': 'Heat', 'director': 'Michael Mann', 'genre': 'Action', 'rating': 4.1})
+        self.sparql_manager.add_favorite_movie('1', '3')
+        self.sparql_manager.add_favorite_movie('1', '3')
+        self.sparql_manager.toggle_favorite_movie('2', '4')
+        before = len(queries)
+        counts = self.sparql_manager.facets.counts()
+        self.assertEqual(len(queries), before)
+
+        self.assertEqual(self.counts('genre')['Action'], (3, 1))
+        # Los contadores incrementales coinciden con una siembra nueva desde el almacén
+        self.assertEqual(counts, FacetIndex(self.sparql_manager).counts())
+
+    def test_filters_use_the_index_and_paginate(self):
+        facets = self.sparql_manager.facets
+        movies, _ = facets.filter({'genre': 'Action'})
+        self.assertEqual([m.title for m in movies], ['The Dark Knight', 'Gladiator'])
+        movies, _ = facets.filter({'director': 'Christopher Nolan', 'rating': '4-5'})
+        self.assertEqual(len(movies), 2)
+        self.assertEqual(facets.filter({'genre': 'Western'}), ([], None))
+
+        first, cursor = facets.filter({'rating': '4-5'}, limit=3)
+        rest, last_cursor = facets.filter({'rating': '4-5'}, cursor=cursor, limit=3)
+        self.assertEqual(len(first) + len(rest), 5)
+        self.assertIsNone(last_cursor)
+        with self.assertRaises(ValueError):
+            facets.filter({'year': '1999'})
+
+    def test_routes(self):
+        client = create_app(self.sparql_manager).test_client()
+        genres = client.get('/facets').get_json()['facets']['genre']
+        self.assertEqual(genres[0]['count'], 2)
+
+        movies = client.get('/get_all_movies?genre=Romance&user_id=1').get_json()['movies']
+        self.assertEqual([(m['title'], m['is_favorite']) for m in movies], [('Amélie', True), ('Titanic', False)])
+        page = client.get('/get_all_movies?genre=Romance&limit=1').get_json()
+        self.assertEqual(len(page['movies']), 1)
+        self.assertIsNotNone(page['next_cursor'])
+
+if __name__ == '__main__':
+    unittest.main()
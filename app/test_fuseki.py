@@ -7,6 +7,7 @@ logger = logging.getLogger(__name__)
 def test_fuseki_connection():
     try:
         sparql_manager = SPARQLManager()
+        sparql_manager.setup()
         
         # Intentar agregar una película de prueba
         test_movie = {
@@ -26,10 +27,10 @@ def test_fuseki_connection():
         movie_details = sparql_manager.get_movie_details('test001')
         if movie_details:
             logger.info("Película recuperada correctamente:")
-            logger.info(f"Título: {movie_details['title']['value']}")
-            logger.info(f"Director: {movie_details['director']['value']}")
-            logger.info(f"Género: {movie_details['genre']['value']}")
-            logger.info(f"Calificación: {movie_details['rating']['value']}")
+            logger.info(f"Título: {movie_details.title}")
+            logger.info(f"Director: {movie_details.director}")
+            logger.info(f"Género: {movie_details.genre}")
+            logger.info(f"Calificación: {movie_details.rating}")
         else:
             logger.error("No se pudo recuperar la película")
             
@@ -0,0 +1,33 @@
+import unittest
+from backends import _parse_tsv_row
+from fuseki_standin import FusekiStandIn, create_standin_app
+
+class TestFusekiStandIn(unittest.TestCase):
+    def setUp(self):
+        self.client = create_standin_app(FusekiStandIn()).test_client()
+        self.client.post('/$/datasets', data={'dbName': 'movies', 'dbType': 'tdb2'})
+
+    def test_protocol_round_trip(self):
+        datasets = self.client.get('/$/datasets').get_json()['datasets']
+        self.assertEqual([ds['ds.name'] for ds in datasets], ['/movies'])
+
+        response = self.client.post('/movies/update', data={
+            'update': 'PREFIX ex: <http://example.org/movies#> INSERT DATA { ex:movie_1 ex:title "Coco\\tDos" ; ex:rating 4.5 . }'
+        })
+        self.assertEqual(response.status_code, 204)
+
+        query = 'PREFIX ex: <http://example.org/movies#> SELECT ?title ?rating WHERE { ?m ex:title ?title ; ex:rating ?rating }'
+        result = self.client.post('/movies/query', data={'query': query}).get_json()
+        self.assertEqual(result['results']['bindings'][0]['title']['value'], 'Coco\tDos')
+
+        tsv = self.client.post('/movies/query', data={'query': query},
+                               headers={'Accept': 'text/tab-separated-values'}).get_data(as_text=True)
+        header, line = tsv.splitlines()
+        row = _parse_tsv_row([var.lstrip('?') for var in header.split('\t')], line)
+        self.assertEqual(row['title']['value'], 'Coco\tDos')
+        self.assertEqual(row['rating']['value'], '4.5')
+
+        self.assertEqual(self.client.post('/otro/query', data={'query': query}).status_code, 404)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+from ids import IdAllocator
+from app import create_app
+from test_backends import make_memory_manager
+import threading
+
+class TestIdAllocator(unittest.TestCase):
+    def test_ids_are_unique_and_time_ordered(self):
+        times = iter([1.0] * 70000 + [0.5, 2.0])
+        allocator = IdAllocator(clock=lambda: next(times))
+        ids = [allocator.new_id() for _ in range(70002)]
+
+        self.assertEqual(len(set(ids)), len(ids))
+        # La secuencia se agota, el reloj retrocede y aun así el orden se mantiene
+        self.assertEqual(ids, sorted(ids))
+        self.assertTrue(ids[-1].startswith(f"{2000:012x}"))
+
+    def test_ids_are_unique_across_threads(self):
+        allocator = IdAllocator()
+        ids = []
+        lock = threading.Lock()
+
+        def allocate():
+            batch = [allocator.new_id() for _ in range(2000)]
+            with lock:
+                ids.extend(batch)
+
+        threads = [threading.Thread(target=allocate) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(ids)), 16000)
+
+    def test_add_movie_route_assigns_distinct_ids(self):
+        client = create_app(make_memory_manager([])).test_client()
+        movie = {'title': 'Coco', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': 4.6}
+        first = client.post('/add_movie', json=movie).get_json()['movie']['id']
+        second = client.post('/add_movie', json=movie).get_json()['movie']['id']
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(client.get('/get_all_movies').get_json()['movies']), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+from import_movies import prepare_movies
+
+class TestPrepareMovies(unittest.TestCase):
+    def test_invalid_rows_are_skipped_and_counted(self):
+        rows = [
+            {'id': '1', 'title': ' Coco ', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': '4.6'},
+            {'id': '', 'title': 'Up', 'director': 'Pete Docter', 'genre': 'Animation', 'rating': '4.1'},
+            {'id': '2> ex:title "x', 'title': 'Cars', 'director': 'John Lasseter', 'genre': 'Animation', 'rating': '3.9'},
+            {'id': 'wall e', 'title': 'WALL·E', 'director': 'Andrew Stanton', 'genre': 'Animation', 'rating': '4.4'},
+            {'id': '3', 'title': 'Heat', 'director': 'Michael Mann', 'genre': 'Crime', 'rating': '7'},
+            {'id': '4', 'title': 1917, 'director': 'Sam Mendes', 'genre': 'War', 'rating': '4.2'},
+        ]
+        stats = {'skipped': 0}
+        movies = list(prepare_movies(rows, stats, new_id=lambda: 'nuevo'))
+
+        self.assertEqual([(m['id'], m['title']) for m in movies], [('1', 'Coco'), ('nuevo', 'Up')])
+        self.assertEqual(stats['skipped'], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+from unittest.mock import patch
+from loadgen import Workload, run_load, summarize
+
+class TestLoadReport(unittest.TestCase):
+    def test_load_report_percentiles(self):
+        samples = [('a', i / 1000, i != 100) for i in range(1, 101)] + [('b', 0.5, True)]
+        report = summarize(samples, elapsed=10)
+        self.assertEqual(report['a']['p50_ms'], 50)
+        self.assertEqual(report['a']['p99_ms'], 99)
+        self.assertEqual(report['a']['errors'], 1)
+        self.assertEqual(report['total']['requests'], 101)
+        self.assertAlmostEqual(report['total']['throughput_rps'], 10.1)
+
+    def test_only_2xx_and_3xx_count_as_ok(self):
+        workload = Workload(['1'], mix={'movie_details': 1})
+        for status, ok in [(200, True), (304, True), (404, False), (500, False)]:
+            with patch('loadgen.requests.Session') as session:
+                session.return_value.request.return_value.status_code = status
+                samples, _ = run_load('http://localhost:5000', workload, rate=100, duration=0.02)
+            self.assertEqual({sample[2] for sample in samples}, {ok}, status)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import time
+import unittest
+from unittest.mock import patch
+from movie_agent import MovieAgent
+from sparql_manager import SPARQLManager
+from materialized import RecommendationStore
+from test_backends import SAMPLE_MOVIES, make_memory_manager
+
+class TestRecommendationStore(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager(SAMPLE_MOVIES)
+        self.movie_agent = MovieAgent(self.sparql_manager)
+        self.store = RecommendationStore(self.movie_agent, workers=1)
+        self.addCleanup(self.store.close)
+
+    def _wait_for_refresh(self):
+        # Con un solo hilo, una tarea vacía termina después de los refrescos pendientes
+        self.store._executor.submit(lambda: None).result()
+
+    def test_reads_are_served_from_materialised_list(self):
+        self.sparql_manager.add_favorite_movie('7', '3')
+        first = self.store.get('7')
+        with patch.object(self.sparql_manager, 'query') as spy:
+            self.assertIs(self.store.get('7'), first)
+        spy.assert_not_called()
+        self.assertEqual(self.store.stats()['hits'], 1)
+        self.assertEqual(self.store.stats()['misses'], 1)
+
+    def test_favorite_change_refreshes_in_background(self):
+        self.sparql_manager.add_favorite_movie('7', '3')
+        self.store.get('7')
+
+        self.sparql_manager.add_favorite_movie('7', '1')
+        self._wait_for_refresh()
+        with patch.object(self.movie_agent, 'get_recommendations') as live:
+            recommendations = self.store.get('7')
+        live.assert_not_called()
+        self.assertEqual(recommendations, self.movie_agent.get_recommendations('7'))
+        self.assertNotIn('Inception', [r.title for r in recommendations])
+
+        stats = self.store.stats()
+        self.assertEqual((stats['refreshes'], stats['dirty']), (1, 0))
+
+    def test_unknown_favorite_state_refreshes_every_listener(self):
+        self.sparql_manager.add_favorite_movie('7', '3')
+        self.store.get('7')
+        collaborative = self.movie_agent.collaborative
+        collaborative.scores({'http://example.org/movies#movie_3'})
+        self.sparql_manager.facets.counts()
+
+        query = self.sparql_manager.query
+
+        def failing_ask(text, *args, **kwargs):
+            if 'ASK' in text:
+                raise RuntimeError('tiempo de espera agotado')
+            return query(text, *args, **kwargs)
+
+        with patch.object(self.sparql_manager, 'query', side_effect=failing_ask):
+            self.assertIsNone(self.sparql_manager.toggle_favorite_movie('7', '1'))
+        self._wait_for_refresh()
+
+        self.assertEqual(self.store.stats()['refreshes'], 1)
+        self.assertEqual(self.store.get('7'), self.movie_agent.get_recommendations('7'))
+        self.assertNotIn('Inception', [r.title for r in self.store.get('7')])
+        ex = 'http://example.org/movies#'
+        self.assertEqual(collaborative.scores({ex + 'movie_3'}), {ex + 'movie_1': 1.0})
+        self.assertEqual(self.sparql_manager.facets.counts()['favorites'], 2)
+
+    def test_lists_expire_to_pick_up_other_workers(self):
+        now = [0.0]
+        store = RecommendationStore(self.movie_agent, workers=1, max_age=600, clock=lambda: now[0])
+        self.addCleanup(store.close)
+        ttl = self.sparql_manager.profile_cache_ttl
+        self.assertEqual(store.max_age, ttl)
+
+        self.sparql_manager.add_favorite_movie('7', '3')
+        self.assertIn('Inception', [r.title for r in store.get('7')])
+        # Otro worker marca Inception; este proceso no recibe el evento
+        SPARQLManager(backend=self.sparql_manager.backend).add_favorite_movie('7', '1')
+        self.assertIn('Inception', [r.title for r in store.get('7')])
+
+        now[0] += ttl
+        profiles = self.sparql_manager._profile_cache
+        profiles._clock = lambda: time.monotonic() + ttl
+        self.assertNotIn('Inception', [r.title for r in store.get('7')])
+
+    def test_maps_are_bounded(self):
+        store = RecommendationStore(self.movie_agent, workers=1, max_entries=2)
+        self.addCleanup(store.close)
+        for user_id in ['1', '2', '3']:
+            store.get(user_id)
+        store.get('2')
+        store.invalidate([str(user_id) for user_id in range(100, 200)])
+
+        self.assertEqual(list(store._entries), ['3', '2'])
+        self.assertLessEqual(len(store._versions), 2)
+        self.assertEqual(store.stats()['entries'], 2)
+
+    def test_stale_version_is_not_stored(self):
+        self.store.get('7')
+        version = self.store._versions.get('7', 0)
+        self.store.invalidate(['7'])
+        self.assertIsNone(self.store._store('7', version, []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+from app import create_app
+from test_backends import make_memory_manager
+
+class TestQueryMetrics(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager()
+
+    def test_queries_are_labelled_by_method(self):
+        self.sparql_manager.get_movie_details('1')
+        list(self.sparql_manager.get_all_movies(stream=True))
+        text = self.sparql_manager.metrics.render()
+
+        self.assertIn('sparql_query_duration_seconds_count{method="SPARQLManager.get_movies_details",operation="query"} 1', text)
+        self.assertIn('sparql_query_rows_total{method="SPARQLManager.get_all_movies",operation="stream"} 3', text)
+        self.assertIn('sparql_query_duration_seconds_count{method="SPARQLManager.add_movies",operation="update"} 1', text)
+
+    def test_request_round_trips_and_server_timing(self):
+        app = create_app(self.sparql_manager)
+        app.config['SERVER_TIMING'] = True
+        client = app.test_client()
+
+        response = client.get('/movie_details/2')
+        self.assertRegex(response.headers['Server-Timing'], r'^sparql;dur=[0-9.]+;desc="1 consultas"$')
+        # La segunda lectura sale de la caché del catálogo
+        response = client.get('/movie_details/2')
+        self.assertIn('desc="0 consultas"', response.headers['Server-Timing'])
+
+        text = client.get('/metrics').get_data(as_text=True)
+        self.assertIn('sparql_request_round_trips_count{endpoint="movies.movie_details"} 2', text)
+        self.assertIn('sparql_request_round_trips_bucket{endpoint="movies.movie_details",le="0"} 1', text)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import unittest
+from models import Movie, MOVIE_PREFIX, decode_movies
+
+class TestMovie(unittest.TestCase):
+    def test_decodes_bindings_once(self):
+        row = {
+            'movie': {'type': 'uri', 'value': f'{MOVIE_PREFIX}7'},
+            'title': {'type': 'literal', 'value': 'Coco'},
+            'director': {'type': 'literal', 'value': 'Lee Unkrich'},
+            'genre': {'type': 'literal', 'value': 'Animation'},
+            'rating': {'type': 'literal', 'value': '4.6'},
+        }
+        movie = decode_movies([row])[0]
+
+        self.assertEqual(movie.id, '7')
+        self.assertEqual(movie.rating, 4.6)
+        self.assertEqual(movie.to_dict(), {
+            'id': '7', 'title': 'Coco', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': 4.6
+        })
+        self.assertEqual(movie, Movie.from_dict(movie.to_dict()))
+        self.assertFalse(hasattr(movie, '__dict__'))
+
+    def test_sort_key_matches_catalog_order(self):
+        movies = [
+            Movie(f'{MOVIE_PREFIX}1', 'Up', 'Pete Docter', 'Animation', 4.0),
+            Movie(f'{MOVIE_PREFIX}2', 'Coco', 'Lee Unkrich', 'Animation', 4.6),
+            Movie(f'{MOVIE_PREFIX}3', 'Cars', 'John Lasseter', 'Animation', 4.0),
+        ]
+        self.assertEqual([m.title for m in sorted(movies, key=lambda m: m.sort_key)], ['Coco', 'Cars', 'Up'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,16 @@
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import patch
+import time
 from movie_agent import MovieAgent
-from sparql_manager import SPARQLManager
+from sparql_manager import SPARQLManager, EMPTY_PROFILE
+from app import create_app, MAX_PAGE_SIZE
+from models import Movie
+from test_backends import SAMPLE_MOVIES, make_memory_manager, write_during_stream
 
 class TestMovieAgent(unittest.TestCase):
     def setUp(self):
         self.movie_agent = MovieAgent()
-        self.mock_movie_data = {
-            'title': {'value': 'Test Movie'},
-            'director': {'value': 'Test Director'},
-            'genre': {'value': 'Action'},
-            'rating': {'value': '4.5'}
-        }
+        self.mock_movie_data = Movie('movie_test', 'Test Movie', 'Test Director', 'Action', 4.5)
 
     @patch.object(SPARQLManager, 'get_movie_details')
     def test_generate_opinion(self, mock_get_details):
@@ -22,29 +21,27 @@ class TestMovieAgent(unittest.TestCase):
         self.assertIn('Test Director', opinion)
         self.assertIn('acción', opinion.lower())
 
-    @patch.object(SPARQLManager, 'get_user_preferences')
+    @patch.object(SPARQLManager, 'get_user_profile')
     @patch.object(SPARQLManager, 'get_similar_movies')
-    def test_get_recommendations(self, mock_similar_movies, mock_preferences):
-        # Simular preferencias del usuario
-        mock_preferences.return_value = [
-            {'genre': {'value': 'Action'}, 'count': {'value': '2'}},
-            {'genre': {'value': 'Drama'}, 'count': {'value': '1'}}
-        ]
+    @patch.object(SPARQLManager, 'get_top_rated_movies', return_value=[])
+    def test_get_recommendations(self, mock_top_rated, mock_similar_movies, mock_profile):
+        # Simular el perfil del usuario
+        mock_profile.return_value = {
+            'genres': {'Action': 2, 'Drama': 1},
+            'directors': {},
+            'favorites': frozenset()
+        }
         
         # Simular películas similares
-        mock_similar_movies.return_value = [{
-            'movie': {'value': 'movie_1'},
-            'title': {'value': 'Test Movie'},
-            'director': {'value': 'Test Director'},
-            'genre': {'value': 'Action'},
-            'rating': {'value': '4.5'}
-        }]
+        mock_similar_movies.return_value = [Movie('movie_1', 'Test Movie', 'Test Director', 'Action', 4.5)]
 
+        # Las consultas simuladas son las del motor SPARQL, no las del vectorial
+        self.movie_agent.recommender = None
         recommendations = self.movie_agent.get_recommendations('test_user')
         
         self.assertTrue(len(recommendations) > 0)
-        self.assertEqual(recommendations[0]['title'], 'Test Movie')
-        self.assertEqual(recommendations[0]['rating'], 4.5)
+        self.assertEqual(recommendations[0].title, 'Test Movie')
+        self.assertEqual(recommendations[0].rating, 4.5)
 
     def test_get_genre_description(self):
         description = self.movie_agent._get_genre_description('Action')
@@ -64,12 +61,12 @@ class TestSPARQLManager(unittest.TestCase):
     def setUp(self):
         self.sparql_manager = SPARQLManager()
 
-    @patch('SPARQLWrapper.SPARQLWrapper.query')
+    @patch('backends.FusekiBackend.query')
     def test_get_movie_details(self, mock_query):
-        mock_response = Mock()
-        mock_response.convert.return_value = {
+        mock_query.return_value = {
             'results': {
                 'bindings': [{
+                    'movie': {'value': 'http://example.org/movies#movie_test_id'},
                     'title': {'value': 'Test Movie'},
                     'director': {'value': 'Test Director'},
                     'genre': {'value': 'Action'},
@@ -77,29 +74,189 @@ class TestSPARQLManager(unittest.TestCase):
                 }]
             }
         }
-        mock_query.return_value = mock_response
 
         result = self.sparql_manager.get_movie_details('test_id')
-        self.assertEqual(result['title']['value'], 'Test Movie')
-        self.assertEqual(result['rating']['value'], '4.5')
+        self.assertEqual(result.title, 'Test Movie')
+        self.assertEqual(result.rating, 4.5)
 
-    @patch('SPARQLWrapper.SPARQLWrapper.query')
-    def test_get_user_preferences(self, mock_query):
-        mock_response = Mock()
-        mock_response.convert.return_value = {
-            'results': {
-                'bindings': [{
-                    'genre': {'value': 'Action'},
-                    'count': {'value': '2'}
-                }]
-            }
-        }
-        mock_query.return_value = mock_response
+class TestMemoryRecommendations(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager(SAMPLE_MOVIES)
+        self.movie_agent = MovieAgent(self.sparql_manager)
+
+    def test_top_rated_fallback_is_one_query(self):
+        self.sparql_manager.add_favorite_movie('7', '3')
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as spy:
+            top_rated = self.movie_agent._get_top_rated_non_favorite_movies('7', limit=2, exclude=[
+                'http://example.org/movies#movie_1'
+            ])
+
+        self.assertEqual(spy.call_count, 1)
+        self.assertEqual([m.title for m in top_rated], ['Gladiator', 'Amélie'])
+
+    def test_user_profile_is_cached_until_favorites_change(self):
+        self.sparql_manager.add_favorite_movie('7', '1')
+        self.sparql_manager.add_favorite_movie('7', '3')
+
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as spy:
+            profile = self.sparql_manager.get_user_profile('7')
+            self.assertIs(self.sparql_manager.get_user_profile('7'), profile)
+        self.assertEqual(spy.call_count, 1)
+        self.assertEqual(profile['genres'], {'Sci-Fi': 1, 'Action': 1})
+        self.assertEqual(profile['directors'], {'Christopher Nolan': 2})
+
+        self.sparql_manager.remove_favorite_movie('7', '1')
+        self.assertEqual(self.sparql_manager.get_user_profile('7')['directors'], {'Christopher Nolan': 1})
+
+    def test_user_profile_expires_to_pick_up_other_workers(self):
+        self.sparql_manager.add_favorite_movie('7', '1')
+        self.assertEqual(self.sparql_manager.get_user_profile('7')['directors'], {'Christopher Nolan': 1})
+
+        # Otro worker cambia las favoritas en el mismo almacén
+        SPARQLManager(backend=self.sparql_manager.backend).add_favorite_movie('7', '3')
+        self.assertEqual(self.sparql_manager.get_user_profile('7')['directors'], {'Christopher Nolan': 1})
+        cache = self.sparql_manager._profile_cache
+        cache._clock = lambda: time.monotonic() + cache.ttl
+        self.assertEqual(self.sparql_manager.get_user_profile('7')['directors'], {'Christopher Nolan': 2})
+
+    def test_recommendations_from_profile(self):
+        self.sparql_manager.add_favorite_movie('7', '3')
+        recommendations = self.movie_agent.get_recommendations('7')
+
+        titles = [r.title for r in recommendations]
+        self.assertEqual(titles[:2], ['Inception', 'Gladiator'])
+        self.assertNotIn('The Dark Knight', titles)
+        self.assertEqual(len(recommendations), 5)
+
+    def test_sparql_recommendations_without_engine(self):
+        self.movie_agent.recommender = None
+        self.test_recommendations_from_profile()
+
+    def test_vector_engine_refreshes_on_add_movie(self):
+        self.sparql_manager.add_favorite_movie('7', '5')
+        self.assertEqual(self.movie_agent.get_recommendations('7')[0].title, 'The Dark Knight')
+
+        self.sparql_manager.add_movie({'id': '8', 'title': 'Coco', 'director': 'Lee Unkrich', 'genre': 'Animation', 'rating': 4.6})
+        with patch.object(self.sparql_manager, 'query') as spy:
+            recommendations = self.movie_agent.recommender.recommend(self.sparql_manager.get_user_profile('7'), limit=2)
+        spy.assert_not_called()
+        self.assertEqual([r.title for r in recommendations], ['Coco', 'The Dark Knight'])
+
+    def test_movie_added_while_loading_is_kept(self):
+        movie = {'id': '8', 'title': 'Heat', 'director': 'Michael Mann', 'genre': 'Crime', 'rating': 5.0}
+        recommender = self.movie_agent.recommender
+        with write_during_stream(self.sparql_manager, 'get_all_movies', self.sparql_manager.add_movie, movie):
+            recommender.load()
+        self.assertEqual([m.title for m in recommender.recommend(EMPTY_PROFILE, limit=1)], ['Heat'])
+
+    def test_vector_engine_reloads_when_the_catalog_generation_expires(self):
+        recommender = self.movie_agent.recommender
+        self.assertNotEqual([m.title for m in recommender.recommend(EMPTY_PROFILE, limit=1)], ['Heat'])
+        # Un script de carga u otro worker escribe en el mismo almacén
+        other = SPARQLManager(backend=self.sparql_manager.backend)
+        other.add_movie({'id': '8', 'title': 'Heat', 'director': 'Michael Mann', 'genre': 'Crime', 'rating': 5.0})
+        self.assertNotEqual([m.title for m in recommender.recommend(EMPTY_PROFILE, limit=1)], ['Heat'])
+
+        self.sparql_manager._generation_started -= self.sparql_manager._read_cache.ttl
+        self.assertEqual([m.title for m in recommender.recommend(EMPTY_PROFILE, limit=1)], ['Heat'])
+
+    def test_iri_safe_ids_round_trip(self):
+        ids = ['a/b', 'x.', 'é#1']
+        for i, movie_id in enumerate(ids):
+            self.sparql_manager.add_movie({'id': movie_id, 'title': f'Película {i}', 'director': "Pat O'Brien",
+                                           'genre': 'Western', 'rating': 4.0 + i / 10})
+        self.sparql_manager.add_favorite_movie('u.1', 'a/b')
+        self.assertTrue(self.sparql_manager.toggle_favorite_movie('u.1', 'x.'))
+        client = create_app(self.sparql_manager).test_client()
+        response = client.post('/favorite_movie', json={'user_id': 'u.1', 'movie_id': 'é#1', 'favorite': True})
+        self.assertEqual(response.status_code, 200)
+
+        profile = self.sparql_manager.get_user_profile('u.1')
+        self.assertEqual(profile['genres'], {'Western': 3})
+        self.assertEqual(self.sparql_manager.get_favorite_ids('u.1'), sorted(ids))
+        self.assertTrue(self.sparql_manager.is_favorite_movie('u.1', 'é#1'))
+        self.assertEqual(len(self.sparql_manager.get_favorite_movies('u.1')), 3)
+
+        self.sparql_manager.set_favorite_movie('u.1', 'é#1', False)
+        for recommender in (self.movie_agent.recommender, None):
+            self.movie_agent.recommender = recommender
+            titles = [r.title for r in self.movie_agent.get_recommendations('u.1')]
+            self.assertEqual(titles[0], 'Película 2')
+            self.assertNotIn('Película 0', titles)
+
+    def test_collaborative_index_updates_incrementally(self):
+        for user_id, movie_id in [('1', '6'), ('1', '5'), ('2', '6'), ('2', '5'), ('3', '6')]:
+            self.sparql_manager.add_favorite_movie(user_id, movie_id)
+        collaborative = self.movie_agent.collaborative
+        ex = 'http://example.org/movies#'
+
+        self.assertEqual(collaborative.scores({ex + 'movie_6'}), {ex + 'movie_5': 1.0})
+        # Toy Story sube por coocurrencia por encima de películas mejor calificadas
+        titles = [r.title for r in self.movie_agent.get_recommendations('3')]
+        self.assertEqual(titles[:2], ['Amélie', 'Toy Story'])
+
+        self.sparql_manager.add_favorite_movie('3', '2')
+        self.sparql_manager.remove_favorite_movie('1', '5')
+        self.sparql_manager.remove_favorite_movie('2', '5')
+        self.assertEqual(collaborative.scores({ex + 'movie_6'}), {ex + 'movie_2': 1.0})
+
+    def test_favorite_added_while_loading_is_kept(self):
+        self.sparql_manager.add_favorite_movie('1', '6')
+        collaborative = self.movie_agent.collaborative
+        with write_during_stream(self.sparql_manager, 'iter_query', self.sparql_manager.add_favorite_movie, '1', '5'):
+            collaborative.load()
+        ex = 'http://example.org/movies#'
+        self.assertEqual(collaborative.scores({ex + 'movie_6'}), {ex + 'movie_5': 1.0})
+
+    def test_collaborative_index_rebuilds_when_the_catalog_generation_expires(self):
+        self.sparql_manager.add_favorite_movie('1', '6')
+        collaborative = self.movie_agent.collaborative
+        ex = 'http://example.org/movies#'
+        self.assertEqual(collaborative.scores({ex + 'movie_6'}), {})
+        # Otro worker cambia las favoritas en el mismo almacén
+        SPARQLManager(backend=self.sparql_manager.backend).add_favorite_movie('1', '5')
+        self.assertEqual(collaborative.scores({ex + 'movie_6'}), {})
+
+        self.sparql_manager._generation_started -= self.sparql_manager._read_cache.ttl
+        self.assertEqual(collaborative.scores({ex + 'movie_6'}), {ex + 'movie_5': 1.0})
+
+    def test_user_profiles_batch_is_one_query(self):
+        self.sparql_manager.add_favorite_movie('7', '1')
+        self.sparql_manager.add_favorite_movie('7', '3')
+        self.sparql_manager.add_favorite_movie('8', '2')
+
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as spy:
+            profiles = self.sparql_manager.get_user_profiles(['7', '8', '9'])
+        self.assertEqual(spy.call_count, 1)
+        self.assertEqual(profiles['7']['directors'], {'Christopher Nolan': 2})
+        self.assertEqual(profiles['8']['genres'], {'Romance': 1})
+        self.assertEqual(profiles['9']['favorites'], frozenset())
+        # Los perfiles quedan en caché para las consultas individuales
+        self.assertIs(self.sparql_manager.get_user_profile('7'), profiles['7'])
+
+    def test_malformed_user_id_does_not_poison_the_batch(self):
+        self.sparql_manager.add_favorite_movie('7', '1')
+        self.sparql_manager.add_favorite_movie('7', '3')
+
+        profiles = self.sparql_manager.get_user_profiles(['a b', '7', 'x>y'])
+        self.assertEqual(profiles['7']['directors'], {'Christopher Nolan': 2})
+        self.assertEqual(profiles['a b'], EMPTY_PROFILE)
+
+        client = create_app(self.sparql_manager).test_client()
+        response = client.post('/get_recommendations_batch', json={'user_ids': ['7', 'a b', None]})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['user_ids'], ['a b', None])
+        self.assertEqual(client.post('/get_recommendations_batch', json={'user_ids': ['7', 8]}).status_code, 200)
+        response = client.post('/get_recommendations_batch', json={'user_ids': ['7'] * (MAX_PAGE_SIZE + 1)})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_recommendations_match_single_user(self):
+        for user_id, movie_id in [('7', '3'), ('8', '2'), ('8', '6'), ('9', '5')]:
+            self.sparql_manager.add_favorite_movie(user_id, movie_id)
 
-        result = self.sparql_manager.get_user_preferences('test_user')
-        self.assertEqual(len(result), 1)
-        self.assertEqual(result[0]['genre']['value'], 'Action')
-        self.assertEqual(result[0]['count']['value'], '2')
+        batch = dict(self.movie_agent.get_recommendations_batch(['7', '8', '9', '10']))
+        for user_id in ['7', '8', '9', '10']:
+            self.assertEqual(batch[user_id], self.movie_agent.get_recommendations(user_id))
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,72 @@
+import unittest
+from search import SearchIndex
+from sparql_manager import SPARQLManager
+from app import create_app
+from test_backends import SAMPLE_MOVIES, make_memory_manager, write_during_stream
+
+class TestSearchIndex(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager(SAMPLE_MOVIES)
+        self.index = SearchIndex(self.sparql_manager)
+
+    def titles(self, movies):
+        return [movie.title for movie in movies]
+
+    def test_search_ignores_accents_and_orders_by_rating(self):
+        self.assertEqual(self.titles(self.index.search('amelie')), ['Amélie'])
+        self.assertEqual(self.titles(self.index.search('NOLAN')), ['The Dark Knight', 'Inception'])
+        # La última palabra vale como prefijo
+        self.assertEqual(self.titles(self.index.search('christopher inc')), ['Inception'])
+        self.assertEqual(self.index.search('nolan gladiator'), [])
+
+    def test_movie_added_while_loading_is_indexed(self):
+        movie = {'id': '8', 'title': 'Heat', 'director': 'Michael Mann', 'genre': 'Crime', 'rating': 4.1}
+        with write_during_stream(self.sparql_manager, 'get_all_movies', self.sparql_manager.add_movie, movie):
+            self.index.load()
+        self.assertEqual(self.titles(self.index.search('heat')), ['Heat'])
+        self.assertEqual(self.index.autocomplete('mich')[0]['text'], 'Michael Mann')
+
+    def test_autocomplete_matches_any_word_of_titles_and_directors(self):
+        suggestions = self.index.autocomplete('Ame')
+        self.assertEqual(suggestions, [{'text': 'Amélie', 'kind': 'title', 'id': '2'}])
+        self.assertEqual(
+            [(s['kind'], s['text']) for s in self.index.autocomplete('dark kn')],
+            [('title', 'The Dark Knight')]
+        )
+        self.assertEqual(
+            [s['text'] for s in self.index.autocomplete('christopher')],
+            ['Christopher Nolan']
+        )
+
+    def test_index_follows_added_movies(self):
+        self.index.search('fauno')
+        self.sparql_manager.add_movie({
+            'title': 'El laberinto del fauno', 'director': 'Guillermo del Toro', 'genre': 'Fantasy', 'rating': 4.6
+        })
+        self.assertEqual(self.titles(self.index.search('laberinto fa')), ['El laberinto del fauno'])
+        self.assertEqual(
+            [s['text'] for s in self.index.autocomplete('del')],
+            ['El laberinto del fauno', 'Guillermo del Toro']
+        )
+
+    def test_rebuilds_when_the_catalog_generation_expires(self):
+        self.assertEqual(self.index.search('heat'), [])
+        # Un script de carga u otro worker escribe en el mismo almacén
+        other = SPARQLManager(backend=self.sparql_manager.backend)
+        other.add_movie({'id': '8', 'title': 'Heat', 'director': 'Michael Mann', 'genre': 'Crime', 'rating': 4.1})
+        self.assertEqual(self.index.search('heat'), [])
+
+        self.sparql_manager._generation_started -= self.sparql_manager._read_cache.ttl
+        self.assertEqual(self.titles(self.index.search('heat')), ['Heat'])
+        self.assertEqual(self.index.autocomplete('mich')[0]['text'], 'Michael Mann')
+
+    def test_routes(self):
+        client = create_app(self.sparql_manager).test_client()
+        movies = client.get('/search?q=titan').get_json()['movies']
+        self.assertEqual(movies, [{'id': '6', 'title': 'Titanic', 'director': 'James Cameron', 'genre': 'Romance', 'rating': 3.2}])
+        suggestions = client.get('/autocomplete?prefix=to&limit=1').get_json()['suggestions']
+        self.assertEqual(len(suggestions), 1)
+        self.assertEqual(client.get('/search?q=x&limit=0').status_code, 400)
+
+if __name__ == '__main__':
+    unittest.main()
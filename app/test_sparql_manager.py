@@ -0,0 +1,189 @@
+import unittest
+from unittest.mock import Mock, patch
+from sparql_manager import SPARQLManager
+from movie_agent import MovieAgent
+from app import create_app
+from test_backends import SAMPLE_MOVIES, make_memory_manager
+import threading
+
+class TestBulkInsert(unittest.TestCase):
+    def setUp(self):
+        self.backend = Mock()
+        self.sparql_manager = SPARQLManager(backend=self.backend)
+        self.backend.reset_mock()
+
+    def _movies(self, count):
+        return ({
+            'id': str(i),
+            'title': f'Movie "{i}"',
+            'director': 'Test Director',
+            'genre': 'Action',
+            'rating': 4.0
+        } for i in range(count))
+
+    def test_add_movies_packs_batches(self):
+        total = self.sparql_manager.add_movies(self._movies(5), batch_size=2)
+
+        self.assertEqual(total, 5)
+        self.assertEqual(self.backend.update.call_count, 3)
+        first_update = self.backend.update.call_args_list[0][0][0]
+        self.assertIn('<http://example.org/movies#movie_0> rdf:type ex:Movie', first_update)
+        self.assertIn('<http://example.org/movies#movie_1> rdf:type ex:Movie', first_update)
+        self.assertIn('"Movie \\"1\\""', first_update)
+
+    def test_add_movies_graph_store(self):
+        total = self.sparql_manager.add_movies(self._movies(3), use_graph_store=True)
+
+        self.assertEqual(total, 3)
+        self.assertEqual(self.backend.upload_turtle.call_count, 1)
+        self.assertIn('@prefix ex:', self.backend.upload_turtle.call_args[0][0])
+        self.backend.update.assert_not_called()
+
+    def test_invalid_ids_are_rejected_before_writing(self):
+        movies = list(self._movies(3))
+        movies[1]['id'] = '1> ex:title "x'
+        with self.assertRaises(ValueError):
+            self.sparql_manager.add_movies(movies)
+        with self.assertRaises(ValueError):
+            self.sparql_manager.add_movie(dict(movies[0], id='a b'))
+        self.backend.update.assert_not_called()
+
+        self.sparql_manager.add_movie(dict(movies[0], id='1700000001avengers:endgame'))
+        self.assertIn('<http://example.org/movies#movie_1700000001avengers:endgame>',
+                      self.backend.update.call_args[0][0])
+
+class TestFavoriteToggle(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager()
+
+    def test_toggle_is_one_update_and_reports_state(self):
+        with patch.object(self.sparql_manager, 'update', wraps=self.sparql_manager.update) as update, \
+                patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as query:
+            self.assertTrue(self.sparql_manager.toggle_favorite_movie('7', '1'))
+        self.assertEqual((update.call_count, query.call_count), (1, 1))
+        self.assertTrue(self.sparql_manager.query(
+            'PREFIX ex: <http://example.org/movies#> ASK { ex:user_7 a ex:User }'
+        )['boolean'])
+        self.assertEqual(self.sparql_manager.get_user_profile('7')['directors'], {'Christopher Nolan': 1})
+
+        self.assertFalse(self.sparql_manager.toggle_favorite_movie('7', '1'))
+        self.assertEqual(self.sparql_manager.get_user_profile('7')['favorites'], frozenset())
+
+    def test_concurrent_toggles_are_not_lost(self):
+        threads = [threading.Thread(target=self.sparql_manager.toggle_favorite_movie, args=('7', '2')) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertFalse(self.sparql_manager.is_favorite_movie('7', '2'))
+
+    def test_desired_state_route_is_idempotent(self):
+        client = create_app(self.sparql_manager).test_client()
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as query:
+            for _ in range(2):
+                response = client.post('/favorite_movie', json={'user_id': '7', 'movie_id': '3', 'favorite': True})
+                self.assertTrue(response.get_json()['is_favorite'])
+        query.assert_not_called()
+        self.assertTrue(self.sparql_manager.is_favorite_movie('7', '3'))
+
+        response = client.post('/favorite_movie', json={'user_id': '7', 'movie_id': '3'})
+        self.assertFalse(response.get_json()['is_favorite'])
+
+    def test_injected_ids_are_rejected(self):
+        self.sparql_manager.add_movies(SAMPLE_MOVIES)
+        client = create_app(self.sparql_manager).test_client()
+        injected = '1 } ; DELETE WHERE { ?s ?p ?o } ; INSERT DATA { ex:a ex:b ex:c'
+        for body in [
+            {'user_id': '7', 'movie_id': injected, 'favorite': False},
+            {'user_id': injected, 'movie_id': '1'},
+            {'user_id': '7', 'movie_id': None},
+            {'user_id': '7', 'movie_id': '1', 'favorite': 'false'},
+        ]:
+            self.assertEqual(client.post('/favorite_movie', json=body).status_code, 400, body)
+        with self.assertRaises(ValueError):
+            self.sparql_manager.set_favorite_movie('7', injected, False)
+        with self.assertRaises(ValueError):
+            self.sparql_manager.toggle_favorite_movie(injected, '1')
+        self.assertEqual(len(self.sparql_manager.get_all_movies()), 6)
+        self.assertFalse(self.sparql_manager.is_favorite_movie('7', '1'))
+
+    def test_listing_flags_favorites_with_one_query(self):
+        self.sparql_manager.add_favorite_movie('7', '2')
+        client = create_app(self.sparql_manager).test_client()
+        client.get('/get_all_movies')
+
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as query:
+            movies = client.get('/get_all_movies?user_id=7').get_json()['movies']
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual([m['title'] for m in movies if m['is_favorite']], ['Amélie'])
+        self.assertFalse(hasattr(self.sparql_manager.get_all_movies()[0], 'is_favorite'))
+
+        self.assertEqual(client.get('/favorites?user_id=7').get_json()['movie_ids'], ['2'])
+        page = client.get('/get_all_movies?user_id=8&limit=2').get_json()['movies']
+        self.assertEqual([m['is_favorite'] for m in page], [False, False])
+
+class TestMovieDetailsBatch(unittest.TestCase):
+    def setUp(self):
+        self.sparql_manager = make_memory_manager(SAMPLE_MOVIES)
+        self.movie_agent = MovieAgent(self.sparql_manager)
+
+    def test_batch_is_one_values_query_and_cached(self):
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as query:
+            details = self.sparql_manager.get_movies_details(['4', '99', '2', '4', 'x y'])
+            self.assertEqual(query.call_count, 1)
+            self.assertEqual([(movie_id, movie.title) for movie_id, movie in details.items()],
+                             [('4', 'Gladiator'), ('2', 'Amélie')])
+
+            # Las encontradas y las inexistentes quedan en caché
+            self.assertEqual(self.sparql_manager.get_movies_details(['2', '99']), {'2': details['2']})
+            self.assertEqual(query.call_count, 1)
+
+        self.sparql_manager.DETAILS_BATCH_SIZE = 2
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as query:
+            self.assertEqual(len(self.sparql_manager.get_movies_details(['1', '3', '5'])), 3)
+        self.assertEqual(query.call_count, 2)
+
+    def test_opinions_reuse_the_fetched_rows(self):
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as query:
+            found = self.movie_agent.get_movies_with_opinions(['3', '6'])
+        self.assertEqual(query.call_count, 1)
+        movie, opinion = found['3']
+        self.assertEqual(opinion, self.movie_agent.generate_opinion('3', details=movie))
+        self.assertIn('Action', opinion)
+
+    def test_routes_cost_one_query(self):
+        client = create_app(self.sparql_manager).test_client()
+        with patch.object(self.sparql_manager, 'query', wraps=self.sparql_manager.query) as query:
+            single = client.get('/movie_details/2').get_json()
+        self.assertEqual(query.call_count, 1)
+        self.assertEqual(single['details']['title'], 'Amélie')
+        self.assertTrue(single['opinion'])
+        self.assertEqual(client.get('/movie_details/99').status_code, 404)
+
+        body = client.post('/movie_details_batch', json={'movie_ids': ['1', 5, '99']}).get_json()
+        self.assertEqual([m['details']['id'] for m in body['movies']], ['1', '5'])
+        self.assertEqual(body['missing'], ['99'])
+        self.assertEqual(client.post('/movie_details_batch', json={}).status_code, 400)
+
+    def test_legacy_ids_are_found(self):
+        # IDs como los de la carga de ejemplo original: marca de tiempo + título sin espacios
+        self.sparql_manager.update('''
+            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+            PREFIX ex: <http://example.org/movies#>
+            INSERT DATA {
+                ex:movie_1700000000amélie rdf:type ex:Movie ; ex:title "Amélie" ;
+                    ex:director "Jean-Pierre Jeunet" ; ex:genre "Romance" ; ex:rating 4.4 .
+                ex:movie_1700000001avengers:endgame rdf:type ex:Movie ; ex:title "Avengers: Endgame" ;
+                    ex:director "Anthony Russo, Joe Russo" ; ex:genre "Action" ; ex:rating 4.4 .
+            }
+            ''')
+        self.sparql_manager._bump_catalog_generation()
+        ids = ['1700000000amélie', '1700000001avengers:endgame']
+        self.assertEqual(list(self.sparql_manager.get_movies_details(ids)), ids)
+
+        client = create_app(self.sparql_manager).test_client()
+        body = client.get('/movie_details/1700000001avengers:endgame').get_json()
+        self.assertEqual(body['details']['title'], 'Avengers: Endgame')
+
+if __name__ == '__main__':
+    unittest.main()